@@ -1,6 +1,7 @@
 import argparse
 import queue
 import threading
+import time
 import tkinter as tk
 
 import serial
@@ -11,60 +12,140 @@ HEIGHT = 64
 HEADER = b"\x55\xAA\x80\x40"
 FRAME_SIZE = 1024
 
-
-def read_exact(port, size):
-    buf = bytearray()
-    while len(buf) < size:
-        chunk = port.read(size - len(buf))
-        if not chunk:
-            return None
-        buf.extend(chunk)
-    return bytes(buf)
-
-
-def serial_reader(port_name, baud_rate, frame_queue, status_queue, stop_event):
+# one 256-entry table per page bit: byte -> 255 (pixel on) or 0 (pixel off)
+BIT_TABLES = [bytes(255 if value >> bit & 1 else 0 for value in range(256)) for bit in range(8)]
+PGM_HEADER = b"P5 %d %d 255\n" % (WIDTH, HEIGHT)
+
+
+class FrameParser:
+    """Splits a raw UART byte stream into frames.
+
+    A frame is HEADER, FRAME_SIZE payload bytes and, with checksum=True, one
+    byte holding the sum of the payload mod 256. Display_Engine sends frames
+    back to back, so a frame is only accepted once the full next header has
+    arrived right after it (a delay of len(HEADER) bytes); anything else
+    there means bytes were lost inside the frame and it is counted as
+    corrupt. The parser then resynchronizes on the next header after the
+    bad one instead of trusting the frame boundary.
+    """
+
+    def __init__(self, checksum=False):
+        self.checksum = checksum
+        self.frame_len = len(HEADER) + FRAME_SIZE + (1 if checksum else 0)
+        self.buf = bytearray()
+        self.frames = 0         # valid frames
+        self.corrupt = 0        # frames rejected by the length or checksum check
+        self.skipped = 0        # bytes discarded while searching for a header
+
+    def feed(self, data):
+        """Add received bytes; returns the list of complete valid frames."""
+        buf = self.buf
+        buf += data
+        out = []
+        pos = 0
+        while True:
+            start = buf.find(HEADER, pos)
+            if start < 0:
+                # keep a possible partial header at the end
+                keep = max(pos, len(buf) - len(HEADER) + 1)
+                self.skipped += keep - pos
+                pos = keep
+                break
+            self.skipped += start - pos
+            end = start + self.frame_len
+            if end + len(HEADER) > len(buf):
+                pos = start
+                break
+            payload = bytes(buf[start + len(HEADER):start + len(HEADER) + FRAME_SIZE])
+            if buf[end:end + len(HEADER)] != HEADER or (
+                    self.checksum and sum(payload) & 0xFF != buf[end - 1]):
+                self.corrupt += 1
+                pos = start + 1
+                continue
+            self.frames += 1
+            out.append(payload)
+            pos = end
+        del buf[:pos]
+        return out
+
+
+def serial_reader(port_name, baud_rate, checksum, frame_queue, status_queue, stop_event):
     try:
-        with serial.Serial(port_name, baud_rate, timeout=1) as port:
+        with serial.Serial(port_name, baud_rate, timeout=0.1) as port:
             status_queue.put(f"Connected: {port_name} @ {baud_rate}")
-            match_index = 0
-            frame_count = 0
+            parser = FrameParser(checksum)
+            dropped = 0
             while not stop_event.is_set():
-                byte = port.read(1)
-                if not byte:
+                # everything the driver has buffered, or wait (timeout) for one byte
+                chunk = port.read(port.in_waiting or 1)
+                if not chunk:
                     continue
-
-                if byte[0] == HEADER[match_index]:
-                    match_index += 1
-                    if match_index == len(HEADER):
-                        frame = read_exact(port, FRAME_SIZE)
-                        match_index = 0
-                        if frame is not None:
-                            frame_count += 1
-                            if frame_queue.full():
-                                try:
-                                    frame_queue.get_nowait()
-                                except queue.Empty:
-                                    pass
-                            frame_queue.put(frame)
-                            status_queue.put(f"Connected: {port_name} @ {baud_rate} | frames: {frame_count}")
-                else:
-                    match_index = 1 if byte[0] == HEADER[0] else 0
+                frames = parser.feed(chunk)
+                if not frames:
+                    continue
+                # only the newest frame is shown; older ones count as dropped
+                dropped += len(frames) - 1
+                if frame_queue.full():
+                    try:
+                        frame_queue.get_nowait()
+                        dropped += 1
+                    except queue.Empty:
+                        pass
+                frame_queue.put(frames[-1])
+                status_queue.put(f"Connected: {port_name} @ {baud_rate} | frames: {parser.frames} "
+                                 f"dropped: {dropped} corrupt: {parser.corrupt}")
     except Exception as exc:
         status_queue.put(f"Serial error: {exc}")
 
 
-def draw_frame(canvas, frame, scale):
-    canvas.delete("all")
+def frame_to_pgm(frame):
+    """SSD1306 page-format frame -> binary PGM (row-major, 255 = lit pixel)."""
+    # translate() unpacks one bit of all 1024 bytes at once; row y is then the
+    # 128-byte slice of its page in the plane of bit y % 8
+    planes = [frame.translate(table) for table in BIT_TABLES]
+    rows = []
     for y in range(HEIGHT):
         page = (y >> 3) * WIDTH
-        mask = 1 << (y & 7)
-        y0 = y * scale
-        y1 = y0 + scale
-        for x in range(WIDTH):
-            if frame[page + x] & mask:
-                x0 = x * scale
-                x1 = x0 + scale
-                canvas.create_rectangle(x0, y0, x1, y1, outline="", fill="white")
+        rows.append(planes[y & 7][page:page + WIDTH])
+    return PGM_HEADER + b"".join(rows)
+
+
+class FrameView:
+    """Canvas showing the framebuffer as one image, scaled by Tk."""
+
+    def __init__(self, canvas, scale):
+        self.scale = scale
+        self.bitmap = tk.PhotoImage(width=WIDTH, height=HEIGHT)
+        self.image = tk.PhotoImage(width=WIDTH * scale, height=HEIGHT * scale)
+        canvas.create_image(0, 0, image=self.image, anchor="nw")
+        self.last = None
+
+    def draw(self, frame):
+        """Blit frame unless it equals the one on screen; returns True if drawn."""
+        if frame == self.last:
+            return False
+        self.last = frame
+        self.bitmap.configure(data=frame_to_pgm(frame), format="PPM")
+        # copy into the existing image so the canvas item picks it up in place
+        self.image.tk.call(self.image, "copy", self.bitmap, "-zoom", self.scale, self.scale)
+        return True
+
+
+class RateMeter:
+    """Events per second over the last `window` seconds."""
+
+    def __init__(self, window=1.0):
+        self.window = window
+        self.times = []
+
+    def tick(self, now):
+        self.times.append(now)
+
+    def rate(self, now):
+        cutoff = now - self.window
+        while self.times and self.times[0] < cutoff:
+            self.times.pop(0)
+        return len(self.times) / self.window
 
 
 def main():
@@ -72,6 +153,8 @@ def main():
     parser.add_argument("--port", required=True, help="Serial port, for example COM5")
     parser.add_argument("--baud", type=int, default=115200, help="Baud rate")
     parser.add_argument("--scale", type=int, default=4, help="Window scale")
+    parser.add_argument("--checksum", action="store_true",
+                        help="Frames end with an 8-bit sum of the payload (not sent by the default Display_Engine)")
     args = parser.parse_args()
 
     root = tk.Tk()
@@ -91,6 +174,10 @@ def main():
         highlightthickness=0,
     )
     canvas.pack()
+    view = FrameView(canvas, args.scale)
+    received = RateMeter()
+    drawn = RateMeter()
+    link_status = ["Connecting..."]
 
     frame_queue = queue.Queue(maxsize=1)
     status_queue = queue.Queue()
@@ -98,7 +185,7 @@ def main():
 
     worker = threading.Thread(
         target=serial_reader,
-        args=(args.port, args.baud, frame_queue, status_queue, stop_event),
+        args=(args.port, args.baud, args.checksum, frame_queue, status_queue, stop_event),
         daemon=True,
     )
     worker.start()
@@ -106,16 +193,22 @@ def main():
     def poll():
         try:
             while True:
-                status_var.set(status_queue.get_nowait())
+                link_status[0] = status_queue.get_nowait()
         except queue.Empty:
             pass
 
+        now = time.perf_counter()
         try:
             frame = frame_queue.get_nowait()
-            draw_frame(canvas, frame, args.scale)
+            received.tick(now)
+            if view.draw(frame):
+                drawn.tick(now)
         except queue.Empty:
             pass
 
+        status_var.set(f"{link_status[0]} | rx {received.rate(now):.1f} fps, "
+                       f"drawn {drawn.rate(now):.1f} fps")
+
         root.after(15, poll)
 
     def on_close():
@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Encode an image sequence as an SSD1306 page-format animation stream.
+
+Each frame is converted like png_to_oled_1024.py (threshold / on-color /
+invert) and laid out the way the framebuffer holds it: byte page*W + x,
+bit (y % 8) = pixel (x, y). That is the 128-byte 32x32 layout of
+Display_Engine_FB32 (0xA000..0xA07F) or, with --width 128 --height 64, the
+1024-byte LodeRunner framebuffer.
+
+Every frame becomes a list of ops applied to the framebuffer from byte 0,
+ended by a 0x00 byte:
+  0x01..0x7F  n     literal: the next n bytes are written
+  0x80..0xBF  n     run: the next byte is written (n - 0x7F) times (1..64)
+  0xC0..0xFF  n     skip: (n - 0xBF) bytes keep their previous value (1..64)
+  0x00              end of frame: the remaining bytes keep their value
+Delta frames are encoded against the previous frame (skips cover unchanged
+bytes); keyframes (the first frame, every --keyframe frames, or all of
+them with --mode rle) only use literals and runs, so they do not depend on
+the framebuffer contents. Ops are chosen for the fewest bytes, then the
+fewest ops.
+
+Outputs:
+  --output X.bin    the raw stream (for .incbin, or the simulator)
+  --asm X.asm       .data section: <name> bytes and <name>_offsets, the
+                    byte offset of every frame in the stream
+tools/oled_anim_sim.py runs the RV32I decoder on the ISS over the .bin to
+measure the CPU cost of each frame.
+
+Usage:
+  python3 oled_anim_encode.py walk_*.png --output walk.bin
+  python3 oled_anim_encode.py frames/ --output intro.bin --asm intro.asm --keyframe 16
+  python3 oled_anim_encode.py frames/ --width 128 --height 64 --resize --output lr.bin
+"""
+
+import argparse
+import os
+import sys
+
+from png_to_oled_1024 import DITHER_METHODS, load_and_prepare, np, to_bits
+
+OP_END = 0x00
+LIT_MAX = 0x7F
+RUN_BASE = 0x7F     # run op byte = RUN_BASE + count
+SKIP_BASE = 0xBF    # skip op byte = SKIP_BASE + count
+RUN_MAX = 64
+SKIP_MAX = 64
+
+
+class AnimEncodeError(ValueError):
+    pass
+
+
+def page_bytes(bits, width: int, height: int):
+    """Row-major 0/1 pixels -> SSD1306 page bytes (page*W + x, bit y % 8)."""
+    out = bytearray(width * height // 8)
+    for y in range(height):
+        row = bits[y * width:(y + 1) * width]
+        base = (y >> 3) * width
+        mask = 1 << (y & 7)
+        for x, bit in enumerate(row):
+            if bit:
+                out[base + x] |= mask
+    return bytes(out)
+
+
+def encode_frame(cur: bytes, prev=None):
+    """Op stream for cur; prev=None encodes a keyframe (no skips)."""
+    n = len(cur)
+    INF = (1 << 30, 0)
+    best = [INF] * (n + 1)      # (bytes, ops) to finish the frame from i
+    choice = [None] * (n + 1)
+    best[n] = (0, 0)
+    # literal ending before j: 1 - i + (j + bytes[j]); sliding-window minimum
+    # over j in (i, i + LIT_MAX] of (j + bytes[j], ops[j]), smallest at the right
+    window = []
+    run = skip = 0
+    for i in range(n - 1, -1, -1):
+        run = run + 1 if i + 1 < n and cur[i] == cur[i + 1] else 1
+        same = prev is not None and prev[i] == cur[i]
+        skip = skip + 1 if same else 0
+        key = (i + 1 + best[i + 1][0], best[i + 1][1], i + 1)
+        while window and window[0][:2] >= key[:2]:
+            window.pop(0)
+        window.insert(0, key)
+        while window[-1][2] > i + LIT_MAX:
+            window.pop()
+        j_bytes, j_ops, j = window[-1]
+        options = [((1 - i + j_bytes, 1 + j_ops), ("lit", j - i))]
+        k = min(run, RUN_MAX)
+        if k >= 2:
+            options.append(((2 + best[i + k][0], 1 + best[i + k][1]), ("run", k)))
+        if skip:
+            if skip == n - i:
+                options.append(((0, 0), ("end", 0)))
+            k = min(skip, SKIP_MAX)
+            options.append(((1 + best[i + k][0], 1 + best[i + k][1]), ("skip", k)))
+        best[i], choice[i] = min(options)
+    out = bytearray()
+    i = 0
+    while i < n:
+        kind, k = choice[i]
+        if kind == "end":
+            break
+        if kind == "lit":
+            out.append(k)
+            out += cur[i:i + k]
+        elif kind == "run":
+            out += bytes((RUN_BASE + k, cur[i]))
+        else:
+            out.append(SKIP_BASE + k)
+        i += k
+    out.append(OP_END)
+    return bytes(out)
+
+
+def decode_frame(stream: bytes, pos: int, fb: bytearray):
+    """Apply the frame at stream[pos:] to fb; returns the position after it."""
+    dst = 0
+    while True:
+        op = stream[pos]
+        pos += 1
+        if op == OP_END:
+            return pos
+        if op <= LIT_MAX:
+            fb[dst:dst + op] = stream[pos:pos + op]
+            pos += op
+            dst += op
+        elif op <= SKIP_BASE:
+            k = op - RUN_BASE
+            fb[dst:dst + k] = bytes((stream[pos],)) * k
+            pos += 1
+            dst += k
+        else:
+            dst += op - SKIP_BASE
+
+
+def encode_frames(frames, mode: str = "delta", keyframe: int = 0):
+    """[(bytes, is_keyframe)] for a list of page-format frames."""
+    out = []
+    prev = None
+    for i, cur in enumerate(frames):
+        key = mode == "rle" or i == 0 or (keyframe and i % keyframe == 0)
+        out.append((encode_frame(cur, None if key else prev), key))
+        prev = cur
+    return out
+
+
+def verify(encoded, frames):
+    fb = bytearray(len(frames[0]))
+    stream = b"".join(data for data, _ in encoded)
+    pos = 0
+    for i, cur in enumerate(frames):
+        pos = decode_frame(stream, pos, fb)
+        if bytes(fb) != cur:
+            raise AnimEncodeError(f"frame {i} does not decode to its source")
+
+
+def collect_inputs(paths):
+    exts = (".png", ".bmp", ".jpg", ".jpeg")
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(os.path.join(path, n) for n in os.listdir(path)
+                                if n.lower().endswith(exts)))
+        else:
+            files.append(path)
+    return files
+
+
+def write_asm(path: str, name: str, stream: bytes, offsets):
+    lines = [f"    # {len(offsets)} frames, {len(stream)} bytes (oled_anim_encode.py)",
+             "    .data", f"{name}_offsets:"]
+    for i in range(0, len(offsets), 8):
+        lines.append("    .word " + ", ".join(str(o) for o in offsets[i:i + 8]))
+    lines.append(f"{name}:")
+    for i in range(0, len(stream), 16):
+        lines.append("    .byte " + ", ".join(f"0x{b:02x}" for b in stream[i:i + 16]))
+    lines.append("    .align 2")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="SSD1306 page-format RLE/delta animation encoder")
+    ap.add_argument("inputs", nargs="+", help="frame images in order, or folders (sorted by name)")
+    ap.add_argument("--output", required=True, help="raw stream (.bin)")
+    ap.add_argument("--asm", help="also write a .data include with the stream and frame offsets")
+    ap.add_argument("--name", default="anim", help="label for --asm")
+    ap.add_argument("--mode", choices=["delta", "rle"], default="delta",
+                    help="delta: frames after the first are diffs; rle: every frame stands alone")
+    ap.add_argument("--keyframe", type=int, default=0,
+                    help="force a keyframe every N frames in delta mode (0: only the first)")
+    ap.add_argument("--width", type=int, default=32)
+    ap.add_argument("--height", type=int, default=32)
+    ap.add_argument("--threshold", type=int, default=128, help="0..255 grayscale threshold")
+    ap.add_argument("--on-color", choices=["dark", "light"], default="light",
+                    help="which grayscale side is treated as ON pixel (default: light)")
+    ap.add_argument("--invert", action="store_true", help="invert output bits")
+    ap.add_argument("--resize", action="store_true", help="resize input images to target size")
+    ap.add_argument("--dither", choices=DITHER_METHODS, default="none",
+                    help="ordered (bayer*) or error-diffusion dithering instead of a hard threshold")
+    ap.add_argument("--gamma-resize", action="store_true",
+                    help="with --resize: gamma-correct area scaling instead of nearest neighbour")
+    args = ap.parse_args()
+
+    if np is None and args.gamma_resize:
+        print("ERROR: --gamma-resize needs numpy. Run: pip install numpy")
+        sys.exit(1)
+    if args.height % 8:
+        print("ERROR: --height must be a multiple of 8 (SSD1306 pages)")
+        sys.exit(1)
+    files = collect_inputs(args.inputs)
+    if not files:
+        print("ERROR: No images found.")
+        sys.exit(1)
+
+    try:
+        frames = []
+        for path in files:
+            img = load_and_prepare(path, args.width, args.height, args.resize, args.gamma_resize)
+            bits = to_bits(img, args.threshold, args.invert, args.on_color, args.dither)
+            frames.append(page_bytes(bits, args.width, args.height))
+        encoded = encode_frames(frames, args.mode, args.keyframe)
+        verify(encoded, frames)
+        stream = b"".join(data for data, _ in encoded)
+        offsets = []
+        pos = 0
+        for data, _ in encoded:
+            offsets.append(pos)
+            pos += len(data)
+        with open(args.output, "wb") as f:
+            f.write(stream)
+        if args.asm:
+            write_asm(args.asm, args.name, stream, offsets)
+    except (OSError, ValueError) as e:
+        print(f"ERROR: {e}")
+        sys.exit(1)
+
+    raw = len(frames[0])
+    print(f"  {'frame':>5} {'kind':<6}{'bytes':>7}{'changed':>9}  source")
+    prev = None
+    for i, ((data, key), cur, path) in enumerate(zip(encoded, frames, files)):
+        changed = raw if prev is None else sum(a != b for a, b in zip(prev, cur))
+        print(f"  {i:>5} {'key' if key else 'delta':<6}{len(data):>7}{changed:>9}  "
+              f"{os.path.basename(path)}")
+        prev = cur
+    total = len(stream)
+    print(f"{len(frames)} frames, {total} bytes ({total / len(frames):.1f} bytes/frame, "
+          f"{total / (raw * len(frames)):.1%} of {raw} raw bytes/frame) -> "
+          + ", ".join(p for p in (args.output, args.asm) if p))
+
+
+if __name__ == "__main__":
+    main()
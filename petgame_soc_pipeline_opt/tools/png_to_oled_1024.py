@@ -6,6 +6,9 @@ Convert one PNG image to 32x32 (1024 pixels) monochrome data for SSD1306.
 Default output is a flat 1024-pixel text file (0/1, one per line, row-major).
 Optional verilog output format:
     rom[idx] = 16'hffff / 16'h0000
+
+--dither and --gamma-resize (dither.py) replace the hard threshold and the
+nearest-neighbour resize.
 """
 
 import argparse
@@ -17,12 +20,22 @@ except Exception:
     print("ERROR: Pillow not installed. Run: pip install pillow")
     sys.exit(1)
 
+try:
+    import numpy as np
+    from dither import METHODS as DITHER_METHODS, dither_1bit, resize_linear
+except Exception:
+    np = None
+    DITHER_METHODS = ("none",)
+
 
-def load_and_prepare(path: str, width: int, height: int, resize: bool):
+def load_and_prepare(path: str, width: int, height: int, resize: bool, gamma: bool = False):
     img = Image.open(path).convert("L")
     if img.size != (width, height):
         if resize:
-            img = img.resize((width, height), Image.NEAREST)
+            if gamma:
+                img = resize_linear(img, (width, height))
+            else:
+                img = img.resize((width, height), Image.NEAREST)
         else:
             raise ValueError(
                 f"Image size {img.size} != ({width}, {height}). Use --resize to force resize."
@@ -30,7 +43,15 @@ def load_and_prepare(path: str, width: int, height: int, resize: bool):
     return img
 
 
-def to_bits(img: Image.Image, threshold: int, invert: bool, on_color: str):
+def to_bits(img: Image.Image, threshold: int, invert: bool, on_color: str,
+            dither: str = "none"):
+    if dither != "none":
+        gray = np.asarray(img, dtype=np.uint8)
+        if on_color == "dark":
+            # pix < threshold  <=>  255 - pix >= 256 - threshold
+            gray, threshold = 255 - gray, 256 - threshold
+        bits = dither_1bit(gray, dither, threshold)
+        return (bits ^ 1 if invert else bits).reshape(-1).tolist()
     w, h = img.size
     pix = img.load()
     out = []
@@ -89,6 +110,10 @@ def main():
     )
     ap.add_argument("--invert", action="store_true", help="invert output bits")
     ap.add_argument("--resize", action="store_true", help="resize input image to target size")
+    ap.add_argument("--dither", choices=DITHER_METHODS, default="none",
+                    help="ordered (bayer*) or error-diffusion dithering instead of a hard threshold")
+    ap.add_argument("--gamma-resize", action="store_true",
+                    help="with --resize: gamma-correct area scaling instead of nearest neighbour")
     ap.add_argument("--mem-name", default="rom", help="verilog memory name (for --format verilog)")
     ap.add_argument("--base", type=int, default=0, help="verilog start index (for --format verilog)")
     ap.add_argument("--preview", action="store_true", help="print 32x32 ASCII preview")
@@ -101,8 +126,12 @@ def main():
         print("ERROR: This tool targets 1024 pixels. Please use --width 32 --height 32.")
         sys.exit(1)
 
-    img = load_and_prepare(args.input, args.width, args.height, args.resize)
-    bits = to_bits(img, args.threshold, args.invert, args.on_color)
+    if np is None and args.gamma_resize:
+        print("ERROR: --gamma-resize needs numpy. Run: pip install numpy")
+        sys.exit(1)
+
+    img = load_and_prepare(args.input, args.width, args.height, args.resize, args.gamma_resize)
+    bits = to_bits(img, args.threshold, args.invert, args.on_color, args.dither)
 
     if args.format == "flat":
         write_flat(args.output, bits)
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Pack a 1-bit sprite ROM into deduplicated tiles for block RAM.
+
+Input images, naming and conversion options are the same as
+img_to_1bit_rom.py (and share its .romcache/). Instead of storing every
+(pet, exp, frame) slot in full, the sprite set is split into TxT tiles
+(default 8x8) and three ROMs are written:
+
+  <prefix>_tiles   one T*T-bit word per unique tile; tile 0 is all zeros
+                   bit k = tile pixel (k / T, k % T), row-major
+  <prefix>_index   tile ids of each unique frame, (W/T)*(H/T) per frame
+  <prefix>_frames  unique frame id of each slot; missing slots share the
+                   all-zero frame
+
+Pixel (x, y) of slot s:
+  f    = frames[s]
+  t    = index[f * TILES_PER_FRAME + (y / T) * (W / T) + x / T]
+  bit  = tiles[t][(y % T) * T + x % T]
+
+<prefix>_params.vh holds the localparams (sizes and widths) for the lookup.
+The packed ROMs are unpacked and checked against the flat ROM before they
+are written, and the report compares RAMB18 usage of the flat ROM with the
+packed one (Basys3 / XC7A35T has 100 RAMB18).
+
+Usage:
+  python3 sprite_tile_pack.py --input ./frames --output-prefix ./pet_tiles --pets 4 --exps 3 --frames 8
+  python3 sprite_tile_pack.py --input ./frames --output-prefix rom/pet --pets 4 --exps 3 --tile 4 --format verilog
+"""
+
+import argparse
+import os
+import sys
+
+from img_to_1bit_rom import (DITHER_METHODS, collect_images, convert_images, np, select_images,
+                             write_coe_words, write_mem_words, write_verilog_words)
+
+BASYS3_RAMB18 = 100
+# RAMB18E1 aspect ratios (depth, width); widths 9/18/36 include parity bits
+RAMB18_SHAPES = [(16384, 1), (8192, 2), (4096, 4), (2048, 9), (1024, 18), (512, 36)]
+
+
+class TilePackError(ValueError):
+    pass
+
+
+class TilePack:
+    def __init__(self, width, height, tile):
+        self.width = width
+        self.height = height
+        self.tile = tile
+        self.tiles = [0]            # tile words; 0 = blank
+        self.index = []             # tile ids, per unique frame
+        self.frames = []            # unique frame id per slot
+        self._tile_ids = {0: 0}
+        self._frame_ids = {}
+
+    @property
+    def tiles_per_frame(self):
+        return (self.width // self.tile) * (self.height // self.tile)
+
+    def add_frame(self, bits: str):
+        """Append one slot given as a row-major '0'/'1' string."""
+        t, w = self.tile, self.width
+        ids = []
+        for ty in range(0, self.height, t):
+            for tx in range(0, w, t):
+                key = "".join(bits[(ty + r) * w + tx:(ty + r) * w + tx + t] for r in range(t))
+                word = int(key[::-1], 2)
+                tid = self._tile_ids.get(word)
+                if tid is None:
+                    tid = self._tile_ids[word] = len(self.tiles)
+                    self.tiles.append(word)
+                ids.append(tid)
+        key = tuple(ids)
+        fid = self._frame_ids.get(key)
+        if fid is None:
+            fid = self._frame_ids[key] = len(self._frame_ids)
+            self.index.extend(ids)
+        self.frames.append(fid)
+
+    def unpack(self, slot: int):
+        """Row-major '0'/'1' string of slot, read back through the three ROMs."""
+        t, w = self.tile, self.width
+        base = self.frames[slot] * self.tiles_per_frame
+        out = []
+        for y in range(self.height):
+            for x in range(w):
+                tid = self.index[base + (y // t) * (w // t) + x // t]
+                out.append("1" if self.tiles[tid] >> ((y % t) * t + x % t) & 1 else "0")
+        return "".join(out)
+
+
+def bit_width(count: int):
+    return max(1, (count - 1).bit_length())
+
+
+def ramb18(depth: int, width: int):
+    """RAMB18 primitives for a depth x width ROM (best single aspect ratio)."""
+    if depth == 0 or width == 0:
+        return 0
+    return min(-(-depth // d) * -(-width // w) for d, w in RAMB18_SHAPES)
+
+
+def pack_sprites(bits_by_slot, total_slots: int, width: int, height: int, tile: int):
+    if width % tile or height % tile:
+        raise TilePackError(f"tile size {tile} must divide the image size {width}x{height}")
+    pack = TilePack(width, height, tile)
+    blank = "0" * (width * height)
+    for slot in range(total_slots):
+        pack.add_frame(bits_by_slot.get(slot, blank))
+    for slot in range(total_slots):
+        if pack.unpack(slot) != bits_by_slot.get(slot, blank):
+            raise TilePackError(f"slot {slot} does not unpack to its source bits")
+    return pack
+
+
+def pack_report(pack: TilePack, total_slots: int):
+    """[(name, depth, width, bits, ramb18)] of the flat ROM and the packed ROMs."""
+    flat_depth = total_slots * pack.width * pack.height
+    rows = [("flat", flat_depth, 1)]
+    rows.append(("tiles", len(pack.tiles), pack.tile * pack.tile))
+    rows.append(("index", len(pack.index), bit_width(len(pack.tiles))))
+    rows.append(("frames", len(pack.frames), bit_width(len(pack.index) // pack.tiles_per_frame)))
+    return [(name, d, w, d * w, ramb18(d, w)) for name, d, w in rows]
+
+
+def write_params(path: str, pack: TilePack, report):
+    widths = {name: w for name, _, w, _, _ in report}
+    depths = {name: d for name, d, _, _, _ in report}
+    params = [
+        ("SPRITE_W", pack.width), ("SPRITE_H", pack.height), ("TILE", pack.tile),
+        ("TILES_PER_ROW", pack.width // pack.tile), ("TILES_PER_FRAME", pack.tiles_per_frame),
+        ("TILE_COUNT", depths["tiles"]), ("TILE_BITS", widths["tiles"]),
+        ("INDEX_DEPTH", depths["index"]), ("INDEX_BITS", widths["index"]),
+        ("SLOT_COUNT", depths["frames"]), ("FRAME_BITS", widths["frames"]),
+    ]
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("".join(f"localparam {name} = {value};\n" for name, value in params))
+
+
+def main():
+    ap = argparse.ArgumentParser(description="dedup 1-bit sprites into tile + index ROMs")
+    ap.add_argument("--input", required=True, help="input image folder")
+    ap.add_argument("--output-prefix", required=True,
+                    help="writes <prefix>_tiles/_index/_frames.<ext> and <prefix>_params.vh")
+    ap.add_argument("--format", choices=["verilog", "mem", "coe"], default="mem")
+    ap.add_argument("--width", type=int, default=32)
+    ap.add_argument("--height", type=int, default=32)
+    ap.add_argument("--pets", type=int, required=True, help="number of pets")
+    ap.add_argument("--exps", type=int, required=True, help="expressions per pet")
+    ap.add_argument("--frames", type=int, default=1, help="frames per expression")
+    ap.add_argument("--tile", type=int, default=8, help="tile edge in pixels")
+    ap.add_argument("--threshold", type=int, default=128, help="0..255 grayscale threshold")
+    ap.add_argument("--invert", action="store_true", help="invert output bits")
+    ap.add_argument("--resize", action="store_true", help="resize images to target size")
+    ap.add_argument("--dither", choices=DITHER_METHODS, default="none",
+                    help="ordered (bayer*) or error-diffusion dithering instead of a hard threshold")
+    ap.add_argument("--gamma-resize", action="store_true",
+                    help="with --resize: gamma-correct area scaling instead of nearest neighbour")
+    ap.add_argument("--jobs", type=int, default=0, help="worker processes (default: one per CPU)")
+    ap.add_argument("--no-cache", action="store_true", help="reconvert every image")
+    args = ap.parse_args()
+
+    if np is None and args.gamma_resize:
+        print("ERROR: --gamma-resize needs numpy. Run: pip install numpy")
+        sys.exit(1)
+    if args.tile <= 0 or args.tile * args.tile > 64:
+        print("ERROR: --tile must be 1..8 (a tile is stored as one word of up to 64 bits)")
+        sys.exit(1)
+    files = collect_images(args.input)
+    if not files:
+        print("ERROR: No images found.")
+        sys.exit(1)
+
+    size = (args.width, args.height)
+    total_slots = args.pets * args.exps * args.frames
+    images = select_images(files, args.pets, args.exps, args.frames)
+    cache_path = None if args.no_cache else os.path.join(args.input, ".romcache", "img_to_1bit_rom.json")
+    try:
+        bits_by_slot, _ = convert_images(images, size, args.threshold, args.invert,
+                                         args.resize, args.jobs, cache_path,
+                                         args.dither, args.gamma_resize)
+        pack = pack_sprites(bits_by_slot, total_slots, args.width, args.height, args.tile)
+    except ValueError as e:
+        print(f"ERROR: {e}")
+        sys.exit(1)
+
+    report = pack_report(pack, total_slots)
+    ext = {"verilog": ".vh", "mem": ".mem", "coe": ".coe"}[args.format]
+    out = [(f"{args.output_prefix}_{name}{ext}", words, w)
+           for (name, _, w, _, _), words in zip(report[1:], (pack.tiles, pack.index, pack.frames))]
+    try:
+        for path, words, w in out:
+            if args.format == "verilog":
+                mem_name = os.path.basename(path)[:-len(ext)].replace("-", "_")
+                write_verilog_words(path, mem_name, words, w)
+            elif args.format == "mem":
+                write_mem_words(path, words, w)
+            else:
+                write_coe_words(path, words, w)
+        write_params(args.output_prefix + "_params.vh", pack, report)
+    except OSError as e:
+        print(f"ERROR: {e}")
+        sys.exit(1)
+
+    print(f"{total_slots} slots ({len(images)} images) -> {len(pack.index) // pack.tiles_per_frame} "
+          f"unique frames, {len(pack.tiles)} unique {args.tile}x{args.tile} tiles")
+    print(f"  {'rom':<8}{'depth':>9}{'width':>7}{'bits':>10}{'RAMB18':>8}")
+    for name, d, w, bits, brams in report:
+        print(f"  {name:<8}{d:>9}{w:>7}{bits:>10}{brams:>8}")
+    flat_bits, flat_brams = report[0][3], report[0][4]
+    packed_bits = sum(r[3] for r in report[1:])
+    packed_brams = sum(r[4] for r in report[1:])
+    saved = flat_brams - packed_brams
+    verdict = f"{saved} saved" if saved >= 0 else f"{-saved} more than flat, keep the flat ROM"
+    print(f"  packed {packed_bits} bits ({packed_bits / flat_bits:.1%} of flat), "
+          f"{packed_brams} vs {flat_brams} RAMB18 of {BASYS3_RAMB18} -> {verdict}")
+    print("Done. Wrote " + ", ".join(p for p, _, _ in out) + f", {args.output_prefix}_params.vh")
+
+
+if __name__ == "__main__":
+    main()
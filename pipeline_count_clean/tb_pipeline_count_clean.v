@@ -13,6 +13,21 @@ module tb_pipeline_count_clean;
     integer i;
     reg     done_seen;
 
+    // Commit log for tools/rtl_cosim.py (+commit_log=<file>): one line per
+    // retired instruction, "cycle pc instr [xN=value] [[addr]=data]".
+    // The store address/data are sampled in MEM and printed one cycle later,
+    // when the store reaches WB. A load-use bubble reaches WB with the word of
+    // the stalled instruction (ID.v still loads id_ex_instr on hazard_stall),
+    // so wb_valid alone would log it twice: a valid bit follows every
+    // instruction from ID/EX to WB, cleared on hazard_stall and on a flush,
+    // and only valid ones are logged. instr_count keeps counting wb_valid.
+    integer     log_fd;
+    reg [1023:0] log_path;
+    reg         st_valid;
+    reg [31:0]  st_addr;
+    reg [31:0]  st_data;
+    reg         ex_v, mem_v, wb_v;
+
     localparam integer MAX_CYCLES = 500000;
     localparam [31:0] DONE_INSTR = 32'h0000006F; // jal x0, 0
     localparam [31:0] C_BASE     = 32'h00001200;
@@ -38,12 +53,39 @@ module tb_pipeline_count_clean;
         end
     end
 
+    always @(posedge clk) begin
+        ex_v  <= !rst && !dut.hazard_stall && !dut.miss;
+        mem_v <= !rst && ex_v;
+        wb_v  <= !rst && mem_v;
+    end
+
+    always @(posedge clk) begin
+        st_valid <= !rst && dut.ex_mem_write_reg;
+        st_addr  <= dut.ex_mem_alu_result_reg;
+        st_data  <= dut.mem_rs2_data;
+        if (log_fd && !rst && wb_valid && wb_v) begin
+            $fwrite(log_fd, "%0d %08x %08x", cycle_count, dut.mem_wb_pc_plus4_reg - 32'd4, wb_instr);
+            if (dut.wb_regwrite && dut.wb_rd != 5'd0)
+                $fwrite(log_fd, " x%0d=%08x", dut.wb_rd, dut.wb_data);
+            if (st_valid)
+                $fwrite(log_fd, " [%08x]=%08x", st_addr, st_data);
+            $fwrite(log_fd, "\n");
+        end
+    end
+
     initial begin
         clk = 0;
         rst = 0;
         cycle_count = 0;
         instr_count = 0;
         done_seen = 0;
+        st_valid = 0;
+        ex_v = 0;
+        mem_v = 0;
+        wb_v = 0;
+        log_fd = 0;
+        if ($value$plusargs("commit_log=%s", log_path))
+            log_fd = $fopen(log_path, "w");
 
         // reset pulse
         repeat (2) @(posedge clk);
@@ -76,6 +118,8 @@ module tb_pipeline_count_clean;
         end
 
         $display("==== DONE ====");
+        if (log_fd)
+            $fclose(log_fd);
         $finish;
     end
 endmodule
@@ -144,9 +144,10 @@ class RV32IAssembler:
         """去掉註解，拆 label，返回 (指令列表, label地址表)"""
         cleaned = []
         labels = {}
+        self.line_of = {}  # pc -> 原始行號 (給 .map 用)
         pc = 0  # 以 byte 為單位
 
-        for raw in lines:
+        for line_num, raw in enumerate(lines, 1):
             line = re.sub(r'//.*$|#.*$', '', raw).strip()
             if not line:
                 continue
@@ -168,6 +169,7 @@ class RV32IAssembler:
 
             # 剩下的是一條真正指令
             cleaned.append((pc, line))
+            self.line_of[pc] = line_num
             pc += 4
 
         return cleaned, labels
@@ -290,9 +292,11 @@ class RV32IAssembler:
 
     # --- 組整個檔案並輸出 txt/coe ---
 
-    def assemble_file(self, input_path, out_txt, out_coe=None):
+    def assemble_file(self, input_path, out_txt, out_coe=None, out_map=None):
         if out_coe is None:
             out_coe = os.path.splitext(out_txt)[0] + '.coe'
+        if out_map is None:
+            out_map = os.path.splitext(out_txt)[0] + '.map'
 
         with open(input_path, 'r', encoding='utf-8') as f:
             lines = f.readlines()
@@ -328,10 +332,20 @@ class RV32IAssembler:
                 else:
                     f.write(f"{code:08x},\n")
 
+        # map: label 地址 + 每條指令的原始行號 (tools/asm_profile.py 讀這個格式)
+        with open(out_map, 'w', encoding='utf-8') as f:
+            f.write("# symbols\n")
+            for label, addr in sorted(labels.items(), key=lambda kv: kv[1]):
+                f.write(f"{addr:08x} {label}\n")
+            f.write("# lines\n")
+            for pc, text in instr_list:
+                f.write(f"{pc:08x} {input_path}:{self.line_of[pc]}  {text}\n")
+
         print("=" * 80)
         print(f"Generated {len(machine)} instructions")
         print(f"TXT: {out_txt}")
         print(f"COE: {out_coe}")
+        print(f"MAP: {out_map}")
         print("=" * 80)
 
 
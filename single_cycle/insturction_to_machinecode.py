@@ -405,7 +405,8 @@ class RV32IAssembler:
             raise ValueError(f"Assembly failed: {str(e)} (original instruction: {line_clean})")
 
     # Core functionality: Read custom ASM file and generate machine code to TXT and COE
-    def assemble_file(self, input_asm_path, output_txt_path, output_coe_path=None):
+    def assemble_file(self, input_asm_path, output_txt_path, output_coe_path=None,
+                      output_map_path=None):
         """
         Assembles a user-written ASM file into machine code and writes to TXT and COE files
         
@@ -413,11 +414,16 @@ class RV32IAssembler:
             input_asm_path: Path to input ASM file (user-defined instruction file)
             output_txt_path: Path to output TXT file (32-bit binary per line)
             output_coe_path: Path to output COE file (optional, auto-generated if None)
+            output_map_path: Path to output symbol/line map (optional, auto-generated
+                             if None; the tools/rv32i_asm.py --map format read by
+                             tools/asm_profile.py)
         """
-        # Auto-generate COE path if not provided
+        # Auto-generate COE and map paths if not provided
+        base_path = os.path.splitext(output_txt_path)[0]
         if output_coe_path is None:
-            base_path = os.path.splitext(output_txt_path)[0]
             output_coe_path = base_path + '.coe'
+        if output_map_path is None:
+            output_map_path = base_path + '.map'
 
         # Read user's ASM file
         try:
@@ -458,11 +464,13 @@ class RV32IAssembler:
         print("-" * 80)
 
         # Assemble line by line (second pass)
+        line_map = []
         for line_num, line, line_clean, pc_addr in instructions:
             try:
                 code = self.assemble_instr(line_clean, labels=labels, curr_addr=pc_addr)
                 if code is not None:
                     machine_codes.append(code)
+                    line_map.append((pc_addr, line_num, line_clean))
                     print(f"{line_num:<4} {line.strip():<50} 0x{code:08X} {'Success'}")
                 else:
                     print(f"{line_num:<4} {line.strip():<50} {'-':<12} {'Empty line/Comment'}")
@@ -486,6 +494,15 @@ class RV32IAssembler:
                     f.write(f"{code:08x};")
                 else:
                     f.write(f"{code:08x},\n")
+
+        # Write symbol/line map (PC -> label and source line)
+        with open(output_map_path, 'w', encoding='utf-8') as f:
+            f.write("# symbols\n")
+            for label, addr in sorted(labels.items(), key=lambda kv: kv[1]):
+                f.write(f"{addr:08x} {label}\n")
+            f.write("# lines\n")
+            for pc_addr, line_num, line_clean in line_map:
+                f.write(f"{pc_addr:08x} {input_asm_path}:{line_num}  {line_clean.strip()}\n")
         
         # Output summary
         print("=" * 80)
@@ -493,6 +510,7 @@ class RV32IAssembler:
         print(f"Machine code saved to:")
         print(f"  - Binary TXT file: {output_txt_path}")
         print(f"  - COE file: {output_coe_path}")
+        print(f"  - Symbol/line map: {output_map_path}")
         print("=" * 80)
         return True
 
@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Incremental re-assembly with an on-disk section cache.
+
+The source is cut into sections at every label definition. Each section is
+content-hashed and assembled on its own at offset 0: branches inside the
+section resolve to position-independent offsets, references to other
+sections stay as fixups. The encoded words, line offsets, labels and fixups
+are cached per hash, so after an edit only the changed sections are
+re-encoded; everything else is laid out from the cache and the cross-section
+fixups (the branches/jals whose label offsets may have moved) are patched.
+A section containing .align depends on where it lands, so its base address
+is part of its key, as are the short forms relaxation picked for its
+call/tail/la sites: the layout is repeated with relax_step() until it
+settles, exactly like the full assembler, and the entries of every round are
+kept so an unchanged source hits the cache in each round.
+
+Lines in .data are not sectioned: directives are cheap to re-run, so the
+data image is rebuilt on every run and its labels are resolved together with
+the text labels.
+
+With --inst-mem the existing Inst_Mem.v is updated line by line: only the
+memory[i] = 32'h... lines whose word changed are rewritten (lines are added
+or dropped when the program length changes), and the file is left alone when
+nothing changed.
+
+Usage (from lode_runner/):
+  python3 ../tools/asm_incremental.py LodeRunner_CPU.asm --inst-mem CPU/Inst_Mem.v
+  python3 ../tools/asm_incremental.py game.asm --inst-mem CPU/Inst_Mem.v \
+      --data-base 0x1000 --data CPU/lode_runner_map_128x64_mem_init.vh
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+
+from rv32i_asm import (AsmError, Assembler, INST_MEM_MARKER, PCREL_KINDS, _patch,
+                       inst_mem_text, relax_step, section_switch, split_line,
+                       write_coe, write_data_image, write_txt)
+
+CACHE_VERSION = 4
+
+_MEM_LINE_RE = re.compile(r"^(\s*)memory\[(\d+)\]\s*=\s*32'h([0-9a-fA-F]+)\s*;")
+
+
+def split_sections(text: str):
+    """Cut .text lines into sections at each label line; return (sections, data lines).
+
+    Section directives themselves belong to neither list.
+    """
+    sections = []
+    data_lines = []
+    cur = []
+    in_data = False
+    for lineno, raw in enumerate(text.splitlines(), 1):
+        labels, line = split_line(raw)
+        sec = section_switch(line) if line[:1] == "." else None
+        if sec is not None:
+            in_data = sec == "data"
+            if labels:
+                raise AsmError("Put labels on their own line before a section directive",
+                               lineno, raw)
+            continue
+        if in_data:
+            data_lines.append((lineno, raw))
+            continue
+        if labels and cur:
+            sections.append(cur)
+            cur = []
+        cur.append((lineno, raw))
+    if cur:
+        sections.append(cur)
+    return sections, data_lines
+
+
+def _has_align(section):
+    return any(split_line(raw)[1].lower().startswith(".align") for _, raw in section)
+
+
+def section_key(section, base=None, short=None):
+    h = hashlib.sha1()
+    for _, raw in section:
+        h.update(raw.encode("utf-8"))
+        h.update(b"\n")
+    if base is not None:
+        h.update(f"@{base}".encode("ascii"))
+    if short:
+        h.update(repr(sorted(short.items())).encode("ascii"))
+    return h.hexdigest()
+
+
+class SectionCache:
+    """{hash: {"words", "lines", "labels", "fixups"}} stored as JSON."""
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        if path and os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                if data.get("version") == CACHE_VERSION:
+                    self.entries = data.get("sections", {})
+            except (OSError, ValueError):
+                self.entries = {}
+
+    def save(self, used_keys):
+        if not self.path:
+            return
+        keep = {k: self.entries[k] for k in used_keys if k in self.entries}
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"version": CACHE_VERSION, "sections": keep}, f, separators=(",", ":"))
+        os.replace(tmp, self.path)
+
+
+def default_cache_path(asm_path):
+    d, name = os.path.split(os.path.abspath(asm_path))
+    return os.path.join(d, ".asmcache", name + ".json")
+
+
+def encode_section(asm: Assembler, section, source_name, base=0, short=None):
+    """Assemble one section at offset 0; line numbers are kept relative.
+
+    base only matters to .align, which pads as if the section started there;
+    short maps the section's relaxation site ids to their short forms.
+    """
+    asm.short_sites = short or {}
+    asm._reset()
+    first = section[0][0]
+    if base:
+        asm.words = [0] * (base >> 2)
+        asm.lines = [0] * (base >> 2)
+    asm.feed(section, source_name)
+    if base:
+        skip = base >> 2
+        asm.words = asm.words[skip:]
+        asm.lines = asm.lines[skip:]
+        asm.labels = {n: off - base for n, off in asm.labels.items()}
+        asm.fixups = [(i - skip, k, sym, pc - base, a) for i, k, sym, pc, a in asm.fixups]
+        asm.relax_sites = [(site, i - skip, k, sym, a) for site, i, k, sym, a in asm.relax_sites]
+    return {
+        "words": asm.words,
+        "lines": [ln - first for ln in asm.lines],
+        "labels": asm.labels,
+        "fixups": [list(f) for f in asm.fixups],
+        "sites": [list(r) for r in asm.relax_sites],
+    }
+
+
+def assemble_incremental(text: str, cache: SectionCache, source_name="<asm>",
+                         data_base: int = 0, relax: bool = True):
+    """Assemble text reusing cached sections.
+
+    Returns (Program, stats) where stats has sections, reencoded, fixups,
+    relaxed.
+    """
+    asm = Assembler(data_base)
+    sections, data_lines = split_sections(text)
+
+    # .data: always rebuilt; fixups are resolved after the text labels exist
+    dasm = Assembler(data_base)
+    dasm._reset()
+    dasm.section = "data"
+    dasm.feed(data_lines, source_name)
+
+    used = set()
+    reencoded = 0
+    short = {}              # (section index, site id) -> short form
+    pinned = set()
+    while True:
+        words, lines, fixups, sites = [], [], [], []
+        labels = dict(dasm.labels)
+        raw_by_line = {}
+        for si, section in enumerate(sections):
+            base = 4 * len(words)
+            local = {site: form for (i, site), form in short.items() if i == si}
+            key = section_key(section, base if _has_align(section) else None, local)
+            used.add(key)
+            entry = cache.entries.get(key)
+            if entry is None:
+                entry = cache.entries[key] = encode_section(asm, section, source_name,
+                                                            base, local)
+                reencoded += 1
+            first = section[0][0]
+            for name, off in entry["labels"].items():
+                if name in labels:
+                    ln = next(n for n, raw in section if name in split_line(raw)[0])
+                    raise AsmError(f"Duplicate label '{name}'", ln, filename=source_name)
+                labels[name] = base + off
+            for idx, kind, sym, pc, addend in entry["fixups"]:
+                fixups.append((len(words) + idx, kind, sym, base + pc, addend))
+                raw_by_line[first + entry["lines"][idx]] = None
+            for site, idx, kind, sym, addend in entry["sites"]:
+                sites.append(((si, site), len(words) + idx, kind, sym, addend))
+            words.extend(entry["words"])
+            lines.extend(first + rel for rel in entry["lines"])
+        if not relax or not sites:
+            break
+        if not relax_step(sites, labels, dasm.data_labels, short, pinned):
+            break
+
+    if raw_by_line:
+        src = text.splitlines()
+        for ln in raw_by_line:
+            raw_by_line[ln] = src[ln - 1]
+    for idx, kind, sym, pc, addend in fixups:
+        addr = labels.get(sym)
+        ln = lines[idx]
+        if kind in PCREL_KINDS and sym in dasm.data_labels:
+            raise AsmError(f"'{sym}' is a .data label, not a code address", ln,
+                           raw_by_line.get(ln), source_name)
+        if addr is None:
+            raise AsmError(f"Unknown label or immediate: '{sym}'", ln,
+                           raw_by_line.get(ln), source_name)
+        try:
+            words[idx] = _patch(kind, words[idx], addr + addend, pc)
+        except ValueError as e:
+            raise AsmError(f"Assembly failed: {e}", ln, raw_by_line.get(ln),
+                           source_name) from None
+
+    dasm.labels = labels
+    dasm.resolve(source_name)
+    dasm.words, dasm.lines = words, lines
+
+    cache.save(used)
+    stats = {"sections": len(sections), "reencoded": reencoded, "fixups": len(fixups),
+             "relaxed": len(short)}
+    return dasm.program(source_name), stats
+
+
+def update_inst_mem(words, path):
+    """Rewrite only the memory[i] lines of path whose word changed.
+
+    Returns the number of memory lines written (0: file untouched).
+    """
+    with open(path, "r", encoding="ascii") as f:
+        text = f.read()
+    src = text.splitlines(keepends=True)
+    slots = {}              # index -> position in src
+    indent = "    "
+    for pos, line in enumerate(src):
+        m = _MEM_LINE_RE.match(line)
+        if m:
+            slots[int(m.group(2))] = pos
+            indent = m.group(1)
+    if not slots:
+        new_text = inst_mem_text(words, text)
+        if new_text == text:
+            return 0
+        with open(path, "w", encoding="ascii") as f:
+            f.write(new_text)
+        return len(words)
+    if sorted(slots) != list(range(len(slots))):
+        raise ValueError(f"{path}: memory[] lines are not a contiguous 0..N-1 block")
+
+    changed = 0
+    for i, w in enumerate(words[:len(slots)]):
+        pos = slots[i]
+        m = _MEM_LINE_RE.match(src[pos])
+        if int(m.group(3), 16) != w:
+            src[pos] = f"{indent}memory[{i}] = 32'h{w:08x};\n"
+            changed += 1
+    last = slots[len(slots) - 1]
+    if len(words) > len(slots):
+        extra = [f"{indent}memory[{i}] = 32'h{words[i]:08x};\n"
+                 for i in range(len(slots), len(words))]
+        src[last + 1:last + 1] = extra
+        changed += len(extra)
+    elif len(words) < len(slots):
+        drop = {slots[i] for i in range(len(words), len(slots))}
+        changed += len(drop)
+        src = [line for pos, line in enumerate(src) if pos not in drop]
+    if changed:
+        with open(path, "w", encoding="ascii") as f:
+            f.write("".join(src))
+    return changed
+
+
+def main():
+    ap = argparse.ArgumentParser(description="incremental RV32I assembly with a section cache")
+    ap.add_argument("input", help="assembly source")
+    ap.add_argument("--inst-mem", help="Inst_Mem.v to update in place "
+                    f"(a template with '{INST_MEM_MARKER}' is filled on first use)")
+    ap.add_argument("-o", "--output", help="also write binary .txt (and .coe next to it)")
+    ap.add_argument("--cache", help="section cache file (default: .asmcache/<input>.json "
+                    "next to the source)")
+    ap.add_argument("--no-cache", action="store_true", help="ignore and do not write the cache")
+    ap.add_argument("--data-base", type=lambda v: int(v, 0), default=0,
+                    help="Data_Memory byte address of the first .data byte")
+    ap.add_argument("--no-relax", action="store_true",
+                    help="keep call/tail as auipc+jalr and la as lui+addi")
+    ap.add_argument("--data", action="append", default=[], metavar="PATH",
+                    help="data image output, .vh/.mem/.coe by extension (repeatable)")
+    args = ap.parse_args()
+
+    t0 = time.perf_counter()
+    try:
+        with open(args.input, "r", encoding="utf-8") as f:
+            text = f.read()
+        cache = SectionCache(None if args.no_cache else (args.cache or default_cache_path(args.input)))
+        prog, stats = assemble_incremental(text, cache, args.input, args.data_base,
+                                           not args.no_relax)
+        written = update_inst_mem(prog.words, args.inst_mem) if args.inst_mem else None
+        for path in args.data:
+            write_data_image(prog.data, prog.data_base, path)
+    except (OSError, ValueError) as e:
+        print(f"ERROR: {e}")
+        sys.exit(1)
+    if args.output:
+        write_txt(prog.words, args.output)
+        write_coe(prog.words, os.path.splitext(args.output)[0] + ".coe")
+    dt = time.perf_counter() - t0
+
+    print(f"{len(prog.words)} instructions, {stats['sections']} sections, "
+          f"{stats['reencoded']} re-encoded, {stats['fixups']} fixups patched, "
+          f"{stats['relaxed']} sites relaxed")
+    if args.data:
+        print(f"{len(prog.data)} data bytes @ {prog.data_base:#x} -> {', '.join(args.data)}")
+    if written is not None:
+        print(f"{args.inst_mem}: {written} memory lines rewritten" if written
+              else f"{args.inst_mem}: unchanged")
+    print(f"done in {dt * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
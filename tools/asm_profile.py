@@ -0,0 +1,362 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Execution profiler: instructions and pipeline cycles per pc, reported by
+label and by assembly source line.
+
+The program runs on the Basys3 SoC model (basys3_soc.py; plain programs
+never touch its MMIO and simply run to their end) with one
+pipeline_model.EdgeProfile per call stack, so the only per-block cost is
+that profile's counter update. Per-pc counts are derived from the edge
+counts after the run, and PipelineModel.pc_costs() charges every cycle of
+the estimate to one instruction: its issue slot, a load-use stall to the
+instruction that waits, bubbles and flushes to the branch or jump.
+
+Source positions come from the assembler: an .asm input is assembled here;
+an image (.txt/.coe/.mem/Inst_Mem.v) needs the symbol / line map written by
+`rv32i_asm.py --map`, `rv32i_link.py --map` or the single_cycle assemble_file
+(<output>.map). A pc belongs to the nearest label at or before it.
+
+The report lists the hottest labels and source lines. --folded writes
+folded stacks for flamegraph.pl / speedscope / inferno: one
+"frame;frame;... weight" line per stack, where the frames are the program,
+then for every call on the stack (jal/jalr with rd != 0 enters a function,
+jalr x0, 0(ra) leaves it) the context of the call site and the callee's
+label, then the context of the pc, plus its source line with
+--folded-lines. A context is the loops around a pc (static_cpi.py's natural
+loops, outermost first, named by their header label) and the pc's label.
+The weight is pipeline cycles, or instructions with --weight instrs.
+
+Usage:
+  python3 tools/asm_profile.py lode_runner/LodeRunner_CPU.asm \\
+      --data lode_runner/CPU/lode_runner_map_128x64_mem_init.vh \\
+      --frames 300 --buttons "0:R 100:U 200:L" --folded lr.folded
+  flamegraph.pl lr.folded > lr.svg
+  python3 tools/asm_profile.py Stress_test.asm --top 10
+  python3 tools/asm_profile.py game.coe --map game.map --max-steps 5000000 --load-latency 1
+"""
+
+import argparse
+import bisect
+import os
+import struct
+import sys
+import time
+from array import array
+
+from basys3_soc import Basys3SoC, load_program, parse_button_script, program_image
+from pipeline_model import EdgeProfile, PipelineModel
+from rv32i_asm import Assembler, Program, program_map, read_map, split_line
+from rv32i_iss import OP_JAL, OP_JALR, decode, load_data_image
+from static_cpi import StaticAnalysis
+
+MAX_DEPTH = 32      # call-stack frames kept apart (deeper recursion is merged)
+
+
+class SourceMap:
+    """pc -> label and (source, line, text) from a Program or a map file."""
+
+    def __init__(self, symbols, lines, data_symbols=()):
+        symbols = sorted(symbols, key=lambda s: s[0])
+        self.addrs = [a for a, _ in symbols]
+        self.names = [n for _, n in symbols]
+        self.data_names = [n for _, n in data_symbols]
+        self.lines = lines          # {pc: (source, line, text)}
+
+    @classmethod
+    def from_program(cls, prog: Program, text: str):
+        symbols, data_symbols, lines = program_map(prog)
+        src = text.splitlines()
+        return cls(symbols, {pc: (name, ln, split_line(src[ln - 1])[1] if 0 < ln <= len(src) else "")
+                             for pc, name, ln in lines}, data_symbols)
+
+    @classmethod
+    def from_file(cls, path: str):
+        symbols, data_symbols, lines = read_map(path)
+        return cls(symbols, lines, data_symbols)
+
+    def label_at(self, pc: int):
+        """Nearest label at or before pc (the last one defined there)."""
+        i = bisect.bisect_right(self.addrs, pc)
+        return self.names[i - 1] if i else f"0x{pc:04x}"
+
+    def line_at(self, pc: int):
+        return self.lines.get(pc)
+
+    def program(self, words):
+        """A Program with these labels for StaticAnalysis (image + map input)."""
+        labels = dict(zip(self.names, self.addrs))
+        lines = [self.lines.get(4 * i, ("", 0, ""))[1] for i in range(len(words))]
+        return Program(words, labels, lines, data_labels=self.data_names)
+
+
+def call_kind(sim, blk):
+    """1 if blk ends in a call (jal/jalr with rd != 0), -1 for a return, else 0."""
+    word = sim.fetch(blk.end - 4)
+    if word is None:
+        return 0
+    op, rd, rs1, _, _ = decode(word)
+    if op == OP_JAL or op == OP_JALR:
+        if rd:
+            return 1
+        if op == OP_JALR and rs1 == 1:
+            return -1
+    return 0
+
+
+class CallStackProfile:
+    """One EdgeProfile per call stack, a tuple of (call site pc, callee entry pc).
+
+    record() is the on_block callback; retired and stop_reason are kept
+    for the caller, and snapshot() / restore() save them with the current
+    stack and every profile, like EdgeProfile's.
+    """
+
+    def __init__(self, sim, max_depth: int = MAX_DEPTH):
+        self.sim = sim
+        self.max_depth = max_depth
+        self.stack = ()
+        self.profiles = {(): EdgeProfile(sim)}
+        self.retired = 0
+        self.stop_reason = None
+        self._prof = self.profiles[()]
+        self._kind = {}
+
+    def snapshot(self):
+        """The stack and the per-stack EdgeProfile snapshots as bytes."""
+        reason = (self.stop_reason or "").encode()
+        out = [struct.pack("<QIIB", self.retired, len(self.stack), len(self.profiles), len(reason)),
+               reason, array("q", (v for frame in self.stack for v in frame)).tobytes()]
+        for key, prof in self.profiles.items():
+            blob = prof.snapshot()
+            out += [struct.pack("<I", len(key)), array("q", (v for frame in key for v in frame)).tobytes(),
+                    struct.pack("<I", len(blob)), blob]
+        return b"".join(out)
+
+    def restore(self, data):
+        """Load snapshot() state; blocks are looked up again in self.sim."""
+        retired, depth, n_profiles, n_reason = struct.unpack_from("<QIIB", data)
+        pos = struct.calcsize("<QIIB")
+        self.retired = retired
+        self.stop_reason = data[pos:pos + n_reason].decode() or None
+        pos += n_reason
+
+        def frames(n):
+            nonlocal pos
+            it = iter(array("q", data[pos:pos + 16 * n]))
+            pos += 16 * n
+            return tuple(zip(it, it))
+
+        self.stack = frames(depth)
+        self.profiles = {}
+        for _ in range(n_profiles):
+            (n,) = struct.unpack_from("<I", data, pos)
+            pos += 4
+            key = frames(n)
+            (n,) = struct.unpack_from("<I", data, pos)
+            prof = self.profiles[key] = EdgeProfile(self.sim)
+            prof.restore(data[pos + 4:pos + 4 + n])
+            pos += 4 + n
+        self._kind = {}
+        self._prof = self.profiles.setdefault(self.stack[:self.max_depth], EdgeProfile(self.sim))
+
+    def record(self, blk, npc):
+        self._prof.record(blk, npc)
+        kind = self._kind.get(blk)
+        if kind is None:
+            kind = self._kind[blk] = call_kind(self.sim, blk)
+        if kind and npc >= 0:
+            self.stack = self.stack + ((blk.end - 4, npc),) if kind > 0 else self.stack[:-1]
+            key = self.stack[:self.max_depth]
+            prof = self.profiles.get(key)
+            if prof is None:
+                prof = self.profiles[key] = EdgeProfile(self.sim)
+            self._prof = prof
+
+
+class ProfileReport:
+    """Per-pc [instructions, cycles], flat and per call stack."""
+
+    def __init__(self, stacks: CallStackProfile, model: PipelineModel, smap: SourceMap,
+                 analysis: StaticAnalysis = None):
+        self.smap = smap
+        self.analysis = analysis
+        self.per_stack = {key: model.pc_costs(prof) for key, prof in stacks.profiles.items()}
+        self.flat = {}
+        for costs in self.per_stack.values():
+            for pc, (n, c) in costs.items():
+                f = self.flat.get(pc)
+                if f is None:
+                    self.flat[pc] = [n, c]
+                else:
+                    f[0] += n
+                    f[1] += c
+        self.instrs = sum(n for n, _ in self.flat.values())
+        self.cycles = sum(c for _, c in self.flat.values())
+        self._starts = sorted(analysis.blocks) if analysis is not None else []
+
+    def by_label(self):
+        """[(label, instrs, cycles, lowest pc, highest pc)] sorted by cycles."""
+        rows = {}
+        for pc, (n, c) in self.flat.items():
+            name = self.smap.label_at(pc)
+            r = rows.get(name)
+            if r is None:
+                rows[name] = [n, c, pc, pc]
+            else:
+                r[0] += n
+                r[1] += c
+                r[2] = min(r[2], pc)
+                r[3] = max(r[3], pc)
+        return sorted(((name, *r) for name, r in rows.items()), key=lambda r: -r[2])
+
+    def loops_at(self, pc: int):
+        """Header labels of the loops around pc, outermost first."""
+        an = self.analysis
+        if an is None or not self._starts:
+            return []
+        i = bisect.bisect_right(self._starts, pc >> 2) - 1
+        lp = an.innermost(self._starts[i]) if i >= 0 else None
+        names = []
+        while lp is not None:
+            names.append(self.smap.label_at(4 * lp.header))
+            lp = lp.parent
+        return names[::-1]
+
+    def _context(self, frames, pc):
+        """Append the loops around pc and its label, skipping repeats."""
+        for name in self.loops_at(pc) + [self.smap.label_at(pc)]:
+            if name != frames[-1]:
+                frames.append(name)
+
+    def folded(self, root: str, weight: str = "cycles", lines: bool = False):
+        """Folded-stack lines "a;b;c weight" (flamegraph.pl input)."""
+        out = {}
+        for key, costs in self.per_stack.items():
+            prefix = [root]
+            for site, entry in key:
+                self._context(prefix, site)
+                prefix.append(self.smap.label_at(entry))
+            for pc, (n, c) in costs.items():
+                value = c if weight == "cycles" else n
+                if not value:
+                    continue
+                frames = list(prefix)
+                self._context(frames, pc)
+                if lines:
+                    pos = self.smap.line_at(pc)
+                    frames.append(f"{_where(pos, pc)} {pos[2]}" if pos else f"0x{pc:04x}")
+                stack = ";".join(f.replace(";", ",") for f in frames)
+                out[stack] = out.get(stack, 0) + value
+        return [f"{stack} {value}" for stack, value in sorted(out.items())]
+
+
+def _where(pos, pc):
+    return f"{os.path.basename(pos[0])}:{pos[1]}" if pos else f"0x{pc:04x}"
+
+
+def format_report(name: str, rep: ProfileReport, stop: str, top: int = 15):
+    instrs, cycles = rep.instrs, rep.cycles
+    lines = [
+        f"==== {name} ({stop}): {instrs:,} instructions, {cycles:,} cycles"
+        + (f", CPI {cycles / instrs:.3f}" if instrs else "") + " ====",
+        f"  {'label':<24}{'lines':>16}{'instrs':>14}{'share':>8}{'cycles':>14}{'share':>8}{'CPI':>7}",
+    ]
+    for label, n, c, lo, hi in rep.by_label()[:top]:
+        a, b = rep.smap.line_at(lo), rep.smap.line_at(hi)
+        if a and b:
+            span = f"{a[1]}-{b[1]}" if a[1] != b[1] else str(a[1])
+        else:
+            span = f"0x{lo:04x}-0x{hi:04x}"
+        lines.append(f"  {label:<24}{span:>16}{n:>14,}{n / instrs * 100 if instrs else 0:>7.1f}%"
+                     f"{c:>14,}{c / cycles * 100 if cycles else 0:>7.1f}%"
+                     f"{c / n if n else 0:>7.3f}")
+    lines.append("")
+    lines.append(f"  {'line':<28}{'label':<24}{'execs':>12}{'cycles':>14}{'share':>8}  source")
+    hot = sorted(rep.flat.items(), key=lambda kv: -kv[1][1])[:top]
+    for pc, (n, c) in hot:
+        pos = rep.smap.line_at(pc)
+        lines.append(f"  {_where(pos, pc):<27} {rep.smap.label_at(pc):<24}{n:>12,}{c:>14,}"
+                     f"{c / cycles * 100 if cycles else 0:>7.1f}%  {pos[2] if pos else ''}")
+    return "\n".join(lines)
+
+
+def load_source(path: str, map_path: str = None, data_base: int = 0):
+    """(words, data image, SourceMap, StaticAnalysis or None) of an input."""
+    if path.lower().endswith((".asm", ".s")):
+        with open(path, "r", encoding="utf-8") as f:
+            text = f.read()
+        prog = Assembler(data_base).assemble(text, path)
+        return prog.words, program_image(prog), SourceMap.from_program(prog, text), prog
+    words, image = load_program(path)
+    if map_path is None:
+        return words, image, SourceMap([], {}), None
+    smap = SourceMap.from_file(map_path)
+    return words, image, smap, smap.program(words)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="per-pc / per-label / per-line execution profiler")
+    ap.add_argument("program", help=".asm source, or an image (.txt/.coe/.mem/Inst_Mem.v) with --map")
+    ap.add_argument("--map", help="symbol / line map of an image (rv32i_asm.py --map)")
+    ap.add_argument("--data", help="Data_Memory init image (.vh/.mem/.coe)")
+    ap.add_argument("--data-base", type=lambda v: int(v, 0), default=0, help="address of .data for .asm input")
+    ap.add_argument("--frames", type=int, default=0,
+                    help="stop after this many frames (display writes; 0: run to the end)")
+    ap.add_argument("--max-steps", type=int, default=100_000_000)
+    ap.add_argument("--buttons", default="", help='button events, e.g. "0:R 300:U+L 400:" or @file')
+    ap.add_argument("--switches", type=lambda v: int(v, 0), default=0, help="value read at 0x8008")
+    ap.add_argument("--frame-cycles", type=int, default=0,
+                    help="also end a frame every N timer cycles (programs without display writes)")
+    ap.add_argument("--top", type=int, default=15, help="rows in the label and line tables")
+    ap.add_argument("--folded", metavar="FILE", help="write folded stacks for flamegraph.pl")
+    ap.add_argument("--folded-lines", action="store_true", help="with --folded: source lines as leaf frames")
+    ap.add_argument("--weight", choices=["cycles", "instrs"], default="cycles",
+                    help="with --folded: pipeline cycles or instructions")
+    ap.add_argument("--max-depth", type=int, default=MAX_DEPTH, help="call-stack frames kept apart")
+    ap.add_argument("--taken-penalty", type=int, default=1)
+    ap.add_argument("--mispredict-penalty", type=int, default=2)
+    ap.add_argument("--load-latency", type=int, default=0,
+                    help="extra cycles per load (1 for the BRAM Data_Memory variant)")
+    args = ap.parse_args()
+
+    try:
+        words, image, smap, prog = load_source(args.program, args.map, args.data_base)
+        if args.data:
+            image.update(load_data_image(args.data))
+        script = parse_button_script(args.buttons)
+    except (OSError, ValueError) as e:
+        print(f"ERROR: {e}")
+        sys.exit(1)
+
+    if not smap.addrs and not smap.lines:
+        print(f"WARN: no symbol / line map for {args.program}: reporting by pc")
+    soc = Basys3SoC(words, image, buttons=script, switches=args.switches,
+                    frame_cycles=args.frame_cycles)
+    stacks = CallStackProfile(soc.sim, args.max_depth)
+    soc.profile = stacks            # run() calls record() and fills retired / stop_reason
+    t0 = time.perf_counter()
+    soc.run(args.frames or float("inf"), args.max_steps)
+    dt = time.perf_counter() - t0
+    stop = "frames" if args.frames and soc.frame >= args.frames else soc.sim.stop_reason
+
+    model = PipelineModel(args.taken_penalty, args.mispredict_penalty, args.load_latency)
+    analysis = StaticAnalysis(prog) if prog is not None else None
+    rep = ProfileReport(stacks, model, smap, analysis)
+    print(format_report(args.program, rep, stop, args.top))
+    print(f"  {stacks.retired:,} instructions in {dt:.2f}s "
+          f"({stacks.retired / dt / 1e6 if dt > 0 else 0:.2f} MIPS), {soc.frame} frames, "
+          f"{len(stacks.profiles)} call stacks")
+    if args.folded:
+        try:
+            with open(args.folded, "w", encoding="utf-8") as f:
+                f.write("\n".join(rep.folded(os.path.basename(args.program), args.weight,
+                                             args.folded_lines)) + "\n")
+        except OSError as e:
+            print(f"ERROR: {e}")
+            sys.exit(1)
+        print(f"wrote folded stacks ({args.weight}) -> {args.folded}")
+
+
+if __name__ == "__main__":
+    main()
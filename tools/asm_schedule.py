@@ -0,0 +1,355 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Hazard-aware peephole scheduler for assembled RV32I programs.
+
+hazard_unit.v stalls one cycle whenever a load in ID/EX is followed by an
+instruction whose raw rs1 or rs2 field equals the load's rd (see
+pipeline_model.load_use; an addi whose imm[4:0] happens to match stalls
+too). This pass reorders instructions inside each basic block so that such
+pairs are split by independent work.
+
+Blocks start at every text label, every branch/jal target and after every
+branch/jal/jalr; a block's control transfer stays last. Instructions keep every register RAW/WAR/WAW
+order; stores keep their order against all loads and stores (no alias
+analysis), loads may pass each other. auipc (pc-relative), csr*, ecall,
+ebreak and fence are barriers that nothing crosses. Label addresses and
+block sizes never change, so branch offsets stay valid. A block is only
+rewritten when its schedule has fewer stall sites than the original; the
+scheduling is a greedy list schedule in source order that picks the first
+ready instruction that does not stall behind the previous one.
+
+The pipeline has no branch delay slot (the redirect squashes the fetched
+word), so the branch shadow that matters is the slot between a load and the
+conditional branch that tests it, which in-block reordering cannot fill when
+the whole block feeds the load. A second phase hoists the first instruction
+of the fall-through block into that slot when it is a plain ALU op that the
+load and branch do not depend on, the fall-through block has no other
+entry, and register liveness over the CFG shows its result is dead at the
+branch target (so executing it on the taken path changes nothing). The
+branch moves down one word and its offset is re-encoded.
+
+Static stall sites are counted once per block. With --measure, both versions
+run on the ISS and pipeline_model reports the dynamic load-use stall cycles
+and total cycles before and after.
+
+Usage:
+  python3 tools/asm_schedule.py snake.asm Stress_test.asm --measure
+  python3 tools/asm_schedule.py lode_runner/LodeRunner_CPU.asm --inst-mem lode_runner/CPU/Inst_Mem.v
+  python3 tools/rv32i_asm.py game.asm --schedule          # same pass from the assembler
+"""
+
+import argparse
+import os
+import sys
+
+from pipeline_model import PipelineModel, load_use, profile_program
+from rv32i_asm import (Assembler, b_field, check_signed, data_words, write_coe,
+                       write_data_image, write_inst_mem, write_txt)
+from rv32i_iss import decode
+
+# instruction classes
+ALU, LOAD, STORE, CTRL, BARRIER = range(5)
+
+
+def classify(word: int):
+    """(class, defined register or 0, used registers) of an instruction word."""
+    opc = word & 0x7F
+    rd = (word >> 7) & 0x1F
+    rs1 = (word >> 15) & 0x1F
+    rs2 = (word >> 20) & 0x1F
+    if opc == 0x33:
+        return ALU, rd, (rs1, rs2)
+    if opc == 0x13:
+        return ALU, rd, (rs1,)
+    if opc == 0x37:
+        return ALU, rd, ()
+    if opc == 0x03:
+        return LOAD, rd, (rs1,)
+    if opc == 0x23:
+        return STORE, 0, (rs1, rs2)
+    if opc == 0x63:
+        return CTRL, 0, (rs1, rs2)
+    if opc == 0x6F:
+        return CTRL, rd, ()
+    if opc == 0x67:
+        return CTRL, rd, (rs1,)
+    return BARRIER, 0, ()
+
+
+def control_target(i: int, word: int):
+    """Word index a branch/jal at index i jumps to, else None."""
+    if word & 0x7F in (0x63, 0x6F):
+        return i + (decode(word)[4] >> 2)
+    return None
+
+
+def entry_points(words, labels, data_labels=()):
+    """Word indices reachable other than by falling through: labels and targets."""
+    n = len(words)
+    entries = {0}
+    for name, addr in labels.items():
+        if name not in data_labels and 0 <= addr < 4 * n:
+            entries.add(addr >> 2)
+    for i, w in enumerate(words):
+        t = control_target(i, w)
+        if t is not None and 0 <= t < n:
+            entries.add(t)
+    return entries
+
+
+def block_starts(words, labels, data_labels=(), entries=None):
+    """Sorted start indices of the basic blocks of words."""
+    n = len(words)
+    starts = set(entries if entries is not None else entry_points(words, labels, data_labels))
+    for i, w in enumerate(words):
+        cls = classify(w)[0]
+        if cls == CTRL:
+            starts.add(i + 1)
+        elif cls == BARRIER:
+            starts.add(i)
+            starts.add(i + 1)
+    return sorted(s for s in starts if s < n)
+
+
+ALL_REGS = 0xFFFFFFFE
+
+
+def live_in(words, starts):
+    """{block start: mask of registers live on entry}, conservatively.
+
+    jalr, barriers and running off the end count as using every register.
+    """
+    n = len(words)
+    bounds = list(zip(starts, starts[1:] + [n]))
+    gen, kill, succ = {}, {}, {}
+    for s, e in bounds:
+        use = defs = 0
+        for w in words[s:e]:
+            cls, d, uses = classify(w)
+            if cls == BARRIER:
+                use |= ALL_REGS & ~defs
+                continue
+            for r in uses:
+                if r and not defs >> r & 1:
+                    use |= 1 << r
+            if d:
+                defs |= 1 << d
+        gen[s], kill[s] = use, defs
+        last = words[e - 1]
+        opc = last & 0x7F
+        if opc == 0x67 or classify(last)[0] == BARRIER:
+            succ[s] = None
+        elif opc == 0x6F:
+            t = control_target(e - 1, last)
+            succ[s] = [t] + ([e] if (last >> 7) & 0x1F else [])
+        elif opc == 0x63:
+            succ[s] = [control_target(e - 1, last), e]
+        else:
+            succ[s] = [e]
+        if succ[s] is not None and any(not 0 <= t < n for t in succ[s]):
+            succ[s] = None
+    live = {s: 0 for s in starts}
+    changed = True
+    while changed:
+        changed = False
+        for s, _ in reversed(bounds):
+            nxt = succ[s]
+            out = ALL_REGS if nxt is None else 0
+            if nxt is not None:
+                for t in nxt:
+                    out |= live.get(t, ALL_REGS)
+            new = gen[s] | (out & ~kill[s])
+            if new != live[s]:
+                live[s] = new
+                changed = True
+    return live
+
+
+def count_stalls(seq, prev=None):
+    stalls = 0
+    for w in seq:
+        if prev is not None and load_use(prev, w):
+            stalls += 1
+        prev = w
+    return stalls
+
+
+def _dependencies(body):
+    """preds[j]: indices i < j that must stay before body[j]."""
+    info = [classify(w) for w in body]
+    preds = []
+    for j, (cls_j, def_j, use_j) in enumerate(info):
+        p = []
+        for i in range(j):
+            cls_i, def_i, use_i = info[i]
+            if ((def_i and (def_i in use_j or def_i == def_j))     # RAW, WAW
+                    or (def_j and def_j in use_i)                    # WAR
+                    or (STORE in (cls_i, cls_j) and cls_i in (LOAD, STORE)
+                        and cls_j in (LOAD, STORE))):
+                p.append(i)
+        preds.append(p)
+    return preds
+
+
+def schedule_block(body, prev=None):
+    """Greedy list schedule of body (no control words); returns new order.
+
+    prev: word executed just before the block (fall-through), if any.
+    """
+    n = len(body)
+    if n < 2:
+        return list(range(n))
+    preds = _dependencies(body)
+    done = [False] * n
+    order = []
+    last = prev
+    for _ in range(n):
+        ready = [j for j in range(n) if not done[j] and all(done[i] for i in preds[j])]
+        pick = ready[0]
+        if last is not None and load_use(last, body[pick]):
+            for j in ready[1:]:
+                if not load_use(last, body[j]):
+                    pick = j
+                    break
+        done[pick] = True
+        order.append(pick)
+        last = body[pick]
+    return order
+
+
+def _hoist_into_shadow(out, lines, entries):
+    """Phase 2: fill load -> branch slots from the fall-through block."""
+    starts = block_starts(out, {}, entries=entries)
+    live = live_in(out, starts)
+    hoisted = 0
+    for i in range(1, len(out) - 1):
+        load, br, x = out[i - 1], out[i], out[i + 1]
+        if br & 0x7F != 0x63 or not load_use(load, br) or i + 1 in entries:
+            continue
+        cls, d, uses = classify(x)
+        if cls != ALU or not d or load_use(load, x):
+            continue
+        _, _, br_uses = classify(br)
+        target = control_target(i, br)
+        if d in br_uses or d == (load >> 7) & 0x1F or live.get(target, ALL_REGS) >> d & 1:
+            continue
+        off = 4 * (target - (i + 1))
+        try:
+            check_signed(off, 13, "B-type")
+        except ValueError:
+            continue
+        out[i], out[i + 1] = x, (br & 0x01FFF07F) | b_field(off)
+        if lines is not None:
+            lines[i], lines[i + 1] = lines[i + 1], lines[i]
+        hoisted += 1
+    return hoisted
+
+
+def schedule_words(words, labels, data_labels=(), lines=None):
+    """Schedule every block of words.
+
+    Returns (new words, new lines, stats) with stats: blocks, changed,
+    hoisted, stalls_before, stalls_after (static stall sites).
+    """
+    out = list(words)
+    out_lines = list(lines) if lines is not None else None
+    entries = entry_points(words, labels, data_labels)
+    starts = block_starts(words, labels, data_labels, entries) + [len(words)]
+    changed = 0
+    for s, e in zip(starts, starts[1:]):
+        block = words[s:e]
+        if classify(block[-1])[0] == CTRL:
+            body, tail = block[:-1], block[-1:]
+        else:
+            body, tail = block, []
+        prev = words[s - 1] if s and classify(words[s - 1])[0] != CTRL else None
+        old = count_stalls(body + tail, prev)
+        if old == 0 or classify(block[0])[0] == BARRIER:
+            continue
+        order = schedule_block(body, prev)
+        new_body = [body[j] for j in order]
+        if count_stalls(new_body + tail, prev) >= old:
+            continue
+        changed += 1
+        out[s:s + len(body)] = new_body
+        if out_lines is not None:
+            out_lines[s:s + len(body)] = [lines[s + j] for j in order]
+    hoisted = _hoist_into_shadow(out, out_lines, entries)
+    stats = {"blocks": len(starts) - 1, "changed": changed, "hoisted": hoisted,
+             "stalls_before": count_stalls(words), "stalls_after": count_stalls(out)}
+    return out, out_lines, stats
+
+
+def schedule_program(prog):
+    """Schedule an assembled (absolute) Program in place; returns stats."""
+    if prog.relocs:
+        raise ValueError("cannot schedule a relocatable object; schedule the linked image")
+    prog.words, prog.lines, stats = schedule_words(prog.words, prog.labels,
+                                                   prog.data_labels, prog.lines)
+    return stats
+
+
+def measure(words, data_image=None, max_steps=10_000_000):
+    prof = profile_program(words, max_steps, data_image)
+    return PipelineModel().estimate(prof)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="hazard-aware RV32I block scheduler")
+    ap.add_argument("inputs", nargs="+", help="assembly sources")
+    ap.add_argument("-o", "--output", help="binary .txt output for a single input (and .coe)")
+    ap.add_argument("--inst-mem", help="rewrite this Inst_Mem.v (single input)")
+    ap.add_argument("--data-base", type=lambda v: int(v, 0), default=0)
+    ap.add_argument("--measure", action="store_true",
+                    help="run both versions on the ISS and compare pipeline_model cycles")
+    ap.add_argument("--max-steps", type=int, default=2_000_000)
+    args = ap.parse_args()
+    if len(args.inputs) > 1 and (args.output or args.inst_mem):
+        ap.error("-o/--inst-mem take a single input")
+
+    total_saved = 0
+    failed = False
+    for path in args.inputs:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                text = f.read()
+            prog = Assembler(args.data_base).assemble(text, path)
+            original = list(prog.words)
+            st = schedule_program(prog)
+            if args.output:
+                write_txt(prog.words, args.output)
+                write_coe(prog.words, os.path.splitext(args.output)[0] + ".coe")
+                if prog.data:
+                    write_data_image(prog.data, prog.data_base,
+                                     os.path.splitext(args.output)[0] + "_data.vh")
+            if args.inst_mem:
+                write_inst_mem(prog.words, args.inst_mem)
+        except (OSError, ValueError) as e:
+            print(f"ERROR: {e}")
+            failed = True
+            continue
+
+        saved = st["stalls_before"] - st["stalls_after"]
+        total_saved += saved
+        print(f"{path}: {st['changed']}/{st['blocks']} blocks rescheduled, "
+              f"{st['hoisted']} branch slots filled, "
+              f"static load-use stalls {st['stalls_before']} -> {st['stalls_after']} "
+              f"({saved} saved)")
+        if args.measure:
+            image = {(prog.data_base >> 2) + i: w
+                     for i, w in enumerate(data_words(prog.data))}
+            a = measure(original, image, args.max_steps)
+            b = measure(prog.words, image, args.max_steps)
+            print(f"  dynamic ({a['stop_reason']}, {a['retired']} instructions): "
+                  f"stall cycles {a['load_use_stalls']} -> {b['load_use_stalls']}, "
+                  f"cycles {a['cycles']} -> {b['cycles']} "
+                  f"({a['cycles'] - b['cycles']} saved)")
+    if len(args.inputs) > 1:
+        print(f"total static stalls saved: {total_saved}")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
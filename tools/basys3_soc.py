@@ -0,0 +1,463 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Virtual Basys3 SoC: the Data_Memory address map around the ISS.
+
+Implements the MMIO of lode_runner/CPU/Data_Mem.v so the games run headless
+at ISS speed, without a board or an RTL simulation:
+  0x0000..0x7FFF  Data_Memory (the ISS dmem)
+  0x8000          buttons, read {28'b0, buttons[3:0]}
+  0x8004          timer_value, a 100 MHz cycle counter
+  0x8008          switches (sw0 in snake/CPU/Data_Mem.v; reads 0 on the
+                  Lode Runner map, so it is harmless there)
+  0x9000          display command: a write starts a redraw, a read returns
+                  {display_busy, 31'b0}
+  0xA000..0xA3FF  OLED framebuffer (SSD1306 pages, byte page*128 + x, bit
+                  y % 8); written with sb only, like oled_fb_we
+  0xB000          debug LEDs (16 bits, read back)
+Other addresses read 0 and ignore writes. Like Data_Mem.v, a device read
+returns the whole word for every load width (lb of 0x9000 is
+{display_busy, 31'b0}, lb of a framebuffer byte is zero-extended).
+
+Time is counted in instructions: the timer and display_busy advance by
+--cpi cycles per retired instruction (1.0 by default; --profile reports
+the pipeline_model CPI, 1.1 to 1.8 for the three games). A redraw keeps display_busy set for the
+Display_Engine UART transfer (1028 bytes x 10 bits at 1 Mbaud = 1.028M
+cycles); a write while busy queues one more transfer, like redraw_req.
+
+A frame ends with every write to 0x9000 (LodeRunner_CPU.asm, PetGame.asm),
+or every --frame-cycles for programs that never write it (snake.asm), at
+the end of the basic block that reaches the cycle count.
+--buttons is a script of "frame:value" events that take effect when that
+frame starts and hold until the next event. Values are U/D/L/R letters
+joined with + (buttons[0..3] = UP, DOWN, LEFT, RIGHT on Lode Runner), a
+number, or empty for released; "@file" reads the events from a file.
+
+snapshot() saves the complete machine state (registers, pc, Data_Memory,
+framebuffer, timer, display and button state, the remaining button script,
+per-frame counts and the --profile edge counts) as a compact binary blob
+that restore() loads in about a millisecond. With --snapshot-dir one is
+written every --snapshot-every frames, right after the block that ends the
+frame (the ISS run stops there); --restore DIR --from-frame F resumes from the newest one
+at or before frame F, so a bug late in a recorded session is reached
+without replaying it from reset. --buttons given with --restore replaces
+the events after the snapshot frame.
+
+Usage:
+  python3 tools/basys3_soc.py lode_runner/LodeRunner_CPU.asm \\
+      --data lode_runner/CPU/lode_runner_map_128x64_mem_init.vh \\
+      --frames 2000 --buttons "0:R 300:U 600:L" --show
+  python3 tools/basys3_soc.py petgame_soc_pipeline_opt/PetGame.asm --frames 100000 --buttons "5000:1 5010:"
+  python3 tools/basys3_soc.py snake.asm --switches 1 --frame-cycles 4096 --frames 500 \\
+      --width 32 --height 32 --show --profile
+  python3 tools/basys3_soc.py lode_runner/LodeRunner_CPU.asm --data ... --frames 20000 \
+      --buttons @session.txt --snapshot-dir lr_snaps --snapshot-every 1000
+  python3 tools/basys3_soc.py --restore lr_snaps --from-frame 12000 --frames 12010 --show
+"""
+
+import argparse
+import os
+import re
+import struct
+import sys
+import time
+import zlib
+from array import array
+
+from pipeline_model import EdgeProfile, PipelineModel
+from rv32i_asm import Assembler
+from rv32i_iss import RV32ISim, load_data_image, load_words
+
+BTN_ADDR = 0x8000
+TIMER_ADDR = 0x8004
+SWITCH_ADDR = 0x8008
+DISPLAY_ADDR = 0x9000
+FB_BASE = 0xA000
+FB_SIZE = 1024
+LED_ADDR = 0xB000
+
+CLK_HZ = 100_000_000
+# Display_Engine: header + 1024 bytes, 10 UART bits each at BAUD_DIV = 100
+DISPLAY_BUSY_CYCLES = 1028 * 10 * 100
+
+BUTTON_BITS = {"U": 1, "D": 2, "L": 4, "R": 8}
+RUN_SLICE = 20_000      # instructions per ISS run between frame checks
+
+# snapshot(): header, then length-prefixed ISS state, framebuffer, pending
+# button events, instructions per frame and the pipeline profile
+SNAPSHOT_MAGIC = b"B3SS"
+SNAPSHOT_VERSION = 1
+_SNAP_HEADER = struct.Struct("<4sHxxdIIIIQQQQQQ")
+_SNAP_NAME = re.compile(r"frame_(\d+)\.b3s$")
+
+
+class SoCError(ValueError):
+    pass
+
+
+def parse_button_value(text: str):
+    text = text.strip()
+    if not text:
+        return 0
+    if re.fullmatch(r"(0x[0-9a-fA-F]+|\d+)", text):
+        return int(text, 0) & 0xF
+    value = 0
+    for name in text.upper().split("+"):
+        if name not in BUTTON_BITS:
+            raise SoCError(f"unknown button '{name}' (use U, D, L, R or a number)")
+        value |= BUTTON_BITS[name]
+    return value
+
+
+def parse_button_script(text: str):
+    """Sorted [(frame, buttons)] from "frame:value" events."""
+    if text.startswith("@"):
+        with open(text[1:], "r", encoding="utf-8") as f:
+            text = " ".join(line.split("#", 1)[0] for line in f)
+    events = {}
+    for tok in text.split():
+        frame, sep, value = tok.partition(":")
+        if not sep or not frame.isdigit():
+            raise SoCError(f"bad button event '{tok}' (expected frame:value)")
+        events[int(frame)] = parse_button_value(value)
+    return sorted(events.items())
+
+
+def fb_rows(fb, width: int = 128, height: int = 64):
+    """Page-format framebuffer -> list of rows of 0/1 pixels."""
+    return [[fb[(y >> 3) * width + x] >> (y & 7) & 1 for x in range(width)]
+            for y in range(height)]
+
+
+def render_text(fb, width: int = 128, height: int = 64):
+    """Two pixel rows per text line with half-block characters."""
+    rows = fb_rows(fb, width, height)
+    chars = " ▀▄█"
+    return "\n".join("".join(chars[top | bottom << 1] for top, bottom in zip(rows[y], rows[y + 1]))
+                     for y in range(0, height, 2))
+
+
+def write_pgm(path: str, fb, width: int = 128, height: int = 64):
+    data = bytes(255 if p else 0 for row in fb_rows(fb, width, height) for p in row)
+    with open(path, "wb") as f:
+        f.write(b"P5 %d %d 255\n" % (width, height) + data)
+
+
+class Basys3SoC:
+    """RV32ISim plus the Data_Memory MMIO devices, run frame by frame."""
+
+    def __init__(self, words, data_image=None, cpi: float = 1.0, buttons=(),
+                 switches: int = 0, frame_cycles: int = 0, profile: bool = False):
+        self.sim = RV32ISim(words)
+        if data_image:
+            self.sim.load_data(data_image)
+        self.sim.mmio_load = self.mmio_load
+        self.sim.mmio_store = self.mmio_store
+        self.cpi = cpi
+        self.script = list(buttons)
+        self.buttons = 0
+        self.switches = switches & 0xFFFFFFFF
+        self.leds = 0
+        self.fb = bytearray(FB_SIZE)
+        self.display_cmd = 0
+        self.display_writes = 0
+        self.busy_until = 0
+        self.frame_cycles = frame_cycles
+        self.next_cut = frame_cycles
+        self.frame = 0
+        self.frame_instrs = []      # instructions of every completed frame
+        self.on_frame = None        # callback(soc) after every frame
+        self.profile = EdgeProfile(self.sim) if profile else None
+        self.snapshot_every = 0     # frames between automatic snapshots
+        self.on_snapshot = None     # callback(soc, data) for each of them
+        self._in_run = 0            # instructions retired inside the current sim.run
+        self._stop_frame = 0        # sim.run ends after the block that completes this frame
+        self._slice = 0             # sim.run ends after the block that reaches this many
+        self._frame_start = 0
+        self._apply_script()
+
+    # --- time ---
+
+    def instret(self):
+        return self.sim.instret + self._in_run
+
+    def cycle(self):
+        return int(self.instret() * self.cpi)
+
+    # Slices end on a block boundary through the on_block return, never
+    # through the ISS budget, so profiles see every retired instruction.
+
+    def _on_block(self, blk, npc):
+        self._in_run += blk.n
+        return self._in_run >= self._slice
+
+    def _on_block_profiled(self, blk, npc):
+        self._in_run += blk.n
+        self.profile.record(blk, npc)
+        return self._in_run >= self._slice
+
+    # --- devices ---
+
+    def mmio_load(self, addr: int, size: int):
+        if addr == BTN_ADDR:
+            return self.buttons
+        if addr == TIMER_ADDR:
+            return self.cycle() & 0xFFFFFFFF
+        if addr == SWITCH_ADDR:
+            return self.switches
+        if addr == DISPLAY_ADDR:
+            return 0x80000000 if self.cycle() < self.busy_until else 0
+        if FB_BASE <= addr < FB_BASE + FB_SIZE:
+            return self.fb[addr - FB_BASE]
+        if addr == LED_ADDR:
+            return self.leds
+        return 0
+
+    def mmio_store(self, addr: int, size: int, value: int):
+        if FB_BASE <= addr < FB_BASE + FB_SIZE:
+            if size == 1:
+                self.fb[addr - FB_BASE] = value
+        elif addr == DISPLAY_ADDR:
+            self.display_cmd = value
+            self.display_writes += 1
+            now = self.cycle()
+            if now >= self.busy_until:
+                self.busy_until = now + DISPLAY_BUSY_CYCLES
+            elif self.busy_until - now <= DISPLAY_BUSY_CYCLES:
+                self.busy_until += DISPLAY_BUSY_CYCLES      # one queued redraw
+            self._end_frame()
+        elif addr == LED_ADDR:
+            self.leds = value & 0xFFFF
+
+    # --- snapshots ---
+
+    def snapshot(self):
+        """Complete machine state as bytes: ISS, devices, frame counters, profile."""
+        head = _SNAP_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, self.cpi, self.buttons,
+                                 self.switches, self.leds, self.display_cmd, self.display_writes,
+                                 self.busy_until, self.frame_cycles, self.next_cut, self.frame,
+                                 self._frame_start)
+        blobs = (self.sim.snapshot(), bytes(self.fb),
+                 array("q", (v for event in self.script for v in event)).tobytes(),
+                 zlib.compress(array("q", self.frame_instrs).tobytes(), 1),
+                 self.profile.snapshot() if self.profile is not None else b"")
+        return head + b"".join(struct.pack("<I", len(b)) + b for b in blobs)
+
+    def restore(self, data):
+        """Continue from a snapshot() (taken with the same program)."""
+        try:
+            (magic, version, self.cpi, self.buttons, self.switches, self.leds,
+             self.display_cmd, self.display_writes, self.busy_until, self.frame_cycles,
+             self.next_cut, self.frame, self._frame_start) = _SNAP_HEADER.unpack_from(data)
+            if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+                raise SoCError("not a basys3_soc snapshot (or a different version)")
+            blobs = []
+            pos = _SNAP_HEADER.size
+            for _ in range(5):
+                (n,) = struct.unpack_from("<I", data, pos)
+                blobs.append(data[pos + 4:pos + 4 + n])
+                pos += 4 + n
+            iss, fb, script, frames, profile = blobs
+            self.sim.restore(iss)
+            self.fb[:] = fb
+            it = iter(array("q", script))
+            self.script = list(zip(it, it))
+            self.frame_instrs = array("q", zlib.decompress(frames)).tolist()
+            if self.profile is not None:
+                # an EdgeProfile or asm_profile's CallStackProfile
+                if profile:
+                    self.profile.restore(profile)
+                else:
+                    self.profile = type(self.profile)(self.sim)
+        except (struct.error, zlib.error):
+            raise SoCError("snapshot is truncated or corrupt")
+
+    # --- frames ---
+
+    def _apply_script(self):
+        while self.script and self.script[0][0] <= self.frame:
+            self.buttons = self.script.pop(0)[1]
+
+    def _end_frame(self):
+        now = self.instret()
+        self.frame_instrs.append(now - self._frame_start)
+        self._frame_start = now
+        self.frame += 1
+        if self.frame >= self._stop_frame:
+            self._slice = 0
+        self._apply_script()
+        if self.on_frame is not None:
+            self.on_frame(self)
+
+    def run(self, frames: int, max_steps: int = 1_000_000_000):
+        """Run until `frames` frames completed, the program stops or max_steps."""
+        sim = self.sim
+        on_block = self._on_block_profiled if self.profile else self._on_block
+        every = self.snapshot_every
+        next_snapshot = (self.frame // every + 1) * every if every else 0
+        while self.frame < frames and sim.instret < max_steps:
+            # stop the ISS right after the frame the caller or a snapshot waits for
+            self._stop_frame = min(frames, next_snapshot) if every else frames
+            self._slice = RUN_SLICE
+            if self.frame_cycles:
+                self._slice = min(self._slice, max(1, int((self.next_cut - self.cycle()) / self.cpi) + 1))
+            self._in_run = 0
+            n = sim.run(max_steps=max_steps - sim.instret, on_block=on_block)
+            self._in_run = 0
+            if self.profile is not None:
+                self.profile.retired += n
+                self.profile.stop_reason = sim.stop_reason
+            if sim.stop_reason != "max_steps":
+                break
+            if self.frame_cycles and self.cycle() >= self.next_cut:
+                self.next_cut += self.frame_cycles
+                self._end_frame()
+            if every and self.frame >= next_snapshot:
+                # between ISS runs, so registers and pc are up to date
+                next_snapshot = (self.frame // every + 1) * every
+                if self.on_snapshot is not None:
+                    self.on_snapshot(self, self.snapshot())
+        return self.frame
+
+
+def find_snapshot(path: str, frame: int = None):
+    """path itself, or the newest frame_N.b3s in directory path with N <= frame."""
+    if not os.path.isdir(path):
+        return path
+    found = []
+    for name in os.listdir(path):
+        m = _SNAP_NAME.match(name)
+        if m and (frame is None or int(m.group(1)) <= frame):
+            found.append((int(m.group(1)), name))
+    if not found:
+        raise SoCError(f"no snapshot in {path}" + (f" at or before frame {frame}" if frame is not None else ""))
+    return os.path.join(path, max(found)[1])
+
+
+def program_image(prog):
+    """{word index: value} data image of an assembled Program's .data."""
+    image = {}
+    data = prog.data + bytes(-len(prog.data) % 4)
+    for i in range(0, len(data), 4):
+        image[(prog.data_base + i) // 4] = int.from_bytes(data[i:i + 4], "little")
+    return image
+
+
+def load_program(path: str, data_base: int = 0):
+    """(words, data image) of an .asm source or an assembled image."""
+    if path.lower().endswith((".asm", ".s")):
+        with open(path, "r", encoding="utf-8") as f:
+            prog = Assembler(data_base).assemble(f.read(), path)
+        return prog.words, program_image(prog)
+    return load_words(path), {}
+
+
+def main():
+    ap = argparse.ArgumentParser(description="headless Basys3 SoC (Data_Memory MMIO map) on the ISS")
+    ap.add_argument("program", nargs="?",
+                    help=".asm source or program image (.txt/.coe/.mem/Inst_Mem.v); "
+                         "optional with --restore")
+    ap.add_argument("--data", help="Data_Memory init image (.vh/.mem/.coe)")
+    ap.add_argument("--data-base", type=lambda v: int(v, 0), default=0, help="address of .data for .asm input")
+    ap.add_argument("--frames", type=int, default=1000, help="run until this frame (counted from reset)")
+    ap.add_argument("--max-steps", type=int, default=1_000_000_000)
+    ap.add_argument("--buttons", default="", help='button events, e.g. "0:R 300:U+L 400:" or @file')
+    ap.add_argument("--switches", type=lambda v: int(v, 0), default=0, help="value read at 0x8008")
+    ap.add_argument("--cpi", type=float, default=1.0, help="timer cycles per retired instruction")
+    ap.add_argument("--frame-cycles", type=int, default=0,
+                    help="also end a frame every N timer cycles (programs without display writes)")
+    ap.add_argument("--width", type=int, default=128, help="framebuffer width for rendering")
+    ap.add_argument("--height", type=int, default=64, help="framebuffer height for rendering")
+    ap.add_argument("--show", action="store_true", help="print the final framebuffer")
+    ap.add_argument("--dump", metavar="DIR", help="write frames as PGM images to DIR")
+    ap.add_argument("--dump-every", type=int, default=1, help="with --dump: every Nth frame")
+    ap.add_argument("--profile", action="store_true",
+                    help="estimate pipeline cycles per frame with pipeline_model")
+    ap.add_argument("--restore", metavar="PATH",
+                    help="continue from a snapshot file, or the newest one in a --snapshot-dir")
+    ap.add_argument("--from-frame", type=int,
+                    help="with a --restore directory: newest snapshot at or before this frame")
+    ap.add_argument("--snapshot", metavar="FILE", help="save the machine state at exit")
+    ap.add_argument("--snapshot-dir", metavar="DIR", help="write automatic snapshots to DIR")
+    ap.add_argument("--snapshot-every", type=int, default=500,
+                    help="with --snapshot-dir: frames between snapshots")
+    args = ap.parse_args()
+
+    if args.width * args.height // 8 > FB_SIZE or args.height % 8:
+        print(f"ERROR: --width x --height must fit the {FB_SIZE}-byte framebuffer in 8-row pages")
+        sys.exit(1)
+    if not args.program and not args.restore:
+        print("ERROR: give a program, or --restore a snapshot")
+        sys.exit(1)
+    try:
+        words, image = load_program(args.program, args.data_base) if args.program else ([], {})
+        if args.data:
+            image.update(load_data_image(args.data))
+        script = parse_button_script(args.buttons)
+        soc = Basys3SoC(words, image, args.cpi, script, args.switches, args.frame_cycles, args.profile)
+        if args.restore:
+            path = find_snapshot(args.restore, args.from_frame)
+            with open(path, "rb") as f:
+                data = f.read()
+            t0 = time.perf_counter()
+            soc.restore(data)
+            dt = time.perf_counter() - t0
+            if words and soc.sim.imem != words:
+                raise SoCError(f"{path} was taken with a different program")
+            if args.buttons:
+                soc.script = [e for e in script if e[0] > soc.frame]
+            print(f"restored {path}: frame {soc.frame}, instret {soc.sim.instret} "
+                  f"({len(data)} bytes, {dt * 1e3:.2f} ms)")
+        if args.snapshot_dir:
+            os.makedirs(args.snapshot_dir, exist_ok=True)
+    except (OSError, ValueError) as e:
+        print(f"ERROR: {e}")
+        sys.exit(1)
+
+    if args.snapshot_dir:
+        def save(s, data):
+            with open(os.path.join(args.snapshot_dir, f"frame_{s.frame:08d}.b3s"), "wb") as f:
+                f.write(data)
+        soc.snapshot_every = args.snapshot_every
+        soc.on_snapshot = save
+    if args.dump:
+        os.makedirs(args.dump, exist_ok=True)
+
+        def dump(s):
+            if s.frame % args.dump_every == 0:
+                write_pgm(os.path.join(args.dump, f"frame_{s.frame:06d}.pgm"), s.fb,
+                          args.width, args.height)
+        soc.on_frame = dump
+
+    frame0, instret0 = soc.frame, soc.sim.instret
+    t0 = time.perf_counter()
+    soc.run(args.frames, args.max_steps)
+    dt = time.perf_counter() - t0
+    if args.snapshot:
+        with open(args.snapshot, "wb") as f:
+            f.write(soc.snapshot())
+
+    sim = soc.sim
+    n = len(soc.frame_instrs)
+    stop = "frames" if n >= args.frames else sim.stop_reason
+    print(f"stop={stop} pc=0x{sim.pc:08x} frames={n} instret={sim.instret} "
+          f"time={dt:.3f}s ({(soc.frame - frame0) / dt if dt > 0 else 0:.0f} frames/s, "
+          f"{(sim.instret - instret0) / dt / 1e6 if dt > 0 else 0:.2f} MIPS)")
+    if n:
+        per = soc.frame_instrs
+        print(f"  instrs/frame  avg {sum(per) / n:.1f}  min {min(per)}  max {max(per)}")
+    print(f"  display writes {soc.display_writes} (last cmd 0x{soc.display_cmd:08x}), "
+          f"buttons 0x{soc.buttons:x}, leds 0x{soc.leds:04x}")
+    if soc.profile is not None and soc.profile.retired:
+        r = PipelineModel().estimate(soc.profile)
+        line = f"  pipeline model: CPI {r['cpi']:.3f}"
+        if n:
+            cycles = r["cycles"] / n
+            line += f", {cycles:.0f} cycles/frame -> {CLK_HZ / cycles:.0f} frames/s at 100 MHz"
+        print(line)
+    if args.show:
+        print(render_text(soc.fb, args.width, args.height))
+
+
+if __name__ == "__main__":
+    main()
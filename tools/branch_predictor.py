@@ -0,0 +1,393 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Branch predictor exploration on replayed ISS branch traces.
+
+ID.v hardwires backward-taken/forward-not-taken:
+    id_predicted_take = id_jump | (id_branch & imm[31])
+This tool runs a program once on the ISS, records every control transfer in
+order (pc, word, taken, target) together with the pipeline_model edge
+profile of the baseline estimate, and replays that trace through pluggable
+predictors. Costs use the same pipeline rules as pipeline_model.py:
+  - correct taken prediction resolved in ID: taken_penalty bubble (1)
+  - correct taken prediction with a BTB hit in IF: no bubble
+  - wrong direction (or wrong jalr target): mispredict_penalty flush (2)
+The static policy is the baseline, so its control cycles equal the
+pipeline_model taken bubbles + flush cycles.
+
+A predictor implements predict(pc, word) -> bool for conditional branches,
+target(pc) -> int | None for an IF-stage target (None: redirect in ID) and
+update(pc, word, taken, target). storage_bits is a rough size for comparing
+against its LUT/FF cost. A predictor with lookahead = True (an oracle bound)
+is also shown the resolved direction through peek(pc, word, taken) right
+before predict().
+
+Usage:
+  python3 tools/branch_predictor.py snake.coe
+  python3 tools/branch_predictor.py game.coe -p btfn -p bimodal:128 -p btb:16:gshare:256:6
+"""
+
+import argparse
+import sys
+
+from pipeline_model import EdgeProfile, PipelineModel
+from rv32i_iss import (OP_BEQ, OP_BGEU, OP_JAL, OP_JALR,
+                       RV32ISim, decode, load_data_image, load_words)
+
+KIND_BRANCH = 0
+KIND_JAL = 1
+KIND_JALR = 2
+
+
+# --- trace collection ---
+
+class BranchTrace:
+    """Ordered control-transfer trace: entries of (pc, word, kind, taken, target)."""
+
+    def __init__(self, sim: RV32ISim):
+        self.sim = sim
+        self.entries = []
+        self.retired = 0
+        self.stop_reason = None
+        self._term = {}
+
+    def _term_info(self, blk):
+        # (pc, word, kind) of the block's control word, or None
+        if blk.n == len(blk.body):
+            return None                 # pseudo-terminated (length cap)
+        pc = blk.end - 4
+        word = self.sim.fetch(pc)
+        op = decode(word)[0]
+        if op == OP_JAL:
+            return pc, word, KIND_JAL
+        if op == OP_JALR:
+            return pc, word, KIND_JALR
+        if OP_BEQ <= op <= OP_BGEU:
+            return pc, word, KIND_BRANCH
+        return None
+
+    def record(self, blk, npc):
+        if npc < 0:
+            return
+        info = self._term.get(blk, 0)
+        if info == 0:
+            info = self._term[blk] = self._term_info(blk)
+        if info is None:
+            return
+        pc, word, kind = info
+        if kind == KIND_BRANCH:
+            if blk.taken_pc == blk.fall_pc:
+                taken = self.sim.last_branch_taken
+            else:
+                taken = npc != blk.fall_pc
+        else:
+            taken = True
+        self.entries.append((pc, word, kind, taken, npc))
+
+
+def collect_trace(words, max_steps: int = 10_000_000, data_image=None, sim=None,
+                  profile: EdgeProfile = None):
+    """Run words on the ISS and return its BranchTrace.
+
+    profile, an EdgeProfile of sim, is filled by the same run.
+    """
+    if sim is None:
+        sim = RV32ISim(words)
+        if data_image:
+            sim.load_data(data_image)
+    trace = BranchTrace(sim)
+    on_block = trace.record
+    if profile is not None:
+        record, prof_record = trace.record, profile.record
+
+        def on_block(blk, npc):
+            record(blk, npc)
+            prof_record(blk, npc)
+    trace.retired = sim.run(max_steps=max_steps, on_block=on_block)
+    trace.stop_reason = sim.stop_reason
+    if profile is not None:
+        profile.retired = trace.retired
+        profile.stop_reason = trace.stop_reason
+    return trace
+
+
+# --- predictors ---
+
+class Predictor:
+    """Base class: static direction rule of ID.v, no IF-stage target."""
+
+    name = "btfn"
+    storage_bits = 0
+    lookahead = False
+
+    def peek(self, pc: int, word: int, taken: bool):
+        pass
+
+    def predict(self, pc: int, word: int):
+        return word >> 31 == 1
+
+    def target(self, pc: int):
+        return None
+
+    def update(self, pc: int, word: int, taken: bool, target: int):
+        pass
+
+
+class StaticBTFN(Predictor):
+    """Backward taken / forward not taken (the current RTL)."""
+
+
+class StaticNotTaken(Predictor):
+    name = "not-taken"
+
+    def predict(self, pc, word):
+        return False
+
+
+class Bimodal(Predictor):
+    """2-bit saturating counters indexed by pc[log2(entries)+1:2]."""
+
+    def __init__(self, entries: int = 64):
+        if entries & (entries - 1):
+            raise ValueError(f"bimodal entries must be a power of two: {entries}")
+        self.name = f"bimodal:{entries}"
+        self.mask = entries - 1
+        self.table = bytearray([1]) * entries    # weakly not taken
+        self.storage_bits = 2 * entries
+
+    def predict(self, pc, word):
+        return self.table[(pc >> 2) & self.mask] >= 2
+
+    def update(self, pc, word, taken, target):
+        if (word & 0x7F) != 0x63:
+            return
+        i = (pc >> 2) & self.mask
+        c = self.table[i]
+        if taken:
+            if c < 3:
+                self.table[i] = c + 1
+        elif c > 0:
+            self.table[i] = c - 1
+
+
+class GShare(Bimodal):
+    """2-bit counters indexed by pc xor global branch history."""
+
+    def __init__(self, entries: int = 256, history_bits: int = 8):
+        super().__init__(entries)
+        self.name = f"gshare:{entries}:{history_bits}"
+        self.hmask = (1 << history_bits) - 1
+        self.history = 0
+        self.storage_bits = 2 * entries + history_bits
+
+    def predict(self, pc, word):
+        return self.table[((pc >> 2) ^ self.history) & self.mask] >= 2
+
+    def update(self, pc, word, taken, target):
+        if (word & 0x7F) != 0x63:
+            return
+        i = ((pc >> 2) ^ self.history) & self.mask
+        c = self.table[i]
+        if taken:
+            if c < 3:
+                self.table[i] = c + 1
+        elif c > 0:
+            self.table[i] = c - 1
+        self.history = ((self.history << 1) | taken) & self.hmask
+
+
+class BTB(Predictor):
+    """Direct-mapped branch target buffer in front of a direction predictor.
+
+    A hit redirects fetch in IF (no bubble). Taken transfers allocate.
+    """
+
+    def __init__(self, entries: int = 16, direction: Predictor = None,
+                 addr_bits: int = 12):
+        if entries & (entries - 1):
+            raise ValueError(f"BTB entries must be a power of two: {entries}")
+        self.direction = direction or StaticBTFN()
+        self.name = f"btb:{entries}:{self.direction.name}"
+        self.lookahead = self.direction.lookahead
+        self.mask = entries - 1
+        self.tags = [-1] * entries
+        self.targets = [0] * entries
+        index_bits = entries.bit_length() - 1
+        tag_bits = max(addr_bits - 2 - index_bits, 0)
+        self.storage_bits = (self.direction.storage_bits
+                             + entries * (1 + tag_bits + addr_bits - 2))
+
+    def peek(self, pc, word, taken):
+        self.direction.peek(pc, word, taken)
+
+    def predict(self, pc, word):
+        return self.direction.predict(pc, word)
+
+    def target(self, pc):
+        i = (pc >> 2) & self.mask
+        return self.targets[i] if self.tags[i] == pc else None
+
+    def update(self, pc, word, taken, target):
+        self.direction.update(pc, word, taken, target)
+        if taken:
+            i = (pc >> 2) & self.mask
+            self.tags[i] = pc
+            self.targets[i] = target
+
+
+class Oracle(Predictor):
+    """Perfect direction, no BTB: the floor for ID-stage prediction."""
+
+    name = "oracle"
+    lookahead = True
+
+    def __init__(self):
+        self._next = False
+
+    def peek(self, pc, word, taken):
+        self._next = taken
+
+    def predict(self, pc, word):
+        return self._next
+
+
+def make_predictor(spec: str):
+    """Build a predictor from a spec such as bimodal:64, gshare:256:8,
+    btb:16:bimodal:64, btfn, not-taken, oracle."""
+    parts = spec.split(":")
+    name, args = parts[0], parts[1:]
+    try:
+        if name == "btfn":
+            return StaticBTFN()
+        if name == "not-taken":
+            return StaticNotTaken()
+        if name == "oracle":
+            return Oracle()
+        if name == "bimodal":
+            return Bimodal(*(int(a) for a in args[:1]))
+        if name == "gshare":
+            return GShare(*(int(a) for a in args[:2]))
+        if name == "btb":
+            entries = int(args[0]) if args else 16
+            inner = make_predictor(":".join(args[1:])) if len(args) > 1 else None
+            return BTB(entries, inner)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"bad predictor spec {spec!r}: {e}") from None
+    raise ValueError(f"unknown predictor {name!r}")
+
+
+DEFAULT_PREDICTORS = ("btfn", "not-taken", "bimodal:64", "gshare:256:8",
+                      "btb:16", "btb:16:bimodal:64", "oracle")
+
+
+# --- replay ---
+
+def replay(trace: BranchTrace, pred: Predictor, taken_penalty: int = 1,
+           mispredict_penalty: int = 2):
+    """Replay trace through pred; returns counts and control-flow cycles."""
+    branches = mispredicts = jumps = jalr_misses = 0
+    bubbles = btb_hits = 0
+    lookahead = pred.lookahead
+    for pc, word, kind, taken, target in trace.entries:
+        if kind == KIND_BRANCH:
+            branches += 1
+            if lookahead:
+                pred.peek(pc, word, taken)
+            if pred.predict(pc, word) != taken:
+                mispredicts += 1
+            elif taken:
+                if pred.target(pc) == target:
+                    btb_hits += 1
+                else:
+                    bubbles += 1
+        else:
+            jumps += 1
+            if pred.target(pc) == target:
+                btb_hits += 1
+            else:
+                bubbles += 1
+                if kind == KIND_JALR and target != (pc + decode(word)[4]) & 0xFFFFFFFF:
+                    jalr_misses += 1
+        pred.update(pc, word, taken, target)
+
+    flush_events = mispredicts + jalr_misses
+    return {
+        "predictor": pred.name,
+        "storage_bits": pred.storage_bits,
+        "branches": branches,
+        "mispredicts": mispredicts,
+        "mispredict_rate": mispredicts / branches if branches else 0.0,
+        "jumps": jumps,
+        "jalr_misses": jalr_misses,
+        "btb_hits": btb_hits,
+        "bubble_cycles": bubbles * taken_penalty,
+        "flush_cycles": flush_events * mispredict_penalty,
+        "control_cycles": bubbles * taken_penalty + flush_events * mispredict_penalty,
+    }
+
+
+def format_table(name: str, results, base_cycles: int, retired: int):
+    base = results[0]["control_cycles"]
+    lines = [
+        f"==== {name} ====",
+        f"  {'predictor':<24}{'bits':>7}{'branches':>10}{'mispred':>9}{'rate':>8}"
+        f"{'bubbles':>9}{'flush':>8}{'cycles':>10}{'CPI':>7}{'speedup':>9}",
+    ]
+    for r in results:
+        cycles = base_cycles - base + r["control_cycles"]
+        cpi = cycles / retired if retired else 0.0
+        lines.append(
+            f"  {r['predictor']:<24}{r['storage_bits']:>7}{r['branches']:>10}"
+            f"{r['mispredicts']:>9}{r['mispredict_rate'] * 100:>7.2f}%"
+            f"{r['bubble_cycles']:>9}{r['flush_cycles']:>8}{cycles:>10}{cpi:>7.3f}"
+            f"{base_cycles / cycles if cycles else 0.0:>8.3f}x")
+    return "\n".join(lines)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="replay ISS branch traces through predictors")
+    ap.add_argument("programs", nargs="+", help="program images (.txt/.coe/.mem/Inst_Mem.v)")
+    ap.add_argument("-p", "--predictor", action="append",
+                    help="predictor spec (repeatable); the first one is the baseline. "
+                         f"default: {' '.join(DEFAULT_PREDICTORS)}")
+    ap.add_argument("--data", help="Data_Memory init image (.vh/.mem/.coe)")
+    ap.add_argument("--max-steps", type=int, default=10_000_000)
+    ap.add_argument("--taken-penalty", type=int, default=1)
+    ap.add_argument("--mispredict-penalty", type=int, default=2)
+    args = ap.parse_args()
+
+    specs = args.predictor or list(DEFAULT_PREDICTORS)
+    try:
+        for spec in specs:
+            make_predictor(spec)
+    except ValueError as e:
+        print(f"ERROR: {e}")
+        sys.exit(1)
+
+    data_image = load_data_image(args.data) if args.data else None
+    model = PipelineModel(taken_penalty=args.taken_penalty,
+                          mispredict_penalty=args.mispredict_penalty)
+    for path in args.programs:
+        try:
+            words = load_words(path)
+        except (OSError, ValueError) as e:
+            print(f"ERROR: {e}")
+            sys.exit(1)
+        sim = RV32ISim(words)
+        if data_image:
+            sim.load_data(data_image)
+        prof = EdgeProfile(sim)
+        trace = collect_trace(words, args.max_steps, sim=sim, profile=prof)
+        if trace.stop_reason not in ("done", "max_steps"):
+            print(f"WARN: {path}: stopped on {trace.stop_reason}")
+        base = model.estimate(prof)
+        results = [replay(trace, make_predictor(s), args.taken_penalty,
+                          args.mispredict_penalty) for s in specs]
+        # cycles of the static-rule pipeline, minus its control cost
+        static = replay(trace, StaticBTFN(), args.taken_penalty, args.mispredict_penalty)
+        base_cycles = base["cycles"] - static["control_cycles"] + results[0]["control_cycles"]
+        print(format_table(path, results, base_cycles, trace.retired))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Trace-driven data cache simulator.
+
+Runs a program on the ISS with a load/store trace and replays the trace
+through one or more cache configurations. The 0412datacache preset is the
+Data_Cache in 0412datacache/MEM.v (see README_cache_en):
+  direct-mapped, 64 lines, 1 word per line, write-through,
+  no-write-allocate (read-allocate on load misses).
+Geometry (lines, words per line, ways), replacement (lru/fifo/random) and
+write policy (write-through/write-back, with or without write-allocate) can
+be varied to size a miss-stall cache before writing RTL.
+
+Counters follow the Data_Cache naming (load_access_count, load_hit_count,
+load_miss_count, store_access_count). Memory traffic is counted in words on
+the Data_Memory side. stall_cycles estimates the cost once cache_stall is
+real: every line fill costs miss_latency + words_per_line - 1 cycles and every
+write-back of a dirty line costs words_per_line cycles (write-through stores
+are assumed to go through a write buffer).
+
+Usage:
+  python3 tools/cache_sim.py Stress_test.coe
+  python3 tools/cache_sim.py game.coe --lines 128 --line-words 4 --ways 2 --write-policy wb
+  python3 tools/cache_sim.py game.coe --sweep
+"""
+
+import argparse
+import random
+import sys
+from array import array
+
+from rv32i_iss import RV32ISim, load_data_image, load_words
+
+REPLACEMENT = ("lru", "fifo", "random")
+WRITE_POLICIES = ("wt", "wb")
+
+
+class CacheConfig:
+    """Cache geometry and policies. lines is the total line count."""
+
+    def __init__(self, lines: int = 64, line_words: int = 1, ways: int = 1,
+                 replacement: str = "lru", write_policy: str = "wt",
+                 write_allocate: bool = False, miss_latency: int = 1):
+        for name, v in (("lines", lines), ("line_words", line_words), ("ways", ways)):
+            if v < 1 or v & (v - 1):
+                raise ValueError(f"{name} must be a power of two: {v}")
+        if ways > lines:
+            raise ValueError(f"ways ({ways}) exceeds lines ({lines})")
+        if replacement not in REPLACEMENT:
+            raise ValueError(f"unknown replacement policy {replacement!r}")
+        if write_policy not in WRITE_POLICIES:
+            raise ValueError(f"unknown write policy {write_policy!r}")
+        self.lines = lines
+        self.line_words = line_words
+        self.ways = ways
+        self.replacement = replacement
+        self.write_policy = write_policy
+        self.write_allocate = write_allocate
+        self.miss_latency = miss_latency
+
+    @property
+    def sets(self):
+        return self.lines // self.ways
+
+    @property
+    def size_bytes(self):
+        return self.lines * self.line_words * 4
+
+    def describe(self):
+        assoc = "direct" if self.ways == 1 else f"{self.ways}-way {self.replacement}"
+        alloc = "wa" if self.write_allocate else "nwa"
+        return (f"{self.lines}x{self.line_words}w {assoc} "
+                f"{self.write_policy}/{alloc} ({self.size_bytes} B)")
+
+
+PRESETS = {
+    "0412datacache": CacheConfig(lines=64, line_words=1, ways=1,
+                                 write_policy="wt", write_allocate=False),
+}
+
+
+class Cache:
+    """Set-associative cache state and Data_Cache-style counters."""
+
+    def __init__(self, cfg: CacheConfig, seed: int = 0):
+        self.cfg = cfg
+        self.line_shift = (cfg.line_words * 4).bit_length() - 1
+        self.set_mask = cfg.sets - 1
+        # per set: {tag: dirty}; dict order is the LRU / FIFO order
+        self.sets = [{} for _ in range(cfg.sets)]
+        self.rng = random.Random(seed)
+        self.load_access_count = 0
+        self.load_hit_count = 0
+        self.load_miss_count = 0
+        self.store_access_count = 0
+        self.store_hit_count = 0
+        self.store_miss_count = 0
+        self.evictions = 0
+        self.writebacks = 0
+        self.mem_read_words = 0
+        self.mem_write_words = 0
+
+    def _fill(self, lines: dict, tag: int, dirty: bool):
+        cfg = self.cfg
+        if len(lines) >= cfg.ways:
+            if cfg.replacement == "random":
+                victim = self.rng.choice(list(lines))
+            else:
+                victim = next(iter(lines))
+            if lines.pop(victim):
+                self.writebacks += 1
+                self.mem_write_words += cfg.line_words
+            self.evictions += 1
+        lines[tag] = dirty
+        self.mem_read_words += cfg.line_words
+
+    def access(self, is_store: bool, addr: int):
+        cfg = self.cfg
+        line = addr >> self.line_shift
+        lines = self.sets[line & self.set_mask]
+        tag = line              # keeping the set bits in the tag costs nothing here
+        hit = tag in lines
+        if hit and cfg.replacement == "lru":
+            lines[tag] = lines.pop(tag)
+
+        if not is_store:
+            self.load_access_count += 1
+            if hit:
+                self.load_hit_count += 1
+            else:
+                self.load_miss_count += 1
+                self._fill(lines, tag, False)
+            return
+
+        self.store_access_count += 1
+        if hit:
+            self.store_hit_count += 1
+        else:
+            self.store_miss_count += 1
+            if cfg.write_allocate:
+                self._fill(lines, tag, False)
+                hit = True
+        if cfg.write_policy == "wt":
+            self.mem_write_words += 1
+        elif hit:
+            lines[tag] = True
+        else:
+            self.mem_write_words += 1        # write-back, no-allocate: write around
+
+    def dirty_lines(self):
+        return sum(1 for lines in self.sets for d in lines.values() if d)
+
+    def stats(self):
+        cfg = self.cfg
+        accesses = self.load_access_count + self.store_access_count
+        hits = self.load_hit_count + self.store_hit_count
+        fills = self.mem_read_words // cfg.line_words
+        stall = (fills * (cfg.miss_latency + cfg.line_words - 1)
+                 + self.writebacks * cfg.line_words)
+        return {
+            "config": cfg.describe(),
+            "load_access_count": self.load_access_count,
+            "load_hit_count": self.load_hit_count,
+            "load_miss_count": self.load_miss_count,
+            "store_access_count": self.store_access_count,
+            "store_hit_count": self.store_hit_count,
+            "store_miss_count": self.store_miss_count,
+            "load_hit_rate": (self.load_hit_count / self.load_access_count
+                              if self.load_access_count else 0.0),
+            "hit_rate": hits / accesses if accesses else 0.0,
+            "misses": accesses - hits,
+            "evictions": self.evictions,
+            "writebacks": self.writebacks,
+            "dirty_at_end": self.dirty_lines(),
+            "mem_read_words": self.mem_read_words,
+            "mem_write_words": self.mem_write_words,
+            "stall_cycles": stall,
+        }
+
+
+# --- trace collection / replay ---
+
+class MemTrace:
+    """Packed load/store stream: (addr << 1) | is_store per access."""
+
+    def __init__(self, dmem_size: int):
+        self.dmem_size = dmem_size
+        self.accesses = array("Q")
+        self.uncached = 0          # MMIO accesses (outside Data_Memory)
+        self.retired = 0
+        self.stop_reason = None
+
+    def record(self, is_store, addr, size):
+        if addr < self.dmem_size:
+            self.accesses.append((addr << 1) | is_store)
+        else:
+            self.uncached += 1
+
+
+def collect_mem_trace(words, max_steps: int = 10_000_000, data_image=None, sim=None):
+    """Run words on the ISS and return its MemTrace."""
+    if sim is None:
+        sim = RV32ISim(words)
+        if data_image:
+            sim.load_data(data_image)
+    trace = MemTrace(sim.dmem_size)
+    sim.set_mem_trace(trace.record)
+    try:
+        trace.retired = sim.run(max_steps=max_steps)
+    finally:
+        sim.set_mem_trace(None)
+    trace.stop_reason = sim.stop_reason
+    return trace
+
+
+def simulate(trace: MemTrace, cfg: CacheConfig, seed: int = 0):
+    cache = Cache(cfg, seed)
+    access = cache.access
+    for a in trace.accesses:
+        access(a & 1, a >> 1)
+    return cache.stats()
+
+
+def format_report(name: str, trace: MemTrace, r: dict):
+    lines = [
+        f"==== {name} ({trace.stop_reason}, {trace.retired} instructions) ====",
+        f"  config            {r['config']}",
+        f"  loads             {r['load_access_count']:>10}   hits {r['load_hit_count']}, "
+        f"misses {r['load_miss_count']} ({r['load_hit_rate'] * 100:.2f}% hit)",
+        f"  stores            {r['store_access_count']:>10}   hits {r['store_hit_count']}, "
+        f"misses {r['store_miss_count']}",
+        f"  overall hit rate  {r['hit_rate'] * 100:>9.2f}%",
+        f"  memory traffic    {r['mem_read_words']:>10} words read, "
+        f"{r['mem_write_words']} words written",
+        f"  evictions         {r['evictions']:>10}   write-backs {r['writebacks']}, "
+        f"dirty at end {r['dirty_at_end']}",
+        f"  est. miss stalls  {r['stall_cycles']:>10} cycles",
+    ]
+    if trace.uncached:
+        lines.append(f"  uncached (MMIO)   {trace.uncached:>10}")
+    return "\n".join(lines)
+
+
+def sweep_configs(base: CacheConfig):
+    for lines in (16, 32, 64, 128, 256):
+        for line_words in (1, 4):
+            for ways in (1, 2, 4):
+                yield CacheConfig(lines, line_words, ways, base.replacement,
+                                  base.write_policy, base.write_allocate,
+                                  base.miss_latency)
+
+
+def format_sweep(name: str, trace: MemTrace, results):
+    lines = [
+        f"==== {name} ({len(trace.accesses)} accesses) ====",
+        f"  {'config':<34}{'hit%':>8}{'misses':>9}{'rd words':>10}{'wr words':>10}{'stalls':>9}",
+    ]
+    for r in results:
+        lines.append(f"  {r['config']:<34}{r['hit_rate'] * 100:>7.2f}%{r['misses']:>9}"
+                     f"{r['mem_read_words']:>10}{r['mem_write_words']:>10}{r['stall_cycles']:>9}")
+    return "\n".join(lines)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="trace-driven data cache simulator")
+    ap.add_argument("programs", nargs="+", help="program images (.txt/.coe/.mem/Inst_Mem.v)")
+    ap.add_argument("--data", help="Data_Memory init image (.vh/.mem/.coe)")
+    ap.add_argument("--max-steps", type=int, default=10_000_000)
+    ap.add_argument("--preset", choices=sorted(PRESETS), default="0412datacache",
+                    help="starting configuration (options below override it)")
+    ap.add_argument("--lines", type=int, help="total cache lines")
+    ap.add_argument("--line-words", type=int, help="32-bit words per line")
+    ap.add_argument("--ways", type=int, help="associativity")
+    ap.add_argument("--replacement", choices=REPLACEMENT)
+    ap.add_argument("--write-policy", choices=WRITE_POLICIES,
+                    help="wt: write-through, wb: write-back")
+    ap.add_argument("--write-allocate", action=argparse.BooleanOptionalAction, default=None)
+    ap.add_argument("--miss-latency", type=int, help="cycles until the first word of a fill")
+    ap.add_argument("--seed", type=int, default=0, help="seed for random replacement")
+    ap.add_argument("--sweep", action="store_true",
+                    help="tabulate lines x words-per-line x ways with the chosen policies")
+    args = ap.parse_args()
+
+    p = PRESETS[args.preset]
+    try:
+        cfg = CacheConfig(
+            lines=args.lines or p.lines,
+            line_words=args.line_words or p.line_words,
+            ways=args.ways or p.ways,
+            replacement=args.replacement or p.replacement,
+            write_policy=args.write_policy or p.write_policy,
+            write_allocate=p.write_allocate if args.write_allocate is None else args.write_allocate,
+            miss_latency=p.miss_latency if args.miss_latency is None else args.miss_latency,
+        )
+    except ValueError as e:
+        print(f"ERROR: {e}")
+        sys.exit(1)
+
+    data_image = load_data_image(args.data) if args.data else None
+    for path in args.programs:
+        try:
+            words = load_words(path)
+        except (OSError, ValueError) as e:
+            print(f"ERROR: {e}")
+            sys.exit(1)
+        trace = collect_mem_trace(words, args.max_steps, data_image)
+        if trace.stop_reason not in ("done", "max_steps"):
+            print(f"WARN: {path}: stopped on {trace.stop_reason}")
+        if args.sweep:
+            results = [simulate(trace, c, args.seed) for c in sweep_configs(cfg)]
+            print(format_sweep(path, trace, results))
+        else:
+            print(format_report(path, trace, simulate(trace, cfg, args.seed)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Run the RV32I animation decoder on the ISS and measure its cost per frame.
+
+The stream comes from petgame_soc_pipeline_opt/tools/oled_anim_encode.py
+(ops: 0x01..0x7F literal, 0x80..0xBF run, 0xC0..0xFF skip, 0x00 end of
+frame). It is loaded into Data_Memory at --stream-base. DECODER_ASM, the
+routine a game would link, writes the framebuffer with sb at --fb-base
+(0xA000, an MMIO address on the ISS). A small driver calls it once per
+frame and stops on ebreak between frames, so every frame's instructions
+are counted separately. Cycles come from pipeline_model over the same run.
+
+After every frame the MMIO framebuffer is compared with decode_frame(),
+the Python reference decoder. A mismatch is reported with the frame and
+byte offset.
+
+Usage:
+  python3 tools/oled_anim_sim.py walk.bin
+  python3 tools/oled_anim_sim.py lr_intro.bin --fb-bytes 1024 --per-frame
+"""
+
+import argparse
+import sys
+
+from pipeline_model import EdgeProfile, PipelineModel
+from rv32i_asm import Assembler
+from rv32i_iss import DMEM_SIZE, RV32ISim
+
+# a0 = stream pointer, a1 = framebuffer base; returns a0 past the end op
+DECODER_ASM = """
+anim_decode_frame:
+    addi t0, a1, 0
+anim_op:
+    lbu t1, 0(a0)
+    addi a0, a0, 1
+    beq t1, zero, anim_done
+    addi t2, zero, 0x80
+    bltu t1, t2, anim_lit
+    addi t2, zero, 0xC0
+    bltu t1, t2, anim_run
+    addi t1, t1, -0xBF          # skip: leave the bytes as they are
+    add t0, t0, t1
+    jal zero, anim_op
+anim_lit:
+    add t4, t0, t1              # end of the literal
+anim_lit_loop:
+    lbu t3, 0(a0)
+    addi a0, a0, 1
+    sb t3, 0(t0)
+    addi t0, t0, 1
+    bne t0, t4, anim_lit_loop
+    jal zero, anim_op
+anim_run:
+    lbu t3, 0(a0)
+    addi a0, a0, 1
+    add t4, t0, t1
+    addi t4, t4, -0x7F          # end of the run
+anim_run_loop:
+    sb t3, 0(t0)
+    addi t0, t0, 1
+    bne t0, t4, anim_run_loop
+    jal zero, anim_op
+anim_done:
+    ret
+"""
+
+DRIVER_ASM = """
+    li a0, {stream_base}
+    li a1, {fb_base}
+    li s0, {frames}
+frame_loop:
+    call anim_decode_frame
+    ebreak                      # frame boundary for the simulator
+    addi s0, s0, -1
+    bnez s0, frame_loop
+done:
+    jal x0, done
+"""
+
+
+class AnimSimError(ValueError):
+    pass
+
+
+def decode_frame(stream: bytes, pos: int, fb: bytearray):
+    """Reference decoder: apply the frame at stream[pos:] to fb, return the next pos."""
+    dst = 0
+    while True:
+        if pos >= len(stream):
+            raise AnimSimError(f"stream ends inside a frame at byte {pos}")
+        op = stream[pos]
+        pos += 1
+        if op == 0x00:
+            return pos
+        k = op if op <= 0x7F else op - 0x7F if op <= 0xBF else op - 0xBF
+        if dst + k > len(fb):
+            raise AnimSimError(f"frame writes past the {len(fb)}-byte framebuffer")
+        if op <= 0x7F:
+            fb[dst:dst + k] = stream[pos:pos + k]
+            pos += k
+        elif op <= 0xBF:
+            fb[dst:dst + k] = bytes((stream[pos],)) * k
+            pos += 1
+        dst += k
+
+
+def count_frames(stream: bytes, fb_bytes: int):
+    fb = bytearray(fb_bytes)
+    pos = n = 0
+    while pos < len(stream):
+        pos = decode_frame(stream, pos, fb)
+        n += 1
+    return n
+
+
+def simulate(stream: bytes, fb_bytes: int = 128, stream_base: int = 0x1000,
+             fb_base: int = 0xA000, model: PipelineModel = None):
+    """Decode every frame on the ISS; [(bytes, instrs, cycles, stores)] per frame."""
+    if stream_base + len(stream) > DMEM_SIZE:
+        raise AnimSimError(f"stream of {len(stream)} bytes at 0x{stream_base:x} "
+                           f"does not fit in the {DMEM_SIZE}-byte Data_Memory")
+    frames = count_frames(stream, fb_bytes)
+    src = DRIVER_ASM.format(stream_base=stream_base, fb_base=fb_base, frames=frames) + DECODER_ASM
+    prog = Assembler().assemble(src, "oled_anim_decoder")
+    sim = RV32ISim(prog.words)
+    sim.dmem[stream_base:stream_base + len(stream)] = stream
+
+    fb = bytearray(fb_bytes)
+    stores = [0]
+
+    def mmio_store(addr, size, value):
+        off = addr - fb_base
+        if size != 1 or not 0 <= off < fb_bytes:
+            raise AnimSimError(f"decoder stored {size} bytes at 0x{addr:08x}")
+        fb[off] = value
+        stores[0] += 1
+
+    sim.mmio_store = mmio_store
+    model = model or PipelineModel()
+    ref = bytearray(fb_bytes)
+    pos = 0
+    out = []
+    for i in range(frames):
+        start = pos
+        pos = decode_frame(stream, pos, ref)
+        stores[0] = 0
+        prof = EdgeProfile(sim)
+        prof.retired = sim.run(max_steps=10 * fb_bytes + 1000, on_block=prof.record)
+        prof.stop_reason = sim.stop_reason
+        if sim.stop_reason != "ebreak":
+            raise AnimSimError(f"frame {i}: decoder stopped on {sim.stop_reason}")
+        if fb != ref:
+            off = next(k for k in range(fb_bytes) if fb[k] != ref[k])
+            raise AnimSimError(f"frame {i}: framebuffer byte {off} is 0x{fb[off]:02x}, "
+                               f"expected 0x{ref[off]:02x}")
+        if sim.regs[10] != stream_base + pos:
+            raise AnimSimError(f"frame {i}: decoder consumed {sim.regs[10] - stream_base - start} "
+                               f"bytes, frame has {pos - start}")
+        r = model.estimate(prof)
+        out.append((pos - start, prof.retired, r["cycles"], stores[0]))
+        sim.pc += 4                     # resume after the ebreak
+    return out
+
+
+def main():
+    ap = argparse.ArgumentParser(description="measure the RV32I decode cost of an oled_anim_encode stream")
+    ap.add_argument("stream", help="raw stream from oled_anim_encode.py --output")
+    ap.add_argument("--fb-bytes", type=int, default=128,
+                    help="framebuffer size: 128 for 32x32 (FB32), 1024 for 128x64")
+    ap.add_argument("--fb-base", type=lambda v: int(v, 0), default=0xA000)
+    ap.add_argument("--stream-base", type=lambda v: int(v, 0), default=0x1000,
+                    help="Data_Memory address the stream is loaded at")
+    ap.add_argument("--load-latency", type=int, default=0,
+                    help="extra cycles per load (1 for the BRAM Data_Memory variant)")
+    ap.add_argument("--per-frame", action="store_true", help="print every frame")
+    args = ap.parse_args()
+
+    try:
+        with open(args.stream, "rb") as f:
+            stream = f.read()
+        rows = simulate(stream, args.fb_bytes, args.stream_base, args.fb_base,
+                        PipelineModel(load_latency=args.load_latency))
+    except (OSError, ValueError) as e:
+        print(f"ERROR: {e}")
+        sys.exit(1)
+    if not rows:
+        print("ERROR: stream holds no frames")
+        sys.exit(1)
+
+    if args.per_frame:
+        print(f"  {'frame':>5}{'bytes':>7}{'instrs':>8}{'cycles':>8}{'stores':>8}")
+        for i, (nbytes, instrs, cycles, stores) in enumerate(rows):
+            print(f"  {i:>5}{nbytes:>7}{instrs:>8}{cycles:>8}{stores:>8}")
+    n = len(rows)
+    total_bytes = sum(r[0] for r in rows)
+    total_cycles = sum(r[2] for r in rows)
+    worst = max(rows, key=lambda r: r[2])
+    # a plain copy loop (lbu/addi/sb/addi/bne, no stall) for comparison
+    copy_cycles = 5 * args.fb_bytes + args.fb_bytes
+    print(f"{n} frames verified against the reference decoder: {total_bytes / n:.1f} bytes/frame, "
+          f"{sum(r[1] for r in rows) / n:.1f} instrs/frame, {total_cycles / n:.1f} cycles/frame "
+          f"(worst {worst[2]}, full {args.fb_bytes}-byte copy ~{copy_cycles})")
+
+
+if __name__ == "__main__":
+    main()
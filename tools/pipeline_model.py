@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Cycle-approximate timing model of the 5-stage IF/ID/EX/MEM/WB pipeline.
+
+Mirrors pipeline_count_clean (and the other pipeline/ variants):
+  - hazard_unit.v: a load in ID/EX stalls the instruction in IF/ID for one
+    cycle when its rd (!= x0) equals the raw rs1 *or* rs2 field of that
+    instruction word (the RTL does not look at the format, so e.g. an addi
+    whose imm[4:0] matches the load's rd also stalls).
+  - forwarding_unit.v: EX/MEM and MEM/WB bypasses (plus WB->MEM store data)
+    cover every other RAW dependency, so they cost no cycles.
+  - ID.v static prediction: jal and backward branches are predicted taken;
+    the redirect in ID squashes the fetched sequential word (1 bubble).
+  - IF.v/pipeline.v: a wrong prediction is detected in EX and flushes
+    IF/ID and ID/EX (2 cycles).
+  - jalr is predicted taken in ID to pc+imm like a jal. The RTL never checks
+    that target; the model charges the 2-cycle EX flush a correct pipeline
+    needs whenever the real target differs (reported as jalr_flushes).
+  - load_latency adds cycles per load for the BRAM data memory variant
+    (lode_runner/CPU: synchronous read, mem_stall = 1 extra cycle).
+
+The program runs once on the ISS to collect basic-block edge counts; cycle
+estimates are then computed from the profile alone, so sweeping pipeline
+parameters costs nothing and a program variant costs one ISS run.
+
+tb_cycles/tb_retired reproduce what tb_pipeline_count_clean.v prints: it
+counts every MEM/WB instruction word != 0, and a load-use bubble carries the
+stalled instruction word down the pipe, so stalls are counted as retired.
+
+Usage:
+  python3 tools/pipeline_model.py Stress_test.coe Functional_test.coe
+"""
+
+import argparse
+import struct
+import sys
+import zlib
+from array import array
+
+from rv32i_iss import (OP_BEQ, OP_BGEU, OP_JAL, OP_JALR,
+                       RV32ISim, decode, load_data_image, load_words)
+
+TB_CYCLE_OFFSET = 3      # tb_pipeline_count_clean: DONE cycle - sum of issue slots
+TB_RETIRED_OFFSET = -1   # DONE is sampled before its own retire count lands
+
+
+def is_load(word: int):
+    return (word & 0x7F) == 0x03
+
+
+def load_use(prev_word: int, word: int):
+    """hazard_unit.v raw_stall for prev_word in ID/EX and word in IF/ID."""
+    if (prev_word & 0x7F) != 0x03:
+        return False
+    rd = (prev_word >> 7) & 0x1F
+    return rd != 0 and (rd == (word >> 15) & 0x1F or rd == (word >> 20) & 0x1F)
+
+
+class EdgeProfile:
+    """Basic-block edge counts {(block, next_pc): count} from one ISS run.
+
+    A branch to pc+4 reaches the same next_pc either way, so its taken
+    count is kept separately in taken_to_next {block: count}.
+    """
+
+    def __init__(self, sim: RV32ISim):
+        self.sim = sim
+        self.counts = {}
+        self.taken_to_next = {}
+        self.retired = 0
+        self.stop_reason = None
+
+    def record(self, blk, npc):
+        key = (blk, npc)
+        self.counts[key] = self.counts.get(key, 0) + 1
+        if npc == blk.taken_pc == blk.fall_pc and self.sim.last_branch_taken:
+            self.taken_to_next[blk] = self.taken_to_next.get(blk, 0) + 1
+
+    def snapshot(self):
+        """The counts as bytes, with blocks by start pc (see restore)."""
+        edges = array("q", (v for (blk, npc), cnt in self.counts.items()
+                            for v in (blk.start, npc, cnt)))
+        taken = array("q", (v for blk, cnt in self.taken_to_next.items() for v in (blk.start, cnt)))
+        reason = (self.stop_reason or "").encode()
+        body = zlib.compress(edges.tobytes() + taken.tobytes(), 1)
+        return struct.pack("<QIIB", self.retired, len(edges), len(taken), len(reason)) + reason + body
+
+    def restore(self, data):
+        """Load snapshot() counts; blocks are looked up again in self.sim."""
+        retired, n_edges, n_taken, n_reason = struct.unpack_from("<QIIB", data)
+        pos = struct.calcsize("<QIIB")
+        self.retired = retired
+        self.stop_reason = data[pos:pos + n_reason].decode() or None
+        values = array("q", zlib.decompress(data[pos + n_reason:]))
+        block_at = self.sim.block_at
+        self.counts = {}
+        self.taken_to_next = {}
+        it = iter(values[:n_edges])
+        for start, npc, cnt in zip(it, it, it):
+            key = (block_at(start), npc)
+            self.counts[key] = self.counts.get(key, 0) + cnt
+        it = iter(values[n_edges:n_edges + n_taken])
+        for start, cnt in zip(it, it):
+            blk = block_at(start)
+            self.taken_to_next[blk] = self.taken_to_next.get(blk, 0) + cnt
+
+
+def profile_program(words, max_steps: int = 10_000_000, data_image=None, sim=None):
+    """Run words on the ISS and return its EdgeProfile."""
+    if sim is None:
+        sim = RV32ISim(words)
+        if data_image:
+            sim.load_data(data_image)
+    prof = EdgeProfile(sim)
+    prof.retired = sim.run(max_steps=max_steps, on_block=prof.record)
+    prof.stop_reason = sim.stop_reason
+    return prof
+
+
+class _BlockInfo:
+    __slots__ = ("words", "stalls", "loads", "last", "term")
+
+    def __init__(self, sim, blk):
+        n_words = (blk.end - blk.start) >> 2
+        self.words = [sim.fetch(blk.start + 4 * i) for i in range(n_words)]
+        # pseudo-terminated blocks (length cap) have no control word
+        self.term = self.words[-1] if len(blk.body) < n_words else None
+        self.stalls = sum(1 for a, b in zip(self.words, self.words[1:]) if load_use(a, b))
+        self.loads = sum(1 for w in self.words if is_load(w))
+        self.last = self.words[-1] if self.words else 0
+
+
+class PipelineModel:
+    """Charges hazard/branch penalties to an EdgeProfile.
+
+    taken_penalty: bubbles for a correctly predicted taken branch/jal
+                   (redirect in ID squashes one fetched word)
+    mispredict_penalty: cycles lost when EX overrides the prediction
+    load_latency: extra cycles for every load (0: distributed-RAM Data_Memory,
+                  1: BRAM Data_Memory with mem_stall)
+    """
+
+    def __init__(self, taken_penalty: int = 1, mispredict_penalty: int = 2,
+                 load_latency: int = 0):
+        self.taken_penalty = taken_penalty
+        self.mispredict_penalty = mispredict_penalty
+        self.load_latency = load_latency
+        self._info = {}
+
+    def predict(self, pc: int, word: int):
+        """Static ID-stage rule: id_jump | (id_branch & imm[31])."""
+        return word >> 31 == 1
+
+    def _block_info(self, sim, blk):
+        info = self._info.get(blk)
+        if info is None:
+            info = self._info[blk] = _BlockInfo(sim, blk)
+        return info
+
+    def estimate(self, prof: EdgeProfile):
+        sim = prof.sim
+        stalls = loads = 0
+        branches = branch_bubbles = taken_bubbles = mispredicts = 0
+        jumps = jalr_flushes = 0
+        fetch = sim.fetch
+
+        for (blk, npc), cnt in prof.counts.items():
+            info = self._block_info(sim, blk)
+            stalls += info.stalls * cnt
+            loads += info.loads * cnt
+            if npc < 0:
+                continue            # halted: nothing is fetched after it
+            if info.term is None:
+                nxt = fetch(npc)
+                if nxt is not None and load_use(info.last, nxt):
+                    stalls += cnt
+                continue
+
+            word = info.term
+            op, rd, rs1, rs2, imm = decode(word)
+            pc = blk.end - 4
+            if op == OP_JAL:
+                jumps += cnt
+                taken_bubbles += cnt
+            elif op == OP_JALR:
+                jumps += cnt
+                taken_bubbles += cnt
+                if npc != (pc + imm) & 0xFFFFFFFF:
+                    jalr_flushes += cnt
+            elif OP_BEQ <= op <= OP_BGEU:
+                branches += cnt
+                if blk.taken_pc == blk.fall_pc:
+                    n_taken = prof.taken_to_next.get(blk, 0)
+                else:
+                    n_taken = cnt if npc != blk.fall_pc else 0
+                if self.predict(pc, word):
+                    branch_bubbles += n_taken
+                    taken_bubbles += n_taken
+                    mispredicts += cnt - n_taken
+                else:
+                    mispredicts += n_taken
+
+        retired = prof.retired
+        flush_cycles = (mispredicts + jalr_flushes) * self.mispredict_penalty
+        bubble_cycles = taken_bubbles * self.taken_penalty
+        load_cycles = loads * self.load_latency
+        issue = retired + stalls + bubble_cycles + flush_cycles + load_cycles
+        return {
+            "retired": retired,
+            "cycles": issue + TB_CYCLE_OFFSET,
+            "cpi": (issue + TB_CYCLE_OFFSET) / retired if retired else 0.0,
+            "load_use_stalls": stalls,
+            "loads": loads,
+            "load_latency_cycles": load_cycles,
+            "branches": branches,
+            "branch_bubbles": branch_bubbles,      # correctly predicted taken branches
+            "jumps": jumps,
+            "taken_bubbles": bubble_cycles,
+            "mispredicts": mispredicts,
+            "jalr_flushes": jalr_flushes,
+            "flush_cycles": flush_cycles,
+            "tb_cycles": issue + TB_CYCLE_OFFSET,
+            "tb_retired": retired + stalls + TB_RETIRED_OFFSET,
+            "stop_reason": prof.stop_reason,
+        }
+
+    def pc_costs(self, prof: EdgeProfile, costs=None):
+        """{pc: [executions, cycles]} of an EdgeProfile, added into costs if given.
+
+        Charges the same cycles as estimate(), each to one instruction: the
+        issue slot (plus load_latency) to itself, a load-use stall to the
+        instruction that waits, bubbles and flushes to the branch or jump.
+        Instructions of a block cut short by max_steps are in prof.retired
+        but in no edge, so they are missing here.
+        """
+        sim = prof.sim
+        fetch = sim.fetch
+        out = {} if costs is None else costs
+        latency = self.load_latency
+        for (blk, npc), cnt in prof.counts.items():
+            info = self._block_info(sim, blk)
+            pc = blk.start
+            prev = 0
+            for w in info.words:
+                cyc = 1 + load_use(prev, w)
+                if latency and is_load(w):
+                    cyc += latency
+                c = out.get(pc)
+                if c is None:
+                    c = out[pc] = [0, 0]
+                c[0] += cnt
+                c[1] += cyc * cnt
+                prev = w
+                pc += 4
+            if npc < 0:
+                continue
+            if info.term is None:
+                nxt = fetch(npc)
+                if nxt is not None and load_use(info.last, nxt):
+                    out.setdefault(npc, [0, 0])[1] += cnt
+                continue
+
+            word = info.term
+            op, rd, rs1, rs2, imm = decode(word)
+            pc = blk.end - 4
+            extra = 0
+            if op == OP_JAL:
+                extra = cnt * self.taken_penalty
+            elif op == OP_JALR:
+                extra = cnt * self.taken_penalty
+                if npc != (pc + imm) & 0xFFFFFFFF:
+                    extra += cnt * self.mispredict_penalty
+            elif OP_BEQ <= op <= OP_BGEU:
+                if blk.taken_pc == blk.fall_pc:
+                    n_taken = prof.taken_to_next.get(blk, 0)
+                else:
+                    n_taken = cnt if npc != blk.fall_pc else 0
+                if self.predict(pc, word):
+                    extra = (n_taken * self.taken_penalty
+                             + (cnt - n_taken) * self.mispredict_penalty)
+                else:
+                    extra = n_taken * self.mispredict_penalty
+            out[pc][1] += extra
+        return out
+
+
+def format_report(name: str, r: dict):
+    lines = [
+        f"==== {name} ({r['stop_reason']}) ====",
+        f"  cycles           {r['cycles']:>10}",
+        f"  retired          {r['retired']:>10}   CPI {r['cpi']:.3f}",
+        f"  load-use stalls  {r['load_use_stalls']:>10}",
+        f"  taken bubbles    {r['taken_bubbles']:>10}   (jal/jalr {r['jumps']}, "
+        f"branches {r['branch_bubbles']} of {r['branches']})",
+        f"  flush cycles     {r['flush_cycles']:>10}   (mispredicts {r['mispredicts']}, jalr {r['jalr_flushes']})",
+    ]
+    if r["load_latency_cycles"]:
+        lines.append(f"  load latency     {r['load_latency_cycles']:>10}   (loads {r['loads']})")
+    lines.append(f"  testbench view:  Cycle Count = {r['tb_cycles']}, "
+                 f"Instruction Count (retired) = {r['tb_retired']}")
+    return "\n".join(lines)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="5-stage pipeline timing model")
+    ap.add_argument("programs", nargs="+", help="program images (.txt/.coe/.mem/Inst_Mem.v)")
+    ap.add_argument("--data", help="Data_Memory init image (.vh/.mem/.coe)")
+    ap.add_argument("--max-steps", type=int, default=10_000_000)
+    ap.add_argument("--load-latency", type=int, default=0,
+                    help="extra cycles per load (1 for the BRAM Data_Memory variant)")
+    args = ap.parse_args()
+
+    data_image = load_data_image(args.data) if args.data else None
+    model = PipelineModel(load_latency=args.load_latency)
+    for path in args.programs:
+        try:
+            words = load_words(path)
+        except (OSError, ValueError) as e:
+            print(f"ERROR: {e}")
+            sys.exit(1)
+        prof = profile_program(words, args.max_steps, data_image)
+        if prof.stop_reason not in ("done", "max_steps"):
+            print(f"WARN: {path}: stopped on {prof.stop_reason}")
+        print(format_report(path, model.estimate(prof)))
+
+
+if __name__ == "__main__":
+    main()
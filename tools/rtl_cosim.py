@@ -0,0 +1,444 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Differential co-simulation of pipeline_count_clean against the ISS.
+
+tb_pipeline_count_clean.v writes a commit log when it is run with
++commit_log=<file>: one line per instruction retired in WB (wb_valid),
+
+  <cycle> <pc> <instr> [x<rd>=<value>] [[<addr>]=<data>]
+
+with the register write (wb_regwrite, rd != 0) and, for stores, the
+Data_Memory address and rs2 data sampled in MEM. This tool streams the log
+and replays the program on the ISS next to it. The first instruction where
+the RTL and the ISS disagree (pc, instruction word, register write, store
+address or store data; stores compare the bytes sb/sh/sw actually write)
+is reported with the commits before it and the ISS operand values, and the
+exit status is 1. X bits in the log (e.g. a load from Data_Memory that was
+never written, the RTL does not clear it) always mismatch.
+
+The testbench logs only instructions that carry its WB valid bit, so a
+load-use bubble (which reaches WB with the stalled instruction's word) is
+not a commit. Older logs that do contain the bubbles are accepted: a line
+right after a load that repeats the next line's pc and word with no write
+or store is dropped.
+
+By default every commit is compared in lockstep (about 100k commits/s).
+For long logs, --every N checks in chunks of N commits instead: each chunk
+is run at full ISS speed and compared once, on the architectural state (the
+registers and data memory rebuilt from the log's register writes and
+stores, the MMIO stores in order, and the pc and word of the chunk's last
+commit). A chunk that fails is bisected from the last good checkpoint
+(restore, run to the midpoint, compare) down to --window commits, which are
+then compared in lockstep to find the exact instruction. This is 2-3x
+faster but blind to disagreements that leave no trace at the checkpoint: a
+wrong value overwritten before it, or a store of the value already there.
+
+ecall/ebreak/fence retire as nops on this core (CU.v has no case for them),
+and `jal x0, 0` keeps retiring, so the ISS does the same.
+
+Usage:
+  iverilog -o tb pipeline_count_clean/*.v && vvp tb +commit_log=commit.log
+  python3 tools/rtl_cosim.py pipeline_count_clean/Inst_Mem.v commit.log
+  python3 tools/rtl_cosim.py pipeline_count_clean/Inst_Mem.v long.log --every 10000
+  python3 tools/rtl_cosim.py game.coe --write-reference game_ref.log --max-steps 1000000
+"""
+
+import argparse
+import struct
+import sys
+import time
+from collections import deque
+from itertools import islice
+
+from pipeline_model import load_use
+from rv32i_iss import (DONE_INSTR, OP_SB, OP_SH, OP_SW, REG_NAMES, RV32ISim, decode, disassemble,
+                       load_data_image, load_words)
+
+DMEM_BYTES = 16 * 1024      # pipeline_count_clean Data_Memory: WORDS = 4096
+CHECKPOINT_EVERY = 10000    # suggested --every for long logs
+BISECT_WINDOW = 64
+CONTEXT = 4                 # commits shown before a mismatch
+
+STORE_SIZES = {OP_SB: 1, OP_SH: 2, OP_SW: 4}
+_STORE_MASK = {1: 0xFF, 2: 0xFFFF, 4: 0xFFFFFFFF}
+_U16 = struct.Struct("<H")
+_U32 = struct.Struct("<I")
+
+
+class CosimError(ValueError):
+    pass
+
+
+class Commit:
+    """One retired instruction; None marks a field with X/Z bits."""
+
+    __slots__ = ("index", "line", "cycle", "pc", "instr", "rd", "value", "store")
+
+    def __init__(self, index, line, cycle, pc, instr, rd=0, value=0, store=None):
+        self.index = index          # retirement number, from 0
+        self.line = line            # log line number (0 for ISS commits)
+        self.cycle = cycle
+        self.pc = pc
+        self.instr = instr
+        self.rd = rd                # 0: no register write
+        self.value = value
+        self.store = store          # (addr, data) or None
+
+    def format(self):
+        text = f"{_hex(self.pc)} {_hex(self.instr)}"
+        if self.rd != 0:
+            text += f" x{'x' if self.rd is None else self.rd}={_hex(self.value)}"
+        if self.store is not None:
+            text += f" [{_hex(self.store[0])}]={_hex(self.store[1])}"
+        return text
+
+
+def _hex(value):
+    return "xxxxxxxx" if value is None else f"{value:08x}"
+
+
+def _parse_hex(tok: str):
+    try:
+        return int(tok, 16)
+    except ValueError:
+        if any(c in "xXzZ" for c in tok):
+            return None
+        raise
+
+
+def _parse_lines(lines):
+    for line_no, line in enumerate(lines, 1):
+        toks = line.split()
+        if not toks or toks[0].startswith("#"):
+            continue
+        try:
+            c = Commit(0, line_no, int(toks[0]), _parse_hex(toks[1]), _parse_hex(toks[2]))
+            for tok in toks[3:]:
+                if tok.startswith("x"):
+                    rd, value = tok[1:].split("=")
+                    c.rd = int(rd) if rd.isdigit() else None
+                    c.value = _parse_hex(value)
+                elif tok.startswith("["):
+                    addr, data = tok[1:].split("]=")
+                    c.store = (_parse_hex(addr), _parse_hex(data))
+                else:
+                    raise ValueError(tok)
+        except (IndexError, ValueError):
+            raise CosimError(f"line {line_no}: cannot parse commit '{line.strip()}'")
+        yield c
+
+
+def _is_bubble(c: Commit, prev_instr, nxt: Commit):
+    """A load-use bubble logged as a commit: the stalled instruction's pc and
+    word right after the load, with no write or store, then its real commit."""
+    return (prev_instr is not None and c.instr is not None and load_use(prev_instr, c.instr)
+            and c.rd == 0 and c.store is None and nxt.pc == c.pc and nxt.instr == c.instr)
+
+
+def parse_commit_log(lines):
+    """Yield a Commit for every line of a tb commit log.
+
+    Logs from a testbench without the WB valid bit also hold the load-use
+    bubbles (pipeline_model counts them as retired); those lines are dropped.
+    """
+    index = 0
+    prev_instr = None
+    pending = None
+    for c in _parse_lines(lines):
+        if pending is not None and not _is_bubble(pending, prev_instr, c):
+            pending.index = index
+            index += 1
+            prev_instr = pending.instr
+            yield pending
+        pending = c
+    if pending is not None:
+        pending.index = index
+        yield pending
+
+
+# --- ISS side ---
+
+def advance(sim: RV32ISim, steps: int):
+    """Retire up to steps instructions the way the RTL does; returns the count."""
+    done = 0
+    while done < steps:
+        done += sim.run(max_steps=steps - done, halt_on_done=False)
+        if sim.stop_reason in ("ecall", "ebreak"):
+            sim.pc += 4                 # retired as a nop
+        elif sim.stop_reason != "max_steps":
+            break
+    return done
+
+
+def reference_commit(sim: RV32ISim, index: int):
+    """Retire one instruction on the ISS; (Commit, operands) or (None, reason)."""
+    pc = sim.pc
+    word = sim.fetch(pc)
+    if word is None:
+        return None, "pc_out_of_range"
+    op, rd, rs1, rs2, imm = decode(word)
+    regs = sim.regs
+    operands = {r: regs[r] for r in (rs1, rs2) if r}
+    store = None
+    if op in STORE_SIZES:
+        store = ((regs[rs1] + imm) & 0xFFFFFFFF, regs[rs2])
+    if advance(sim, 1) != 1:
+        return None, sim.stop_reason
+    c = Commit(index, 0, index, pc, word, store=store)
+    if rd:
+        c.rd = rd
+        c.value = regs[rd]
+    return c, operands
+
+
+def _store_size(instr):
+    return STORE_SIZES.get(decode(instr)[0], 4)
+
+
+def compare(rtl: Commit, ref: Commit):
+    """Differences between an RTL commit and the ISS commit, as strings."""
+    problems = []
+    if rtl.pc != ref.pc:
+        problems.append(f"pc: RTL {_hex(rtl.pc)}, ISS {_hex(ref.pc)}")
+    if rtl.instr != ref.instr:
+        problems.append(f"instruction: RTL {_hex(rtl.instr)}, ISS {_hex(ref.instr)}")
+    if (rtl.rd, rtl.value if rtl.rd else 0) != (ref.rd, ref.value if ref.rd else 0):
+        want = f"x{ref.rd}={_hex(ref.value)}" if ref.rd else "none"
+        got = f"x{'x' if rtl.rd is None else rtl.rd}={_hex(rtl.value)}" if rtl.rd != 0 else "none"
+        problems.append(f"register write: RTL {got}, ISS {want}")
+    if rtl.store is not None or ref.store is not None:
+        if rtl.store is None or ref.store is None:
+            side = "ISS" if rtl.store is None else "RTL"
+            problems.append(f"store: only the {side} stores")
+        else:
+            mask = _STORE_MASK[_store_size(ref.instr)]
+            (ra, rdata), (ea, edata) = rtl.store, ref.store
+            if ra != ea:
+                problems.append(f"store address: RTL {_hex(ra)}, ISS {_hex(ea)}")
+            if rdata is None or rdata & mask != edata & mask:
+                problems.append(f"store data: RTL {_hex(rdata)}, ISS {_hex(edata)} "
+                                f"(mask {mask:08x})")
+    return problems
+
+
+def save(sim: RV32ISim):
+    return (sim.regs[:], bytes(sim.dmem), sim.pc, sim.instret, dict(sim.csrs))
+
+
+def restore(sim: RV32ISim, snap):
+    regs, dmem, sim.pc, sim.instret, csrs = snap
+    sim.regs[:] = regs
+    sim.dmem[:] = dmem
+    sim.csrs = dict(csrs)
+    sim.halted = False
+    sim.stop_reason = None
+
+
+# --- RTL side ---
+
+class LogState:
+    """Architectural state rebuilt from the commit log's writes."""
+
+    def __init__(self, regs, dmem):
+        self.regs = list(regs)
+        self.dmem = bytearray(dmem)
+        self.mmio = []              # (addr, size, data) stores outside dmem
+        self.unknown = False        # an X was written somewhere
+
+    def copy(self):
+        other = LogState(self.regs, self.dmem)
+        other.mmio = self.mmio[:]
+        other.unknown = self.unknown
+        return other
+
+    def apply(self, c: Commit):
+        if c.rd:
+            if c.value is None:
+                self.unknown = True
+            else:
+                self.regs[c.rd] = c.value
+        elif c.rd is None:
+            self.unknown = True
+        if c.store is not None:
+            addr, data = c.store
+            if addr is None or data is None or c.instr is None:
+                self.unknown = True
+                return
+            size = _store_size(c.instr)
+            if addr >= len(self.dmem):
+                self.mmio.append((addr, size, data & _STORE_MASK[size]))
+            elif size == 4:                     # word-indexed Data_Memory
+                _U32.pack_into(self.dmem, addr & ~3, data)
+            elif size == 2:
+                _U16.pack_into(self.dmem, addr & ~1, data & 0xFFFF)
+            else:
+                self.dmem[addr] = data & 0xFF
+
+    def matches(self, sim: RV32ISim, mmio):
+        return (not self.unknown and self.regs == sim.regs and self.dmem == sim.dmem
+                and self.mmio == mmio)
+
+
+# --- comparison ---
+
+class Mismatch:
+    def __init__(self, rtl, ref, problems, context, operands):
+        self.rtl = rtl
+        self.ref = ref
+        self.problems = problems
+        self.context = context
+        self.operands = operands
+
+    def report(self):
+        c = self.rtl
+        where = f"retired instruction {c.index}"
+        if c.line:
+            where += f" (log line {c.line}, cycle {c.cycle})"
+        lines = [f"MISMATCH at {where}"]
+        for prev in self.context:
+            lines.append(f"    ok   {prev.format()}  {_disasm(prev.instr)}")
+        lines.append(f"    RTL  {c.format()}  {_disasm(c.instr)}")
+        if self.ref is not None:
+            lines.append(f"    ISS  {self.ref.format()}  {_disasm(self.ref.instr)}")
+        lines += [f"  {p}" for p in self.problems]
+        if self.operands:
+            lines.append("  ISS operands: " + ", ".join(
+                f"{REG_NAMES[r]}=0x{v:08x}" for r, v in sorted(self.operands.items())))
+        return "\n".join(lines)
+
+
+def _disasm(word):
+    return "?" if word is None else disassemble(word)
+
+
+def lockstep(sim: RV32ISim, commits, context=()):
+    """Compare commits one by one; returns (matched commits, Mismatch or None)."""
+    recent = deque(context, maxlen=CONTEXT)
+    n = 0
+    for c in commits:
+        ref, info = reference_commit(sim, c.index)
+        if ref is None:
+            return n, Mismatch(c, None, [f"ISS cannot retire pc {_hex(sim.pc)}: {info}"],
+                               list(recent), {})
+        problems = compare(c, ref)
+        if problems:
+            return n, Mismatch(c, ref, problems, list(recent), info)
+        recent.append(c)
+        n += 1
+    return n, None
+
+
+def _state_ok(sim, snap, state, chunk, k):
+    """Restore snap, retire k commits of chunk and compare the state."""
+    restore(sim, snap)
+    if k == 0:
+        return True
+    mmio = []
+    sim.mmio_store = lambda addr, size, value: mmio.append((addr, size, value & _STORE_MASK[size]))
+    last = chunk[k - 1]
+    if advance(sim, k - 1) != k - 1 or sim.pc != last.pc or sim.fetch(sim.pc) != last.instr:
+        return False
+    if advance(sim, 1) != 1:
+        return False
+    expect = state.copy()
+    for c in chunk[:k]:
+        expect.apply(c)
+    return expect.matches(sim, mmio)
+
+
+def cosim(sim: RV32ISim, commits, every: int = 0, window: int = BISECT_WINDOW):
+    """Check commits against sim (every: checkpoint interval, 0 for lockstep).
+
+    Returns (matched commits, Mismatch or None).
+    """
+    if every <= 0:
+        return lockstep(sim, commits)
+    it = iter(commits)
+    state = LogState(sim.regs, sim.dmem)
+    matched = 0
+    while True:
+        chunk = list(islice(it, every))
+        if not chunk:
+            return matched, None
+        snap = save(sim)
+        if not _state_ok(sim, snap, state, chunk, len(chunk)):
+            lo, hi = 0, len(chunk)
+            while hi - lo > window:
+                mid = (lo + hi) // 2
+                if _state_ok(sim, snap, state, chunk, mid):
+                    lo = mid
+                else:
+                    hi = mid
+            _state_ok(sim, snap, state, chunk, lo)
+            n, m = lockstep(sim, chunk[lo:], chunk[max(0, lo - CONTEXT):lo])
+            if m is not None:
+                return matched + lo + n, m
+            # every commit matched: the state check failed on something
+            # lockstep does not see, continue from the ISS state
+        state = LogState(sim.regs, sim.dmem)
+        matched += len(chunk)
+
+
+def write_reference(sim: RV32ISim, path: str, max_steps: int):
+    """Write the ISS's own commit log (cycle = retirement number)."""
+    n = 0
+    with open(path, "w", encoding="utf-8") as f:
+        while n < max_steps:
+            c, _ = reference_commit(sim, n)
+            if c is None:
+                break
+            f.write(f"{n} {c.format()}\n")
+            n += 1
+            if c.instr == DONE_INSTR:
+                break
+    return n
+
+
+def main():
+    ap = argparse.ArgumentParser(description="lockstep RTL commit log vs ISS co-simulation")
+    ap.add_argument("program", help="program image (Inst_Mem.v, .coe, .txt, .mem)")
+    ap.add_argument("log", nargs="?", help="commit log from tb_pipeline_count_clean (+commit_log=)")
+    ap.add_argument("--data", help="Data_Memory image loaded before the run")
+    ap.add_argument("--dmem-size", type=lambda v: int(v, 0), default=DMEM_BYTES,
+                    help=f"data memory bytes (default {DMEM_BYTES}, pipeline_count_clean)")
+    ap.add_argument("--every", type=int, default=0,
+                    help=f"compare at checkpoints every N commits and bisect failures "
+                         f"(e.g. {CHECKPOINT_EVERY}; default 0: every commit in lockstep)")
+    ap.add_argument("--window", type=int, default=BISECT_WINDOW,
+                    help="bisect a failing chunk down to this many commits")
+    ap.add_argument("--write-reference", metavar="LOG",
+                    help="write the ISS commit log in the tb format instead of comparing")
+    ap.add_argument("--max-steps", type=int, default=10_000_000,
+                    help="with --write-reference: stop after this many instructions")
+    args = ap.parse_args()
+
+    if not args.log and not args.write_reference:
+        print("ERROR: give a commit log to compare, or --write-reference")
+        sys.exit(1)
+    try:
+        sim = RV32ISim(load_words(args.program), dmem_size=args.dmem_size)
+        if args.data:
+            sim.load_data(load_data_image(args.data))
+        t0 = time.perf_counter()
+        if args.write_reference:
+            n = write_reference(sim, args.write_reference, args.max_steps)
+            print(f"{n} commits -> {args.write_reference}")
+            return
+        with open(args.log, "r", encoding="utf-8") as f:
+            matched, mismatch = cosim(sim, parse_commit_log(f), args.every, args.window)
+    except (OSError, ValueError) as e:
+        print(f"ERROR: {e}")
+        sys.exit(1)
+    dt = time.perf_counter() - t0
+
+    if mismatch is not None:
+        print(mismatch.report())
+        print(f"{matched} commits matched before the mismatch ({dt:.2f}s)")
+        sys.exit(1)
+    print(f"{matched} commits match the ISS ({dt:.2f}s, {matched / max(dt, 1e-9) / 1e3:.0f}k commits/s); "
+          f"ISS pc=0x{sim.pc:08x}")
+
+
+if __name__ == "__main__":
+    main()
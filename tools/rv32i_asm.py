@@ -0,0 +1,1320 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Single-pass RV32I assembler core.
+
+Accepts the syntax of the three repo assemblers (RV32IAssembler in
+single_cycle/insturction_to_machinecode.py and asm2c-0113.py, and
+simple_rv32i_assembler.py in the game folders):
+  - '#' and '//' comments, several labels per line, label-only lines
+  - x0..x31 / ABI register names, decimal / 0x / 0b immediates
+  - branch / jal targets as labels or numeric byte offsets
+  - lui/auipc with a 20-bit value or a 12-bit-aligned 32-bit value
+  - nop, fence, fence.i, ecall, ebreak and the csr* instructions
+  - %hi(sym[+n]) for lui and %lo(sym[+n]) for I/S immediates
+  - .globl/.global and .extern for multi-file programs
+  - .text/.data sections with .word/.half/.byte/.space/.align/.incbin
+  - pseudo-instructions (PSEUDO_TABLE plus li, la/lla, call, tail)
+
+Unlike those assemblers it makes one pass over the source: forward label
+references are emitted with a zero offset and recorded as fixups, which are
+backpatched once the label is seen. Lines are tokenized with str methods and
+a few precompiled regexes, and lines whose encoding does not depend on the pc
+or a label (most of an unrolled framebuffer blit) are cached by their text,
+so a repeated line costs one dict lookup. Mnemonics dispatch through
+INSTR_TABLE (format, opcode, funct3, funct7) instead of an if/elif chain.
+
+Labels in .data get Data_Memory byte addresses starting at --data-base, so
+code reaches them with lui/%hi + addi/%lo (or a .word table). The same run
+that writes the instruction image writes the data image: a .vh of
+"mem[i] = 32'h...;" lines in the format Data_Mem.v includes (the Lode Runner
+map is mem[1024..] with --data-base 0x1000), a $readmemh .mem with an @ word
+address, or a .coe covering Data_Memory from word 0. .align n pads to 2**n
+bytes (with nops in .text); .incbin "file"[, skip[, count]] is relative to
+the source file.
+
+li picks the shortest sequence for its constant: addi alone when it fits in
+12 bits, lui alone when the low 12 bits are zero, lui+addi otherwise. la is
+lui %hi + addi %lo, and call/tail are auipc+jalr so they reach any address.
+After the pass, a relaxation loop shrinks every call/tail whose target is in
+jal range to a single jal, and every la whose address fits in 12 bits to an
+addi (or a .data address with zero low bits to a lui), then re-assembles.
+Shrinking can only move code closer, except across .align padding, so a
+site that no longer fits after a round is pinned to the long form; the loop
+stops when nothing changes (--no-relax keeps every long form).
+
+With -c the source is assembled into a relocatable object (JSON): branches
+and jals to local labels are resolved, while references to .extern symbols,
+every %hi/%lo and every .word of a label become relocations for
+rv32i_link.py.
+
+--map writes the symbol / source-line map (label addresses and the source
+line of every word) that asm_profile.py uses to report a run by label and
+line.
+
+Usage:
+  python3 tools/rv32i_asm.py Stress_test.asm                 # Stress_test.txt + .coe
+  python3 tools/rv32i_asm.py -c lib/input.asm                # lib/input.o
+  python3 tools/rv32i_asm.py lode_runner/LodeRunner_CPU.asm --inst-mem lode_runner/CPU/Inst_Mem.v
+  python3 tools/rv32i_asm.py game.asm --data-base 0x1000 --data CPU/lode_runner_map_128x64_mem_init.vh
+  python3 tools/rv32i_asm.py snake.asm --schedule             # fill load-use slots
+  python3 tools/rv32i_asm.py snake.asm --map snake.map
+  python3 tools/rv32i_asm.py --bench 100000                  # lines/second vs. the old assemblers
+"""
+
+import argparse
+import os
+import re
+import struct
+import sys
+import time
+
+REGISTERS = {
+    **{f"x{i}": i for i in range(32)},
+    "zero": 0, "ra": 1, "sp": 2, "gp": 3, "tp": 4,
+    "t0": 5, "t1": 6, "t2": 7,
+    "s0": 8, "fp": 8, "s1": 9,
+    "a0": 10, "a1": 11, "a2": 12, "a3": 13, "a4": 14, "a5": 15, "a6": 16, "a7": 17,
+    "s2": 18, "s3": 19, "s4": 20, "s5": 21, "s6": 22, "s7": 23,
+    "s8": 24, "s9": 25, "s10": 26, "s11": 27,
+    "t3": 28, "t4": 29, "t5": 30, "t6": 31,
+}
+
+CSR_NAMES = {
+    "mstatus": 0x300, "mie": 0x304, "mtvec": 0x305, "mepc": 0x341, "mcause": 0x342,
+    "mtval": 0x343, "mip": 0x344, "cycle": 0xC00, "time": 0xC01, "instret": 0xC02,
+    "cycleh": 0xC80, "timeh": 0xC81, "instreth": 0xC82,
+}
+
+# mnemonic -> (format, opcode, funct3, funct7)
+INSTR_TABLE = {
+    "lui": ("U", 0b0110111, 0, 0),
+    "auipc": ("U", 0b0010111, 0, 0),
+    "jal": ("J", 0b1101111, 0, 0),
+    "jalr": ("JALR", 0b1100111, 0, 0),
+    "beq": ("B", 0b1100011, 0, 0), "bne": ("B", 0b1100011, 1, 0),
+    "blt": ("B", 0b1100011, 4, 0), "bge": ("B", 0b1100011, 5, 0),
+    "bltu": ("B", 0b1100011, 6, 0), "bgeu": ("B", 0b1100011, 7, 0),
+    "lb": ("L", 0b0000011, 0, 0), "lh": ("L", 0b0000011, 1, 0),
+    "lw": ("L", 0b0000011, 2, 0), "lbu": ("L", 0b0000011, 4, 0),
+    "lhu": ("L", 0b0000011, 5, 0),
+    "sb": ("S", 0b0100011, 0, 0), "sh": ("S", 0b0100011, 1, 0),
+    "sw": ("S", 0b0100011, 2, 0),
+    "addi": ("I", 0b0010011, 0, 0), "slti": ("I", 0b0010011, 2, 0),
+    "sltiu": ("I", 0b0010011, 3, 0), "xori": ("I", 0b0010011, 4, 0),
+    "ori": ("I", 0b0010011, 6, 0), "andi": ("I", 0b0010011, 7, 0),
+    "slli": ("SHIFT", 0b0010011, 1, 0b0000000),
+    "srli": ("SHIFT", 0b0010011, 5, 0b0000000),
+    "srai": ("SHIFT", 0b0010011, 5, 0b0100000),
+    "add": ("R", 0b0110011, 0, 0b0000000), "sub": ("R", 0b0110011, 0, 0b0100000),
+    "sll": ("R", 0b0110011, 1, 0), "slt": ("R", 0b0110011, 2, 0),
+    "sltu": ("R", 0b0110011, 3, 0), "xor": ("R", 0b0110011, 4, 0),
+    "srl": ("R", 0b0110011, 5, 0), "sra": ("R", 0b0110011, 5, 0b0100000),
+    "or": ("R", 0b0110011, 6, 0), "and": ("R", 0b0110011, 7, 0),
+    "fence": ("FENCE", 0b0001111, 0, 0),
+    "fence.i": ("NONE", 0b0001111, 1, 0),
+    "ecall": ("NONE", 0b1110011, 0, 0),
+    "ebreak": ("NONE", 0b1110011, 0, 1),       # funct7 slot: imm[0]
+    "csrrw": ("CSR", 0b1110011, 1, 0), "csrrs": ("CSR", 0b1110011, 2, 0),
+    "csrrc": ("CSR", 0b1110011, 3, 0),
+    "csrrwi": ("CSRI", 0b1110011, 5, 0), "csrrsi": ("CSRI", 0b1110011, 6, 0),
+    "csrrci": ("CSRI", 0b1110011, 7, 0),
+    "nop": ("NOP", 0b0010011, 0, 0),
+}
+
+# 1:1 pseudo-instructions: mnemonic -> {operand count: template}; {0}.. are
+# the operands in source order
+PSEUDO_TABLE = {
+    "mv": {2: "addi {0}, {1}, 0"},
+    "not": {2: "xori {0}, {1}, -1"},
+    "neg": {2: "sub {0}, x0, {1}"},
+    "seqz": {2: "sltiu {0}, {1}, 1"},
+    "snez": {2: "sltu {0}, x0, {1}"},
+    "sltz": {2: "slt {0}, {1}, x0"},
+    "sgtz": {2: "slt {0}, x0, {1}"},
+    "j": {1: "jal x0, {0}"},
+    "jr": {1: "jalr x0, 0({0})"},
+    "ret": {0: "jalr x0, 0(ra)"},
+    "beqz": {2: "beq {0}, x0, {1}"},
+    "bnez": {2: "bne {0}, x0, {1}"},
+    "blez": {2: "bge x0, {0}, {1}"},
+    "bgez": {2: "bge {0}, x0, {1}"},
+    "bltz": {2: "blt {0}, x0, {1}"},
+    "bgtz": {2: "blt x0, {0}, {1}"},
+    "bgt": {3: "blt {1}, {0}, {2}"},
+    "ble": {3: "bge {1}, {0}, {2}"},
+    "bgtu": {3: "bltu {1}, {0}, {2}"},
+    "bleu": {3: "bgeu {1}, {0}, {2}"},
+    "csrr": {2: "csrrs {0}, {1}, x0"},
+    "csrw": {2: "csrrw x0, {0}, {1}"},
+    "csrs": {2: "csrrs x0, {0}, {1}"},
+    "csrc": {2: "csrrc x0, {0}, {1}"},
+}
+
+# relaxable pseudo-instructions; short forms are chosen by relax_step()
+RELAX_KINDS = ("call", "tail", "la")
+
+_LABEL_RE = re.compile(r"\s*([A-Za-z_.$][\w.$]*)\s*:")
+_MEM_RE = re.compile(r"^(.*)\(\s*(\w+)\s*\)$")
+_RELOC_RE = re.compile(r"^%(hi|lo)\(\s*([A-Za-z_.$][\w.$]*)\s*(?:([+-])\s*(\w+))?\s*\)$")
+_SYM_RE = re.compile(r"^([A-Za-z_.$][\w.$]*)\s*(?:([+-])\s*(\w+))?$")
+_TOKEN_RE = re.compile(r"(?:[^\s,(]+|\([^)]*\)?)+")
+_MAP_LINE_RE = re.compile(r"^([0-9A-Fa-f]+) (.+?):(\d+)(?:  (.*))?$")
+_INCBIN_RE = re.compile(r'^"([^"]+)"\s*(?:,\s*(\w+)\s*)?(?:,\s*(\w+)\s*)?$')
+
+OBJECT_VERSION = 3
+
+# .section names that select the data section
+DATA_SECTIONS = (".data", ".rodata", ".bss", ".sdata", ".sbss")
+
+INST_MEM_MARKER = "// paste your instructions here (generated by python)"
+
+
+class AsmError(ValueError):
+    """Assembly error; lineno/source point at the offending line."""
+
+    def __init__(self, msg, lineno=None, source=None, filename=None):
+        where = f"{filename or '<asm>'}:{lineno}: " if lineno else ""
+        tail = f" (in: {source.strip()})" if source else ""
+        super().__init__(f"{where}{msg}{tail}")
+        self.lineno = lineno
+
+
+# --- field encoders (imm is already range-checked) ---
+
+def enc_r(opc, f3, f7, rd, rs1, rs2):
+    return (f7 << 25) | (rs2 << 20) | (rs1 << 15) | (f3 << 12) | (rd << 7) | opc
+
+
+def enc_i(opc, f3, rd, rs1, imm):
+    return ((imm & 0xFFF) << 20) | (rs1 << 15) | (f3 << 12) | (rd << 7) | opc
+
+
+def enc_s(opc, f3, rs1, rs2, imm):
+    imm &= 0xFFF
+    return ((imm >> 5) << 25) | (rs2 << 20) | (rs1 << 15) | (f3 << 12) | ((imm & 0x1F) << 7) | opc
+
+
+def b_field(imm):
+    imm &= 0x1FFF
+    return ((((imm >> 12) & 1) << 31) | (((imm >> 5) & 0x3F) << 25)
+            | (((imm >> 1) & 0xF) << 8) | (((imm >> 11) & 1) << 7))
+
+
+def j_field(imm):
+    imm &= 0x1FFFFF
+    return ((((imm >> 20) & 1) << 31) | (((imm >> 1) & 0x3FF) << 21)
+            | (((imm >> 11) & 1) << 20) | (((imm >> 12) & 0xFF) << 12))
+
+
+B_MASK = 0xFE000F80
+J_MASK = 0xFFFFF000
+I_MASK = 0xFFF00000
+S_MASK = 0xFE000F80
+U_MASK = 0xFFFFF000
+
+NOP_WORD = 0x00000013
+
+# Fixup / relocation kinds. B and J are pc-relative; the %hi/%lo kinds take
+# the absolute symbol address (HI20 rounds so that HI20 + LO12 == address).
+# PCREL_LO12_I is the jalr of an auipc+jalr pair: its offset is taken from
+# the auipc, the word before it.
+HI20 = "HI20"
+LO12_I = "LO12_I"
+LO12_S = "LO12_S"
+ABS32 = "ABS32"         # .word sym: the whole 32-bit address
+PCREL_HI20 = "PCREL_HI20"
+PCREL_LO12_I = "PCREL_LO12_I"
+PCREL_KINDS = ("B", "J", PCREL_HI20, PCREL_LO12_I)
+
+
+def split_line(raw: str):
+    """Strip comments; return (labels defined on the line, instruction text)."""
+    line = raw
+    cut = line.find("#")
+    if cut >= 0:
+        line = line[:cut]
+    cut = line.find("//")
+    if cut >= 0:
+        line = line[:cut]
+    line = line.strip()
+    labels = []
+    while ":" in line:
+        m = _LABEL_RE.match(line)
+        if not m:
+            break
+        labels.append(m.group(1))
+        line = line[m.end():].strip()
+    return labels, line
+
+
+def parse_int(s: str):
+    s = s.strip()
+    try:
+        return int(s, 0)
+    except ValueError:
+        return int(s, 10)      # '010' style decimals (int(.., 0) rejects them)
+
+
+def check_signed(value, bits, what):
+    lo, hi = -(1 << (bits - 1)), (1 << (bits - 1)) - 1
+    if not lo <= value <= hi:
+        raise ValueError(f"{what} immediate out of range ({lo}..{hi}), got {value}")
+
+
+def u_immediate(value):
+    """20-bit value, or a 32-bit value aligned to 12 bits (auto >> 12)."""
+    if -(1 << 19) <= value < (1 << 20):
+        return value & 0xFFFFF
+    if value & 0xFFF == 0 and -(1 << 31) <= value < (1 << 32):
+        return (value >> 12) & 0xFFFFF
+    raise ValueError(f"U-type immediate out of range; use 20-bit or 12-bit-aligned value, got {value}")
+
+
+def hi20(value):
+    return ((value + 0x800) >> 12) & 0xFFFFF
+
+
+def lo12(value):
+    return ((value & 0xFFF) ^ 0x800) - 0x800
+
+
+def _tokens(text: str):
+    """Mnemonic and operands; a parenthesised group such as %lo(sym + 4)(t1)
+    stays in one token even with spaces inside."""
+    if "(" not in text:
+        return text.replace(",", " ").split()
+    return _TOKEN_RE.findall(text)
+
+
+def section_switch(line: str):
+    """'text' / 'data' if line is a section directive, else None."""
+    parts = line.replace(",", " ").split()
+    name = parts[0].lower()
+    if name == ".text":
+        return "text"
+    if name in DATA_SECTIONS:
+        return "data"
+    if name == ".section" and len(parts) > 1:
+        sec = parts[1].lower()
+        return "data" if sec.startswith(DATA_SECTIONS) else "text"
+    return None
+
+
+def _patch(kind, word, value, pc):
+    """Place a resolved symbol value into word (pc: address of the word)."""
+    if kind == ABS32:
+        return value & 0xFFFFFFFF
+    if kind == PCREL_HI20:
+        return (word & ~U_MASK & 0xFFFFFFFF) | (hi20(value - pc) << 12)
+    if kind == PCREL_LO12_I:
+        return (word & ~I_MASK & 0xFFFFFFFF) | ((lo12(value - (pc - 4)) & 0xFFF) << 20)
+    if kind == HI20:
+        return (word & ~U_MASK & 0xFFFFFFFF) | (hi20(value) << 12)
+    if kind == LO12_I:
+        return (word & ~I_MASK & 0xFFFFFFFF) | ((lo12(value) & 0xFFF) << 20)
+    if kind == LO12_S:
+        lo = lo12(value) & 0xFFF
+        return (word & ~S_MASK & 0xFFFFFFFF) | ((lo >> 5) << 25) | ((lo & 0x1F) << 7)
+    if kind == "B":
+        off = value - pc
+        if off & 1:
+            raise ValueError(f"branch target must be 2-byte aligned, got offset {off}")
+        check_signed(off, 13, "B-type")
+        return (word & ~B_MASK & 0xFFFFFFFF) | b_field(off)
+    if kind == "J":
+        off = value - pc
+        if off & 1:
+            raise ValueError(f"jal target must be 2-byte aligned, got offset {off}")
+        check_signed(off, 21, "J-type")
+        return (word & ~J_MASK & 0xFFFFFFFF) | j_field(off)
+    raise ValueError(f"unknown fixup kind {kind!r}")
+
+
+def relax_form(kind, value, pc, is_data):
+    """Short form for a relaxable site whose symbol resolves to value, or None."""
+    if kind == "la":
+        if -2048 <= value < 2048:
+            return "addi"
+        if is_data and value & 0xFFF == 0:
+            return "lui"
+        return None
+    if is_data:
+        return None
+    off = value - pc
+    return "jal" if -(1 << 20) <= off < (1 << 20) and not off & 1 else None
+
+
+def relax_step(sites, labels, data_labels, short, pinned, relocatable=False):
+    """One relaxation round over (site id, word index, kind, symbol, addend).
+
+    Shrinks sites that now fit into short {site id: form}, and moves short
+    sites that no longer fit to pinned. Returns True if anything changed.
+    """
+    changed = False
+    for site, idx, kind, sym, addend in sites:
+        addr = labels.get(sym)
+        form = None
+        if addr is not None and not (relocatable and kind == "la"):
+            form = relax_form(kind, addr + addend, 4 * idx, sym in data_labels)
+        cur = short.get(site)
+        if cur is not None:
+            if form != cur:
+                del short[site]
+                pinned.add(site)
+                changed = True
+        elif form is not None and site not in pinned:
+            short[site] = form
+            changed = True
+    return changed
+
+
+def _patch_data(data: bytearray, offset: int, kind: str, value: int):
+    if kind != ABS32:
+        raise ValueError(f"relocation {kind} is not valid in .data")
+    struct.pack_into("<I", data, offset, value & 0xFFFFFFFF)
+
+
+class Program:
+    """Result of one assembly: words, label addresses and word -> source line.
+
+    data holds the .data bytes placed at data_base; data_labels names the
+    labels that are Data_Memory addresses. For relocatable output,
+    globals/externs name the exported and imported symbols, labels are
+    section offsets, and relocs / data_relocs list (byte offset, kind,
+    symbol, addend) still to be applied by the linker. text_align and
+    data_align are the largest .align of each section (at least 4).
+    """
+
+    def __init__(self, words, labels, lines, source_name="<asm>",
+                 globals_=(), externs=(), relocs=(), data=b"", data_base=0,
+                 data_labels=(), data_relocs=(), data_align=4, text_align=4):
+        self.words = words
+        self.labels = labels
+        self.lines = lines          # lines[i]: 1-based source line of words[i]
+        self.source_name = source_name
+        self.globals = set(globals_)
+        self.externs = set(externs)
+        self.relocs = list(relocs)
+        self.data = bytes(data)
+        self.data_base = data_base
+        self.data_labels = set(data_labels)
+        self.data_relocs = list(data_relocs)
+        self.data_align = data_align
+        self.text_align = text_align
+
+
+class Assembler:
+    """Single-pass RV32I assembler with forward-reference backpatching."""
+
+    def __init__(self, data_base: int = 0):
+        if data_base & 3:
+            raise ValueError(f"data base must be word aligned, got {data_base:#x}")
+        self.data_base = data_base
+        self._formats = {
+            "R": self._fmt_r, "I": self._fmt_i, "SHIFT": self._fmt_shift,
+            "L": self._fmt_load, "S": self._fmt_store, "B": self._fmt_branch,
+            "J": self._fmt_jal, "JALR": self._fmt_jalr, "U": self._fmt_u,
+            "NONE": self._fmt_none, "NOP": self._fmt_nop, "FENCE": self._fmt_fence,
+            "CSR": self._fmt_csr, "CSRI": self._fmt_csr,
+        }
+        # mnemonic -> (format handler, opcode, funct3, funct7)
+        self._dispatch = {m: (self._formats[f], opc, f3, f7)
+                          for m, (f, opc, f3, f7) in INSTR_TABLE.items()}
+        self._word_cache = {}       # pc/label-independent line text -> word(s)
+        self.short_sites = {}       # relaxation: site id -> short form
+        self._reset()
+
+    def _reset(self):
+        self.labels = {}
+        self.words = []
+        self.lines = []
+        self.fixups = []            # (word index, kind, symbol, pc, addend)
+        self.fixup_sources = {}     # word index -> source line, for errors
+        self.globals = set()
+        self.externs = set()
+        self.relocs = []
+        self.section = "text"
+        self.data = bytearray()
+        self.data_origin = self.data_base   # address of data[0] (0 for objects)
+        self.data_labels = set()
+        self.data_fixups = []       # (data offset, kind, symbol, addend)
+        self.data_fixup_sources = {}    # data offset -> (line, source)
+        self.data_relocs = []
+        self.data_align = 4
+        self.text_align = 4
+        self.source_dir = ""
+        self._lineno = None
+        self.relax_sites = []       # (site id, word index, kind, symbol, addend)
+        self._pc_dependent = False
+
+    # --- operands ---
+
+    @staticmethod
+    def reg(tok):
+        r = REGISTERS.get(tok)
+        if r is None:
+            r = REGISTERS.get(tok.strip().lower())
+            if r is None:
+                raise ValueError(f"Invalid register: '{tok}'")
+        return r
+
+    @staticmethod
+    def mem_operand(tok):
+        m = _MEM_RE.match(tok)
+        if not m:
+            raise ValueError(f"Invalid format: expected 'offset(rs1)', got '{tok}'")
+        off = m.group(1).strip()
+        return off, Assembler.reg(m.group(2))
+
+    def target(self, tok, kind, pc):
+        """Byte offset for a branch/jal operand: a number, or a label (fixup if forward)."""
+        try:
+            return parse_int(tok)
+        except ValueError:
+            pass
+        self._pc_dependent = True
+        addr = self.labels.get(tok)
+        if addr is not None:
+            return addr - pc
+        self.fixups.append((pc >> 2, kind, tok, pc, 0))
+        return 0
+
+    def imm_operand(self, tok, kind, pc):
+        """Immediate operand: a number, or %hi(sym)/%lo(sym) recorded as a fixup.
+
+        %hi/%lo always go through a fixup (even for known labels) because
+        their value is the final absolute address.
+        """
+        if not tok:
+            return 0
+        if tok[0] != "%":
+            return parse_int(tok)
+        m = _RELOC_RE.match(tok.replace(" ", ""))
+        if not m:
+            raise ValueError(f"Invalid relocation operand '{tok}'")
+        part, sym, sign, addend = m.groups()
+        if (part == "hi") != (kind == HI20):
+            raise ValueError(f"%{part}() cannot be used here")
+        addend = parse_int(addend) if addend else 0
+        self._pc_dependent = True
+        self.fixups.append((pc >> 2, kind, sym, pc, -addend if sign == "-" else addend))
+        return 0
+
+    @staticmethod
+    def _nops(ops, n, usage):
+        if len(ops) != n:
+            raise ValueError(f"Requires {n} operands ({usage}), got {len(ops)}")
+
+    # --- formats: handler(ops, pc, opc, f3, f7) -> word ---
+
+    def _fmt_r(self, ops, pc, opc, f3, f7):
+        self._nops(ops, 3, "rd, rs1, rs2")
+        reg = self.reg
+        return enc_r(opc, f3, f7, reg(ops[0]), reg(ops[1]), reg(ops[2]))
+
+    def _fmt_i(self, ops, pc, opc, f3, f7):
+        self._nops(ops, 3, "rd, rs1, imm")
+        imm = self.imm_operand(ops[2], LO12_I, pc)
+        check_signed(imm, 12, "I-type")
+        return enc_i(opc, f3, self.reg(ops[0]), self.reg(ops[1]), imm)
+
+    def _fmt_shift(self, ops, pc, opc, f3, f7):
+        self._nops(ops, 3, "rd, rs1, shamt")
+        imm = parse_int(ops[2])
+        if not 0 <= imm <= 31:
+            raise ValueError(f"Shift immediate must be 0-31, got {imm}")
+        return enc_i(opc, f3, self.reg(ops[0]), self.reg(ops[1]), imm | (f7 << 5))
+
+    def _fmt_load(self, ops, pc, opc, f3, f7):
+        self._nops(ops, 2, "rd, offset(rs1)")
+        off, rs1 = self.mem_operand(ops[1])
+        imm = self.imm_operand(off, LO12_I, pc)
+        check_signed(imm, 12, "I-type")
+        return enc_i(opc, f3, self.reg(ops[0]), rs1, imm)
+
+    def _fmt_store(self, ops, pc, opc, f3, f7):
+        self._nops(ops, 2, "rs2, offset(rs1)")
+        off, rs1 = self.mem_operand(ops[1])
+        imm = self.imm_operand(off, LO12_S, pc)
+        check_signed(imm, 12, "S-type")
+        return enc_s(opc, f3, rs1, self.reg(ops[0]), imm)
+
+    def _fmt_branch(self, ops, pc, opc, f3, f7):
+        self._nops(ops, 3, "rs1, rs2, offset/label")
+        off = self.target(ops[2], "B", pc)
+        if off & 1:
+            raise ValueError(f"B-type immediate must be 2-byte aligned, got {off}")
+        check_signed(off, 13, "B-type")
+        return b_field(off) | enc_r(opc, f3, 0, 0, self.reg(ops[0]), self.reg(ops[1]))
+
+    def _fmt_jal(self, ops, pc, opc, f3, f7):
+        if len(ops) == 1:                       # jal label: rd = ra
+            ops = ["ra", ops[0]]
+        self._nops(ops, 2, "rd, offset/label")
+        off = self.target(ops[1], "J", pc)
+        if off & 1:
+            raise ValueError(f"J-type immediate must be 2-byte aligned, got {off}")
+        check_signed(off, 21, "J-type")
+        return j_field(off) | (self.reg(ops[0]) << 7) | opc
+
+    def _fmt_jalr(self, ops, pc, opc, f3, f7):
+        if len(ops) == 3:                       # jalr rd, rs1, imm
+            rd, rs1, imm = self.reg(ops[0]), self.reg(ops[1]), parse_int(ops[2])
+        elif len(ops) == 1:                     # jalr rs1: rd = ra
+            rd, rs1, imm = 1, self.reg(ops[0]), 0
+        else:
+            self._nops(ops, 2, "rd, offset(rs1)")
+            rd = self.reg(ops[0])
+            off, rs1 = self.mem_operand(ops[1])
+            imm = self.imm_operand(off, LO12_I, pc)
+        check_signed(imm, 12, "I-type")
+        return enc_i(opc, f3, rd, rs1, imm)
+
+    def _fmt_u(self, ops, pc, opc, f3, f7):
+        self._nops(ops, 2, "rd, imm")
+        imm = self.imm_operand(ops[1], HI20, pc)
+        return (u_immediate(imm) << 12) | (self.reg(ops[0]) << 7) | opc
+
+    def _fmt_none(self, ops, pc, opc, f3, f7):
+        self._nops(ops, 0, "none")
+        return (f7 << 20) | (f3 << 12) | opc
+
+    def _fmt_nop(self, ops, pc, opc, f3, f7):
+        self._nops(ops, 0, "none")
+        return 0x00000013
+
+    def _fmt_fence(self, ops, pc, opc, f3, f7):
+        bits = {"i": 8, "o": 4, "r": 2, "w": 1}
+        pred_succ = 0
+        for part in (ops + ["iorw", "iorw"])[:2]:
+            v = 0
+            for c in part.lower():
+                if c not in bits:
+                    raise ValueError(f"Invalid FENCE predicate character: '{c}'")
+                v |= bits[c]
+            pred_succ = (pred_succ << 4) | v
+        return (pred_succ << 20) | (f3 << 12) | opc
+
+    def _fmt_csr(self, ops, pc, opc, f3, f7):
+        self._nops(ops, 3, "rd, csr, rs1/imm")
+        name = ops[1].strip().lower()
+        csr = CSR_NAMES.get(name)
+        if csr is None:
+            csr = parse_int(name)
+            if not 0 <= csr <= 0xFFF:
+                raise ValueError(f"CSR address {hex(csr)} out of range (0-0xFFF)")
+        if f3 >= 5:
+            src = parse_int(ops[2])
+            if not 0 <= src <= 31:
+                raise ValueError(f"CSR immediate must be 0-31, got {src}")
+        else:
+            src = self.reg(ops[2])
+        return (csr << 20) | (src << 15) | (f3 << 12) | (self.reg(ops[0]) << 7) | opc
+
+    # --- driver ---
+
+    def encode_line(self, text: str, pc: int):
+        """Encode one instruction (no label, no comment).
+
+        Returns the word, or a tuple of words for a multi-word pseudo.
+        """
+        cached = self._word_cache.get(text)
+        if cached is not None:
+            return cached
+        parts = _tokens(text)
+        mnemonic = parts[0].lower()
+        self._pc_dependent = False
+        entry = self._dispatch.get(mnemonic)
+        if entry is None:
+            word = self._pseudo(mnemonic, parts[1:], pc)
+        else:
+            handler, opc, f3, f7 = entry
+            word = handler(parts[1:], pc, opc, f3, f7)
+        if not self._pc_dependent:
+            self._word_cache[text] = word
+        return word
+
+    def _encode_sub(self, text: str, pc: int):
+        """Encode a real instruction of a pseudo expansion (no cache)."""
+        parts = _tokens(text)
+        handler, opc, f3, f7 = self._dispatch[parts[0]]
+        return handler(parts[1:], pc, opc, f3, f7)
+
+    def _pseudo(self, mnemonic, ops, pc):
+        forms = PSEUDO_TABLE.get(mnemonic)
+        if forms is not None:
+            template = forms.get(len(ops))
+            if template is None:
+                raise ValueError(f"'{mnemonic}' takes {' or '.join(map(str, forms))} operands, "
+                                 f"got {len(ops)}")
+            return self._encode_sub(template.format(*ops), pc)
+        if mnemonic == "li":
+            self._nops(ops, 2, "rd, imm")
+            return self._li(ops[0], parse_int(ops[1]), pc)
+        if mnemonic in ("la", "lla"):
+            if len(ops) < 2:
+                raise ValueError("Requires 2 operands (rd, symbol)")
+            return self._relaxable("la", ops[0], "".join(ops[1:]), pc)
+        if mnemonic in ("call", "tail"):
+            if not ops:
+                raise ValueError(f"Requires 1 operand ({mnemonic} symbol)")
+            return self._relaxable(mnemonic, None, "".join(ops), pc)
+        raise ValueError(f"Unsupported instruction (not in RV32I standard): '{mnemonic}'")
+
+    def _li(self, rd, value, pc):
+        """Shortest load of a 32-bit constant: addi, lui, or lui+addi."""
+        if not -(1 << 31) <= value < (1 << 32):
+            raise ValueError(f"li immediate does not fit in 32 bits, got {value}")
+        value = ((value & 0xFFFFFFFF) ^ 0x80000000) - 0x80000000
+        if -2048 <= value < 2048:
+            return self._encode_sub(f"addi {rd}, x0, {value}", pc)
+        hi = hi20(value)
+        if value & 0xFFF == 0:
+            return self._encode_sub(f"lui {rd}, {hi}", pc)
+        return (self._encode_sub(f"lui {rd}, {hi}", pc),
+                self._encode_sub(f"addi {rd}, {rd}, {lo12(value)}", pc + 4))
+
+    def _relaxable(self, kind, rd, expr, pc):
+        """la / call / tail: long form unless short_sites picked a short one."""
+        m = _SYM_RE.match(expr)
+        if not m:
+            raise ValueError(f"Invalid symbol operand '{expr}'")
+        sym, sign, addend = m.groups()
+        addend = parse_int(addend) if addend else 0
+        if sign == "-":
+            addend = -addend
+        self._pc_dependent = True
+        site = len(self.relax_sites)
+        self.relax_sites.append((site, pc >> 2, kind, sym, addend))
+        ref = f"{sym}{addend:+d}" if addend else sym
+        form = self.short_sites.get(site)
+        if kind == "la":
+            if form == "addi":
+                return self._encode_sub(f"addi {rd}, x0, %lo({ref})", pc)
+            if form == "lui":
+                return self._encode_sub(f"lui {rd}, %hi({ref})", pc)
+            return (self._encode_sub(f"lui {rd}, %hi({ref})", pc),
+                    self._encode_sub(f"addi {rd}, {rd}, %lo({ref})", pc + 4))
+        link, tmp = ("ra", "ra") if kind == "call" else ("x0", "t1")
+        if form == "jal":
+            self.fixups.append((pc >> 2, "J", sym, pc, addend))
+            return (REGISTERS[link] << 7) | 0b1101111
+        self.fixups.append((pc >> 2, PCREL_HI20, sym, pc, addend))
+        self.fixups.append(((pc >> 2) + 1, PCREL_LO12_I, sym, pc + 4, addend))
+        return ((REGISTERS[tmp] << 7) | 0b0010111,
+                enc_i(0b1100111, 0, REGISTERS[link], REGISTERS[tmp], 0))
+
+    def define_label(self, name: str, lineno=None, source_name=None):
+        if name in self.labels:
+            raise AsmError(f"Duplicate label '{name}'", lineno, filename=source_name)
+        if self.section == "data":
+            self.labels[name] = self.data_origin + len(self.data)
+            self.data_labels.add(name)
+        else:
+            self.labels[name] = 4 * len(self.words)
+
+    def feed(self, numbered_lines, source_name: str = "<asm>"):
+        """Encode (lineno, raw line) pairs at the current pc.
+
+        References to labels that are not defined yet are left in
+        self.fixups as (word index, kind, symbol, pc); resolve() patches them.
+        """
+        words = self.words
+        lines = self.lines
+        fixups = self.fixups
+        encode = self.encode_line
+        sources = self.fixup_sources
+        data_fixups = self.data_fixups
+        self.source_dir = os.path.dirname(source_name) if source_name[:1] != "<" else ""
+
+        for lineno, raw in numbered_lines:
+            labels, line = split_line(raw)
+            for name in labels:
+                self.define_label(name, lineno, source_name)
+            if not line:
+                continue
+            if line[0] == ".":
+                n_fix, n_dfix = len(fixups), len(data_fixups)
+                self._lineno = lineno
+                try:
+                    self.directive(line)
+                except ValueError as e:
+                    raise AsmError(str(e), lineno, raw, source_name) from None
+                for i in range(n_fix, len(fixups)):
+                    sources[fixups[i][0]] = raw
+                for i in range(n_dfix, len(data_fixups)):
+                    self.data_fixup_sources[data_fixups[i][0]] = (lineno, raw)
+                continue
+            if self.section == "data":
+                raise AsmError("Instructions are not allowed in .data (switch back with .text)",
+                               lineno, raw, source_name)
+            n_fix = len(fixups)
+            try:
+                word = encode(line, 4 * len(words))
+            except ValueError as e:
+                raise AsmError(f"Assembly failed: {e}", lineno, raw, source_name) from None
+            if word.__class__ is int:
+                words.append(word)
+                lines.append(lineno)
+            else:
+                words.extend(word)
+                lines.extend([lineno] * len(word))
+            if len(fixups) != n_fix:
+                for i in range(n_fix, len(fixups)):
+                    sources[fixups[i][0]] = raw
+
+    def directive(self, line: str):
+        sec = section_switch(line)
+        if sec is not None:
+            self.section = sec
+            return
+        parts = line.split(None, 1)
+        name = parts[0].lower()
+        rest = parts[1].strip() if len(parts) > 1 else ""
+        args = [a.strip() for a in rest.split(",")] if rest else []
+        if name in (".globl", ".global"):
+            self.globals.update(rest.replace(",", " ").split())
+        elif name == ".extern":
+            self.externs.update(rest.replace(",", " ").split())
+        elif name in (".option", ".file", ".type", ".size"):
+            pass
+        elif name == ".word":
+            self._data_values(args, 4)
+        elif name in (".half", ".short"):
+            self._data_values(args, 2)
+        elif name == ".byte":
+            self._data_values(args, 1)
+        elif name in (".space", ".zero"):
+            if not 1 <= len(args) <= 2:
+                raise ValueError(f"{name} expects 'size[, fill]'")
+            size = parse_int(args[0])
+            fill = parse_int(args[1]) if len(args) > 1 else 0
+            if size < 0 or not -128 <= fill <= 255:
+                raise ValueError(f"{name}: bad size {size} or fill {fill}")
+            self._data_bytes(bytes([fill & 0xFF]) * size, name)
+        elif name == ".align":
+            if len(args) != 1:
+                raise ValueError(".align expects a power-of-two exponent")
+            self._align(parse_int(args[0]))
+        elif name == ".incbin":
+            self._incbin(rest)
+        else:
+            raise ValueError(f"Unsupported directive '{name}'")
+
+    def _data_bytes(self, blob: bytes, what: str):
+        if self.section != "data":
+            raise ValueError(f"{what} is only allowed in .data")
+        self.data += blob
+
+    def _data_values(self, args, size):
+        """.word/.half/.byte: numbers, or (for .word) sym[+n] addresses."""
+        if not args or not all(args):
+            raise ValueError("expected a comma-separated value list")
+        bits = 8 * size
+        for tok in args:
+            try:
+                value = parse_int(tok)
+            except ValueError:
+                m = _SYM_RE.match(tok)
+                if not m or size != 4:
+                    raise ValueError(f"Invalid value '{tok}'" if m is None else
+                                     f"label '{tok}' needs a 32-bit .word") from None
+                addend = 0
+                if m.group(2):
+                    addend = parse_int(m.group(3))
+                    if m.group(2) == "-":
+                        addend = -addend
+                if self.section == "data":
+                    self.data_fixups.append((len(self.data), ABS32, m.group(1), addend))
+                    self.data += bytes(4)
+                else:
+                    self.fixups.append((len(self.words), ABS32, m.group(1),
+                                        4 * len(self.words), addend))
+                    self.words.append(0)
+                    self.lines.append(self._lineno)
+                continue
+            if not -(1 << (bits - 1)) <= value < (1 << bits):
+                raise ValueError(f"value {value} does not fit in {bits} bits")
+            if self.section == "data":
+                self.data += (value & ((1 << bits) - 1)).to_bytes(size, "little")
+            elif size == 4:
+                self.words.append(value & 0xFFFFFFFF)
+                self.lines.append(self._lineno)
+            else:
+                raise ValueError(".half/.byte are only allowed in .data")
+
+    def _align(self, n):
+        if not 0 <= n <= 12:
+            raise ValueError(f".align exponent must be 0-12, got {n}")
+        align = 1 << n
+        if self.section == "data":
+            self.data_align = max(self.data_align, align)
+            self.data += bytes(-len(self.data) % align)
+            return
+        self.text_align = max(self.text_align, align)
+        while (4 * len(self.words)) % align:
+            self.words.append(NOP_WORD)
+            self.lines.append(self._lineno)
+
+    def _incbin(self, rest):
+        m = _INCBIN_RE.match(rest)
+        if not m:
+            raise ValueError('.incbin expects "file"[, skip[, count]]')
+        path = m.group(1)
+        if not os.path.isabs(path):
+            path = os.path.join(self.source_dir, path)
+        with open(path, "rb") as f:
+            blob = f.read()
+        skip = parse_int(m.group(2)) if m.group(2) else 0
+        blob = blob[skip:]
+        if m.group(3):
+            count = parse_int(m.group(3))
+            if count > len(blob):
+                raise ValueError(f".incbin: {path} has only {len(blob)} bytes after skip {skip}")
+            blob = blob[:count]
+        self._data_bytes(blob, ".incbin")
+
+    def resolve(self, source_name: str = "<asm>", relocatable: bool = False):
+        """Backpatch every fixup against self.labels.
+
+        relocatable: keep %hi/%lo, .word addresses and references to .extern
+        symbols as self.relocs / self.data_relocs instead of failing on them.
+        """
+        words, lines, sources = self.words, self.lines, self.fixup_sources
+        for idx, kind, sym, pc, addend in self.fixups:
+            addr = self.labels.get(sym)
+            if kind in PCREL_KINDS and sym in self.data_labels:
+                raise AsmError(f"'{sym}' is a .data label, not a code address",
+                               lines[idx], sources.get(idx), source_name)
+            if relocatable and (addr is None or kind not in PCREL_KINDS):
+                if addr is None and sym not in self.externs:
+                    raise AsmError(f"Undefined symbol '{sym}' (declare it with .extern)",
+                                   lines[idx], sources.get(idx), source_name)
+                self.relocs.append((4 * idx, kind, sym, addend))
+                continue
+            if addr is None:
+                hint = " (.extern: link with rv32i_link.py)" if sym in self.externs else ""
+                raise AsmError(f"Unknown label or immediate: '{sym}'{hint}", lines[idx],
+                               sources.get(idx), source_name)
+            try:
+                words[idx] = _patch(kind, words[idx], addr + addend, pc)
+            except ValueError as e:
+                raise AsmError(f"Assembly failed: {e}", lines[idx], sources.get(idx),
+                               source_name) from None
+        self.fixups = []
+        for off, kind, sym, addend in self.data_fixups:
+            addr = self.labels.get(sym)
+            if relocatable:
+                if addr is None and sym not in self.externs:
+                    lineno, raw = self.data_fixup_sources.get(off, (None, None))
+                    raise AsmError(f"Undefined symbol '{sym}' (declare it with .extern)",
+                                   lineno, raw, source_name)
+                self.data_relocs.append((off, kind, sym, addend))
+                continue
+            if addr is None:
+                lineno, raw = self.data_fixup_sources.get(off, (None, None))
+                raise AsmError(f"Unknown label: '{sym}'", lineno, raw, source_name)
+            _patch_data(self.data, off, kind, addr + addend)
+        self.data_fixups = []
+        for sym in self.globals:
+            if sym not in self.labels:
+                raise AsmError(f".globl symbol '{sym}' is not defined", filename=source_name)
+
+    def program(self, source_name: str = "<asm>"):
+        return Program(self.words, dict(self.labels), self.lines, source_name,
+                       self.globals, self.externs, self.relocs, self.data,
+                       self.data_origin, self.data_labels, self.data_relocs,
+                       self.data_align, self.text_align)
+
+    def assemble(self, text: str, source_name: str = "<asm>", relocatable: bool = False,
+                 relax: bool = True):
+        """Assemble source text into a Program (relocatable: an object).
+
+        relax: re-run the pass until call/tail/la sites use their shortest
+        form (see relax_step); self.relax_stats reports the result.
+        """
+        self.short_sites = {}
+        pinned = set()
+        numbered = list(enumerate(text.splitlines(), 1))
+        passes = 0
+        while True:
+            self._reset()
+            if relocatable:
+                self.data_origin = 0
+            self.feed(numbered, source_name)
+            passes += 1
+            if not relax or not self.relax_sites:
+                break
+            if not relax_step(self.relax_sites, self.labels, self.data_labels,
+                              self.short_sites, pinned, relocatable):
+                break
+        self.relax_stats = {"sites": len(self.relax_sites), "relaxed": len(self.short_sites),
+                            "passes": passes}
+        self.resolve(source_name, relocatable)
+        return self.program(source_name)
+
+
+def assemble_file(path: str, relocatable: bool = False, data_base: int = 0):
+    with open(path, "r", encoding="utf-8") as f:
+        text = f.read()
+    return Assembler(data_base).assemble(text, path, relocatable)
+
+
+# --- relocatable objects ---
+
+def object_dict(prog: Program):
+    return {
+        "version": OBJECT_VERSION,
+        "source": prog.source_name,
+        "text": prog.words,
+        "lines": prog.lines,
+        "data": prog.data.hex(),
+        "data_align": prog.data_align,
+        "text_align": prog.text_align,
+        "symbols": {name: {"offset": off, "global": name in prog.globals,
+                           "section": "data" if name in prog.data_labels else "text"}
+                    for name, off in prog.labels.items()},
+        "externs": sorted(prog.externs),
+        "relocs": [list(r) for r in prog.relocs],
+        "data_relocs": [list(r) for r in prog.data_relocs],
+    }
+
+
+def program_from_object(obj: dict):
+    if obj.get("version") not in (1, 2, OBJECT_VERSION):
+        raise ValueError(f"unsupported object version {obj.get('version')!r}")
+    syms = obj["symbols"]
+    return Program(list(obj["text"]), {n: s["offset"] for n, s in syms.items()},
+                   list(obj["lines"]), obj.get("source", "<obj>"),
+                   [n for n, s in syms.items() if s["global"]], obj["externs"],
+                   [tuple(r) for r in obj["relocs"]],
+                   bytes.fromhex(obj.get("data", "")), 0,
+                   [n for n, s in syms.items() if s.get("section") == "data"],
+                   [tuple(r) for r in obj.get("data_relocs", ())],
+                   obj.get("data_align", 4), obj.get("text_align", 4))
+
+
+def write_object(prog: Program, path: str):
+    import json
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(object_dict(prog), f, separators=(",", ":"))
+
+
+def read_object(path: str):
+    import json
+    with open(path, "r", encoding="utf-8") as f:
+        try:
+            return program_from_object(json.load(f))
+        except (KeyError, TypeError, ValueError) as e:
+            raise ValueError(f"{path}: not an rv32i_asm object ({e})") from None
+
+
+# --- writers (same formats as the repo assemblers) ---
+
+def write_txt(words, path):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("".join(f"{w:032b}\n" for w in words))
+
+
+def write_coe(words, path):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("memory_initialization_radix=16;\n")
+        f.write("memory_initialization_vector=\n")
+        f.write(",\n".join(f"{w:08x}" for w in words))
+        f.write(";")
+
+
+def data_words(data: bytes):
+    """Little-endian 32-bit words of a data image (zero-padded)."""
+    data = bytes(data) + bytes(-len(data) % 4)
+    return list(struct.unpack(f"<{len(data) // 4}I", data))
+
+
+def write_data_image(data: bytes, base: int, path: str):
+    """Write Data_Memory contents by extension.
+
+    .vh:  "mem[i] = 32'h...;" lines for the `include in Data_Mem.v
+    .mem: $readmemh words after an @<word index> line
+    .coe: the whole memory from word 0 (zeros below base)
+    """
+    words = data_words(data)
+    first = base >> 2
+    ext = os.path.splitext(path)[1].lower()
+    with open(path, "w", encoding="utf-8") as f:
+        if ext == ".vh":
+            f.write("".join(f"    mem[{first + i}] = 32'h{w:08x};\n" for i, w in enumerate(words)))
+        elif ext == ".mem":
+            f.write(f"@{first:x}\n")
+            f.write("".join(f"{w:08x}\n" for w in words))
+        elif ext == ".coe":
+            f.write("memory_initialization_radix=16;\n")
+            f.write("memory_initialization_vector=\n")
+            f.write(",\n".join(f"{w:08x}" for w in [0] * first + words))
+            f.write(";")
+        else:
+            raise ValueError(f"data image must be .vh, .mem or .coe, got '{path}'")
+
+
+def inst_mem_text(words, template: str):
+    """Splice words into an Inst_Mem.v template after INST_MEM_MARKER."""
+    if INST_MEM_MARKER not in template:
+        raise ValueError(f"Inst_Mem template has no '{INST_MEM_MARKER}' marker")
+    pre = template.split(INST_MEM_MARKER)[0]
+    body = "".join(f"    memory[{i}] = 32'h{w:08x};\n" for i, w in enumerate(words))
+    return (pre + INST_MEM_MARKER + "\n" + body
+            + "  end\n\n  always @(*) begin\n    instruction = memory[word_addr];\n  end\nendmodule\n")
+
+
+def write_inst_mem(words, path):
+    with open(path, "r", encoding="ascii") as f:
+        template = f.read()
+    with open(path, "w", encoding="ascii") as f:
+        f.write(inst_mem_text(words, template))
+
+
+def print_listing(prog: Program, text: str):
+    src = text.splitlines()
+    print(f"{'PC':<6} {'Line':<5} {'Code':<10} Source")
+    for i, w in enumerate(prog.words):
+        ln = prog.lines[i]
+        print(f"0x{4 * i:04x} {ln:<5} 0x{w:08x} {src[ln - 1].strip()}")
+
+
+# --- symbol / line map (asm_profile.py) ---
+
+def program_map(prog: Program):
+    """(code symbols, data symbols, lines) of an absolute Program for write_map.
+
+    Symbols are [(address, name)]; lines are [(pc, source, line)] per word.
+    """
+    code = [(a, n) for n, a in prog.labels.items() if n not in prog.data_labels]
+    data = [(a, n) for n, a in prog.labels.items() if n in prog.data_labels]
+    lines = [(4 * i, prog.source_name, ln) for i, ln in enumerate(prog.lines)]
+    # stable sort: labels at one address stay in source order
+    return sorted(code, key=lambda s: s[0]), sorted(data, key=lambda s: s[0]), lines
+
+
+def map_text(symbols, data_symbols, lines, sources=None):
+    """Symbol / line map text, read back by read_map (asm_profile.py).
+
+    Sections: "# symbols" and "# data symbols" hold "<addr> <name>",
+    "# lines" holds "<pc> <source>:<line>  <instruction text>" (the source
+    path may contain spaces). sources maps a source name to its text (the
+    text column is left out without it).
+    """
+    split = {name: text.splitlines() for name, text in (sources or {}).items()}
+    out = ["# symbols\n"]
+    out.extend(f"{a:08x} {n}\n" for a, n in symbols)
+    if data_symbols:
+        out.append("# data symbols\n")
+        out.extend(f"{a:08x} {n}\n" for a, n in data_symbols)
+    out.append("# lines\n")
+    for pc, source, ln in lines:
+        src = split.get(source, ())
+        code = split_line(src[ln - 1])[1] if 0 < ln <= len(src) else ""
+        out.append(f"{pc:08x} {source}:{ln}" + (f"  {code}\n" if code else "\n"))
+    return "".join(out)
+
+
+def write_map(path, symbols, data_symbols, lines, sources=None):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(map_text(symbols, data_symbols, lines, sources))
+
+
+def read_map(path):
+    """(symbols, data symbols, lines) of a write_map file.
+
+    symbols / data symbols are [(address, name)] in file order, lines
+    {pc: (source, line, text)}. Sections other than these three (the
+    linker's module layout and global symbols) are skipped.
+    """
+    symbols, data_symbols, lines = [], [], {}
+    section = None
+    with open(path, "r", encoding="utf-8") as f:
+        for n, raw in enumerate(f, 1):
+            raw = raw.rstrip("\n")
+            if raw.startswith("#"):
+                section = raw[1:].strip()
+                continue
+            if not raw.strip() or section not in ("symbols", "data symbols", "lines"):
+                continue
+            try:
+                if section == "lines":
+                    pc, source, ln, text = _MAP_LINE_RE.match(raw.rstrip()).groups()
+                    lines[int(pc, 16)] = (source, int(ln), text or "")
+                else:
+                    addr, name = raw.split()
+                    (symbols if section == "symbols" else data_symbols).append(
+                        (int(addr, 16), name))
+            except (AttributeError, ValueError):
+                raise ValueError(f"{path}:{n}: bad map line '{raw}'") from None
+    return symbols, data_symbols, lines
+
+
+# --- benchmark ---
+
+def synthetic_program(n_lines: int):
+    """An unrolled framebuffer blit plus a few loops, like generated game code."""
+    out = ["start:", "    lui s2, 0xA", "    lui s0, 0x1", "    addi t0, zero, 0"]
+    i = 0
+    while len(out) < n_lines:
+        out.append(f"blit_{i}:")
+        for k in range(32):
+            out.append(f"    lbu t1, {k}(s0)          # src byte")
+            out.append(f"    sb t1, {k}(s2)           # fb")
+        out.append("    addi s0, s0, 32")
+        out.append("    addi s2, s2, 32")
+        out.append("    addi t0, t0, 1")
+        out.append(f"    blt t0, zero, blit_{i}")
+        out.append(f"    beq t0, zero, blit_{i + 1}")
+        i += 1
+    out.append(f"blit_{i}:")
+    out.append("done:")
+    out.append("    jal x0, done")
+    return "\n".join(out) + "\n"
+
+
+def _load_legacy(rel_path, name):
+    import importlib.util
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", rel_path)
+    if not os.path.exists(path):
+        return None
+    spec = importlib.util.spec_from_file_location(name, path)
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    return mod
+
+
+def benchmark(n_lines: int):
+    text = synthetic_program(n_lines)
+    n = text.count("\n")
+    print(f"synthetic program: {n} lines")
+
+    t0 = time.perf_counter()
+    prog = Assembler().assemble(text)
+    dt = time.perf_counter() - t0
+    print(f"  rv32i_asm (single pass)          {dt:8.3f}s  {n / dt:>12,.0f} lines/s")
+
+    legacy = _load_legacy("single_cycle/insturction_to_machinecode.py", "legacy_rv32i")
+    if legacy is not None:
+        asm = legacy.RV32IAssembler()
+        lines = text.splitlines()
+        t0 = time.perf_counter()
+        # same work as assemble_file minus the printing / file output
+        labels, insts, pc = {}, [], 0
+        for line in lines:
+            clean = re.sub(r'//.*$|#.*$', '', line.strip())
+            if not clean:
+                continue
+            while True:
+                m = re.match(r'^\s*([A-Za-z_]\w*):', clean)
+                if not m:
+                    break
+                labels[m.group(1)] = pc
+                clean = clean[m.end():].strip()
+            if clean:
+                insts.append((clean, pc))
+                pc += 4
+        words = [asm.assemble_instr(c, labels=labels, curr_addr=p) for c, p in insts]
+        dt = time.perf_counter() - t0
+        same = "identical" if words == prog.words else "DIFFERENT"
+        print(f"  RV32IAssembler (two pass)        {dt:8.3f}s  {n / dt:>12,.0f} lines/s  ({same})")
+
+    simple = _load_legacy("lode_runner/tools/simple_rv32i_assembler.py", "legacy_simple")
+    if simple is not None:
+        t0 = time.perf_counter()
+        first_pass = getattr(simple, "first_pass", None) or simple.pass1
+        labels, insts = first_pass(simple.parse_lines(text))
+        words = simple.assemble(insts, labels)
+        dt = time.perf_counter() - t0
+        same = "identical" if words == prog.words else "DIFFERENT"
+        print(f"  simple_rv32i_assembler           {dt:8.3f}s  {n / dt:>12,.0f} lines/s  ({same})")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="single-pass RV32I assembler")
+    ap.add_argument("input", nargs="?", help="assembly source")
+    ap.add_argument("-o", "--output", help="binary .txt output (default: <input>.txt)")
+    ap.add_argument("--coe", help="COE output (default: next to the .txt)")
+    ap.add_argument("--inst-mem", help="rewrite this Inst_Mem.v in place (template marker kept)")
+    ap.add_argument("-c", "--compile-only", action="store_true",
+                    help="write a relocatable object (-o, default <input>.o) for rv32i_link.py")
+    ap.add_argument("--data-base", type=lambda v: int(v, 0), default=0,
+                    help="Data_Memory byte address of the first .data byte (default 0)")
+    ap.add_argument("--data", action="append", default=[], metavar="PATH",
+                    help="data image output, .vh/.mem/.coe by extension (repeatable; "
+                    "default <output>_data.vh when the source has .data)")
+    ap.add_argument("--no-relax", action="store_true",
+                    help="keep call/tail as auipc+jalr and la as lui+addi")
+    ap.add_argument("--schedule", action="store_true",
+                    help="reorder within basic blocks to remove load-use stalls (asm_schedule.py)")
+    ap.add_argument("--listing", action="store_true", help="print pc / line / word listing")
+    ap.add_argument("--map", help="write the symbol / source-line map (for asm_profile.py)")
+    ap.add_argument("--bench", type=int, metavar="LINES",
+                    help="benchmark on a synthetic program of LINES lines")
+    args = ap.parse_args()
+
+    if args.bench:
+        benchmark(args.bench)
+        return
+    if not args.input:
+        ap.error("input is required unless --bench is given")
+
+    try:
+        with open(args.input, "r", encoding="utf-8") as f:
+            text = f.read()
+        t0 = time.perf_counter()
+        asm = Assembler(args.data_base)
+        prog = asm.assemble(text, args.input, args.compile_only, not args.no_relax)
+        dt = time.perf_counter() - t0
+        if args.compile_only:
+            out = args.output or os.path.splitext(args.input)[0] + ".o"
+            write_object(prog, out)
+            print(f"wrote object {out}: {len(prog.words)} words, {len(prog.data)} data bytes, "
+                  f"{len(prog.globals)} globals, "
+                  f"{len(prog.relocs) + len(prog.data_relocs)} relocations")
+            return
+        sched = None
+        if args.schedule:
+            from asm_schedule import schedule_program
+            sched = schedule_program(prog)
+        data_outs = args.data
+        if prog.data and not data_outs:
+            stem = os.path.splitext(args.output or args.input)[0]
+            data_outs = [stem + "_data.vh"]
+        for path in data_outs:
+            write_data_image(prog.data, prog.data_base, path)
+        if args.map:
+            write_map(args.map, *program_map(prog), {args.input: text})
+    except (OSError, ValueError) as e:
+        print(f"ERROR: {e}")
+        sys.exit(1)
+
+    if args.listing:
+        print_listing(prog, text)
+    if args.inst_mem:
+        write_inst_mem(prog.words, args.inst_mem)
+        print(f"wrote {len(prog.words)} instructions -> {args.inst_mem}")
+    if args.output or not args.inst_mem:
+        out_txt = args.output or os.path.splitext(args.input)[0] + ".txt"
+        out_coe = args.coe or os.path.splitext(out_txt)[0] + ".coe"
+        write_txt(prog.words, out_txt)
+        write_coe(prog.words, out_coe)
+        print(f"wrote {len(prog.words)} instructions -> {out_txt}, {out_coe}")
+    if sched is not None:
+        print(f"scheduled: {sched['changed']} blocks reordered, {sched['hoisted']} branch "
+              f"slots filled, load-use stalls {sched['stalls_before']} -> {sched['stalls_after']}")
+    rs = asm.relax_stats
+    if rs["sites"]:
+        print(f"relaxed {rs['relaxed']} of {rs['sites']} call/tail/la sites "
+              f"({rs['relaxed']} words saved, {rs['passes']} passes)")
+    if data_outs:
+        print(f"wrote {len(prog.data)} data bytes @ {prog.data_base:#x} -> {', '.join(data_outs)}")
+    if args.map:
+        print(f"wrote map {args.map}: {len(prog.labels)} symbols, {len(prog.lines)} lines")
+    print(f"assembled {text.count(chr(10))} lines in {dt * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,1389 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Fast functional RV32I instruction-set simulator (ISS).
+
+Runs the machine code produced by the assemblers (RV32IAssembler.assemble_file
+in single_cycle/insturction_to_machinecode.py, simple_rv32i_assembler.py)
+without a Verilog simulation, so program results can be checked in seconds.
+
+Supported input images:
+  .txt        one 32-bit binary word per line (assemble_file TXT output)
+  .coe        memory_initialization_vector (radix 16)
+  .mem/.hex   one hex word per line ($readmemh style)
+  .v/.vh      "memory[i] = 32'h...;" lines (Inst_Mem.v)
+
+Memory model mirrors Data_Memory (lode_runner/CPU/Data_Mem.v):
+  - 32KB bytearray data memory (8192 words), little-endian
+  - LW/LH ignore the low address bits below their natural alignment,
+    exactly like the word-indexed RTL (alu_result[31:2] + byte_off)
+  - addresses >= the data memory size go to the MMIO hooks
+    (default: reads return 0, writes are dropped)
+
+Hot code is translated: once a basic block has been interpreted
+TRANSLATE_THRESHOLD times, it and the hot blocks reachable from it are
+generated as one Python function (compile()) that keeps the registers in
+locals and checks the instruction budget once per block; a loop inside the
+region runs as a Python for loop sized to the budget, with no per-block
+checks, when run() has no on_block callback. Anything it cannot
+run (ecall/ebreak/csr/fence.i, a pc outside the region, a store into the
+program in unified mode) returns to the interpreter. Nothing is translated
+before TRANSLATE_AFTER instructions have retired: compiling a region takes
+about a millisecond, more than a program that short runs in total.
+--no-translate runs the interpreter only; --bench runs both, checks that the final state
+matches and prints the speedup.
+
+snapshot() serializes the architectural state (registers, pc, instret,
+CSRs, data memory and the program) into a compact zlib-compressed blob;
+restore() loads it back in well under a millisecond. --snapshot/--restore
+save the state after a run and continue from it.
+
+Usage:
+  python3 tools/rv32i_iss.py Stress_test.coe --dump-mem 0x1200 64
+  python3 tools/rv32i_iss.py game.coe --max-steps 3000000 --bench
+  python3 tools/rv32i_iss.py game.coe --max-steps 1000000 --snapshot g.snap
+  python3 tools/rv32i_iss.py game.coe --restore g.snap --max-steps 1000000
+"""
+
+import argparse
+import os
+import re
+import struct
+import sys
+import time
+import zlib
+from array import array
+
+DMEM_SIZE = 32 * 1024        # Data_Memory: WORDS = 8192
+DONE_INSTR = 0x0000006F      # jal x0, 0 (end-of-program idiom)
+NOP_INSTR = 0x00000013       # addi x0, x0, 0
+
+REG_NAMES = [
+    "zero", "ra", "sp", "gp", "tp", "t0", "t1", "t2",
+    "s0", "s1", "a0", "a1", "a2", "a3", "a4", "a5",
+    "a6", "a7", "s2", "s3", "s4", "s5", "s6", "s7",
+    "s8", "s9", "s10", "s11", "t3", "t4", "t5", "t6",
+]
+
+_U16 = struct.Struct("<H")
+_U32 = struct.Struct("<I")
+
+# --- program image loading ---
+
+_VERILOG_WORD = re.compile(r"\[\s*(\d+)\s*\]\s*=\s*32'h([0-9a-fA-F_]+)")
+
+
+def load_words(path: str):
+    """Read a program/data image and return its 32-bit words as a list."""
+    ext = os.path.splitext(path)[1].lower()
+    with open(path, "r", encoding="utf-8") as f:
+        text = f.read()
+
+    if ext == ".txt":
+        return [int(line, 2) for line in text.split() if line]
+
+    if ext == ".coe":
+        # Some of the checked-in .coe files are a bare hex vector (no header)
+        body = text.split("memory_initialization_vector", 1)
+        vector = body[-1].lstrip(" \t\r\n=").split(";", 1)[0]
+        radix = 16
+        m = re.search(r"memory_initialization_radix\s*=\s*(\d+)", text)
+        if m:
+            radix = int(m.group(1))
+        return [int(tok, radix) for tok in re.split(r"[,\s]+", vector) if tok]
+
+    if ext in (".v", ".vh"):
+        words = {}
+        for m in _VERILOG_WORD.finditer(text):
+            words[int(m.group(1))] = int(m.group(2).replace("_", ""), 16)
+        if not words:
+            return []
+        out = [NOP_INSTR] * (max(words) + 1)
+        for i, w in words.items():
+            out[i] = w
+        return out
+
+    # .mem / .hex / anything else: one hex word per line, // comments allowed
+    out = []
+    for line in text.splitlines():
+        line = line.split("//", 1)[0].strip()
+        if line and not line.startswith("@"):
+            out.append(int(line, 16))
+    return out
+
+
+def load_data_image(path: str):
+    """Read a Data_Memory init image, returning {word_index: value}.
+
+    Accepts the "mem[i] = 32'h...;" .vh format used by
+    lode_runner_map_128x64_mem_init.vh, $readmemh files with @<word index>
+    lines (as written by rv32i_asm.py --data) and plain word lists.
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext in (".v", ".vh"):
+        with open(path, "r", encoding="utf-8") as f:
+            text = f.read()
+        return {int(m.group(1)): int(m.group(2).replace("_", ""), 16)
+                for m in _VERILOG_WORD.finditer(text)}
+    if ext in (".mem", ".hex"):
+        image = {}
+        idx = 0
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                for tok in line.split("//", 1)[0].split():
+                    if tok.startswith("@"):
+                        idx = int(tok[1:], 16)
+                    else:
+                        image[idx] = int(tok, 16)
+                        idx += 1
+        return image
+    return dict(enumerate(load_words(path)))
+
+
+# --- predecode ---
+
+# Operation ids. The hot loop dispatches on these small ints instead of
+# re-parsing opcode/funct3/funct7 on every executed instruction.
+(OP_ILLEGAL, OP_LUI, OP_AUIPC, OP_JAL, OP_JALR,
+ OP_BEQ, OP_BNE, OP_BLT, OP_BGE, OP_BLTU, OP_BGEU,
+ OP_LB, OP_LH, OP_LW, OP_LBU, OP_LHU,
+ OP_SB, OP_SH, OP_SW,
+ OP_ADDI, OP_SLTI, OP_SLTIU, OP_XORI, OP_ORI, OP_ANDI,
+ OP_SLLI, OP_SRLI, OP_SRAI,
+ OP_ADD, OP_SUB, OP_SLL, OP_SLT, OP_SLTU,
+ OP_XOR, OP_SRL, OP_SRA, OP_OR, OP_AND,
+ OP_FENCE, OP_FENCE_I, OP_ECALL, OP_EBREAK, OP_CSR) = range(43)
+
+OP_NAMES = [
+    "illegal", "lui", "auipc", "jal", "jalr",
+    "beq", "bne", "blt", "bge", "bltu", "bgeu",
+    "lb", "lh", "lw", "lbu", "lhu",
+    "sb", "sh", "sw",
+    "addi", "slti", "sltiu", "xori", "ori", "andi",
+    "slli", "srli", "srai",
+    "add", "sub", "sll", "slt", "sltu",
+    "xor", "srl", "sra", "or", "and",
+    "fence", "fence.i", "ecall", "ebreak", "csr",
+]
+
+_BRANCH_OPS = {0: OP_BEQ, 1: OP_BNE, 4: OP_BLT, 5: OP_BGE, 6: OP_BLTU, 7: OP_BGEU}
+_LOAD_OPS = {0: OP_LB, 1: OP_LH, 2: OP_LW, 4: OP_LBU, 5: OP_LHU}
+_STORE_OPS = {0: OP_SB, 1: OP_SH, 2: OP_SW}
+_ACCESS_SIZE = {OP_LB: 1, OP_LH: 2, OP_LW: 4, OP_LBU: 1, OP_LHU: 2,
+                OP_SB: 1, OP_SH: 2, OP_SW: 4}
+_ALUI_OPS = {0: OP_ADDI, 2: OP_SLTI, 3: OP_SLTIU, 4: OP_XORI, 6: OP_ORI, 7: OP_ANDI}
+_ALU_OPS = {
+    (0x00, 0): OP_ADD, (0x20, 0): OP_SUB, (0x00, 1): OP_SLL,
+    (0x00, 2): OP_SLT, (0x00, 3): OP_SLTU, (0x00, 4): OP_XOR,
+    (0x00, 5): OP_SRL, (0x20, 5): OP_SRA, (0x00, 6): OP_OR, (0x00, 7): OP_AND,
+}
+
+
+def _sext(value: int, bits: int):
+    sign = 1 << (bits - 1)
+    return (value & (sign - 1)) - (value & sign)
+
+
+def decode(word: int):
+    """Decode one instruction word into (op, rd, rs1, rs2, imm).
+
+    imm is already sign-extended (and shifted for B/J/U types), the same
+    value Imm_Gen.v feeds to the datapath.
+    """
+    opcode = word & 0x7F
+    rd = (word >> 7) & 0x1F
+    funct3 = (word >> 12) & 0x7
+    rs1 = (word >> 15) & 0x1F
+    rs2 = (word >> 20) & 0x1F
+    funct7 = word >> 25
+
+    if opcode == 0x13:
+        if funct3 == 1:
+            return (OP_SLLI, rd, rs1, 0, rs2) if funct7 == 0 else (OP_ILLEGAL, 0, 0, 0, word)
+        if funct3 == 5:
+            if funct7 == 0x00:
+                return (OP_SRLI, rd, rs1, 0, rs2)
+            if funct7 == 0x20:
+                return (OP_SRAI, rd, rs1, 0, rs2)
+            return (OP_ILLEGAL, 0, 0, 0, word)
+        return (_ALUI_OPS[funct3], rd, rs1, 0, _sext(word >> 20, 12))
+    if opcode == 0x33:
+        op = _ALU_OPS.get((funct7, funct3))
+        if op is None:
+            return (OP_ILLEGAL, 0, 0, 0, word)
+        return (op, rd, rs1, rs2, 0)
+    if opcode == 0x03:
+        op = _LOAD_OPS.get(funct3)
+        if op is None:
+            return (OP_ILLEGAL, 0, 0, 0, word)
+        return (op, rd, rs1, 0, _sext(word >> 20, 12))
+    if opcode == 0x23:
+        op = _STORE_OPS.get(funct3)
+        if op is None:
+            return (OP_ILLEGAL, 0, 0, 0, word)
+        imm = ((word >> 25) << 5) | ((word >> 7) & 0x1F)
+        return (op, 0, rs1, rs2, _sext(imm, 12))
+    if opcode == 0x63:
+        op = _BRANCH_OPS.get(funct3)
+        if op is None:
+            return (OP_ILLEGAL, 0, 0, 0, word)
+        imm = (((word >> 31) & 1) << 12) | (((word >> 7) & 1) << 11) | \
+              (((word >> 25) & 0x3F) << 5) | (((word >> 8) & 0xF) << 1)
+        return (op, 0, rs1, rs2, _sext(imm, 13))
+    if opcode == 0x37:
+        return (OP_LUI, rd, 0, 0, word & 0xFFFFF000)
+    if opcode == 0x17:
+        return (OP_AUIPC, rd, 0, 0, word & 0xFFFFF000)
+    if opcode == 0x6F:
+        imm = (((word >> 31) & 1) << 20) | (((word >> 12) & 0xFF) << 12) | \
+              (((word >> 20) & 1) << 11) | (((word >> 21) & 0x3FF) << 1)
+        return (OP_JAL, rd, 0, 0, _sext(imm, 21))
+    if opcode == 0x67 and funct3 == 0:
+        return (OP_JALR, rd, rs1, 0, _sext(word >> 20, 12))
+    if opcode == 0x0F:
+        return (OP_FENCE_I if funct3 == 1 else OP_FENCE, 0, 0, 0, 0)
+    if opcode == 0x73:
+        if funct3 == 0:
+            if word == 0x00000073:
+                return (OP_ECALL, 0, 0, 0, 0)
+            if word == 0x00100073:
+                return (OP_EBREAK, 0, 0, 0, 0)
+            return (OP_ILLEGAL, 0, 0, 0, word)
+        if funct3 == 4:
+            return (OP_ILLEGAL, 0, 0, 0, word)
+        # CSR: rs2 slot carries funct3, imm carries the CSR address
+        return (OP_CSR, rd, rs1, funct3, word >> 20)
+    return (OP_ILLEGAL, 0, 0, 0, word)
+
+
+def disassemble(word: int):
+    op, rd, rs1, rs2, imm = decode(word)
+    name = OP_NAMES[op]
+    r = REG_NAMES
+    if op == OP_ILLEGAL:
+        return f".word 0x{word:08x}"
+    if op in (OP_LUI, OP_AUIPC):
+        return f"{name} {r[rd]}, 0x{imm >> 12:x}"
+    if op == OP_JAL:
+        return f"{name} {r[rd]}, {imm}"
+    if op == OP_JALR or OP_LB <= op <= OP_LHU:
+        return f"{name} {r[rd]}, {imm}({r[rs1]})"
+    if OP_SB <= op <= OP_SW:
+        return f"{name} {r[rs2]}, {imm}({r[rs1]})"
+    if OP_BEQ <= op <= OP_BGEU:
+        return f"{name} {r[rs1]}, {r[rs2]}, {imm}"
+    if OP_ADDI <= op <= OP_SRAI:
+        return f"{name} {r[rd]}, {r[rs1]}, {imm}"
+    if OP_ADD <= op <= OP_AND:
+        return f"{name} {r[rd]}, {r[rs1]}, {r[rs2]}"
+    if op == OP_CSR:
+        name = ("", "csrrw", "csrrs", "csrrc", "", "csrrwi", "csrrsi", "csrrci")[rs2]
+        src = rs1 if rs2 & 4 else r[rs1]
+        return f"{name} {r[rd]}, 0x{imm:03x}, {src}"
+    return name
+
+
+# --- predecoded records and basic blocks ---
+
+MAX_BLOCK_LEN = 64
+TRANSLATE_THRESHOLD = 100    # interpreted executions before a block is translated
+MAX_REGION_BLOCKS = 32
+MAX_LOOP_BLOCKS = 8          # longest cycle a translated region runs as one Python loop
+TRANSLATE_AFTER = 10_000     # instructions retired before anything is translated
+
+# Terminator return codes (negative "next pc" values)
+_STOP_DONE = -1
+_STOP_ECALL = -2
+_STOP_EBREAK = -3
+_STOP_ILLEGAL = -4
+_TRAP_CSR = -5
+_TRAP_FENCE_I = -6
+
+_STOP_REASONS = {
+    _STOP_DONE: "done",
+    _STOP_ECALL: "ecall",
+    _STOP_EBREAK: "ebreak",
+    _STOP_ILLEGAL: "illegal_instruction",
+}
+
+# snapshot(): header, 32 registers, CSR pairs, zlib(dmem), zlib(imem)
+SNAPSHOT_MAGIC = b"RV32"
+SNAPSHOT_VERSION = 1
+_SNAP_HEADER = struct.Struct("<4sHBBIQIIII")
+_SNAP_FLAGS = ("unified", "halted", "last_branch_taken")
+_SNAP_STOPS = (None, "max_steps", "pc_out_of_range") + tuple(_STOP_REASONS.values())
+
+_CONTROL_OPS = frozenset((
+    OP_JAL, OP_JALR, OP_BEQ, OP_BNE, OP_BLT, OP_BGE, OP_BLTU, OP_BGEU,
+    OP_FENCE_I, OP_ECALL, OP_EBREAK, OP_CSR, OP_ILLEGAL,
+))
+
+_NEGATED_BRANCH = {
+    OP_BEQ: OP_BNE, OP_BNE: OP_BEQ, OP_BLT: OP_BGE,
+    OP_BGE: OP_BLT, OP_BLTU: OP_BGEU, OP_BGEU: OP_BLTU,
+}
+
+
+class Block:
+    """A predecoded basic block: straight-line records plus one terminator.
+
+    body is a tuple of (handler, rd, rs1, rs2, imm) records, one per PC.
+    term is the record of the control instruction that ends the block; its
+    handler returns the next PC (or a negative stop/trap code). fall_pc /
+    taken_pc are the statically known successors; fall_blk / taken_blk cache
+    the successor Block objects so hot loops chain block to block without a
+    cache lookup. hits counts interpreted executions; once a block is hot,
+    fn holds the translated region entered at it and region the (start,
+    end) ranges that region covers.
+    """
+
+    __slots__ = ("start", "end", "body", "term", "n",
+                 "fall_pc", "fall_blk", "taken_pc", "taken_blk",
+                 "hits", "fn", "region")
+
+    def __init__(self, start, end, body, term, n, fall_pc, taken_pc):
+        self.start = start
+        self.end = end
+        self.body = body
+        self.term = term
+        self.n = n
+        self.fall_pc = fall_pc
+        self.fall_blk = None
+        self.taken_pc = taken_pc
+        self.taken_blk = None
+        self.hits = 0
+        self.fn = None
+        self.region = ()
+
+
+def _emit_addr(base, imm):
+    # register locals always hold 0..2**32-1, so a zero offset needs no mask
+    if base == "0":
+        return f"a = {imm & 0xFFFFFFFF}"
+    if imm == 0:
+        return f"a = {base}"
+    return f"a = ({base} + {imm}) & 0xFFFFFFFF"
+
+
+def _emit_alu(op, d, a, b, imm, pc, direct=False):
+    """Python lines computing one ALU/load instruction into local d.
+
+    direct: read words/halfwords through the m32/m16 views of dmem
+    (little-endian host) instead of struct.
+    """
+    M = 0xFFFFFFFF
+    if op == OP_LUI:
+        return [f"{d} = {imm}"]
+    if op == OP_AUIPC:
+        return [f"{d} = {(pc + imm) & M}"]
+    if OP_LB <= op <= OP_LHU:
+        lines = [_emit_addr(a, imm)]
+        word = "m32[a >> 2]" if direct else "u32(dmem, a & ~3)[0]"
+        half = "m16[a >> 1]" if direct else "u16(dmem, a & ~1)[0]"
+        if op == OP_LW:
+            lines.append(f"{d} = {word} if a < dsize else load(a, 4)")
+        elif op == OP_LHU:
+            lines.append(f"{d} = {half} if a < dsize else load(a, 2)")
+        elif op == OP_LBU:
+            lines.append(f"{d} = dmem[a] if a < dsize else load(a, 1)")
+        else:
+            read, sign, size = (half, 0x8000, 2) if op == OP_LH else ("dmem[a]", 0x80, 1)
+            lines += [f"if a < dsize: v = {read}; {d} = (v - ((v & {sign}) << 1)) & 0xFFFFFFFF",
+                      f"else: {d} = load(a, {size}, True)"]
+        return lines
+    if op == OP_ADDI and (a == "0" or imm == 0):
+        return [f"{d} = {imm & M if a == '0' else a}"]
+    expr = {
+        OP_ADDI: f"({a} + {imm}) & 0xFFFFFFFF",
+        OP_SLTI: f"1 if ({a} ^ 0x80000000) < {(imm & M) ^ 0x80000000} else 0",
+        OP_SLTIU: f"1 if {a} < {imm & M} else 0",
+        OP_XORI: f"{a} ^ {imm & M}",
+        OP_ORI: f"{a} | {imm & M}",
+        OP_ANDI: f"{a} & {imm & M}",
+        OP_SLLI: f"({a} << {imm}) & 0xFFFFFFFF",
+        OP_SRLI: f"{a} >> {imm}",
+        OP_SRAI: f"((({a} ^ 0x80000000) - 0x80000000) >> {imm}) & 0xFFFFFFFF",
+        OP_ADD: f"({a} + {b}) & 0xFFFFFFFF",
+        OP_SUB: f"({a} - {b}) & 0xFFFFFFFF",
+        OP_SLL: f"({a} << ({b} & 31)) & 0xFFFFFFFF",
+        OP_SLT: f"1 if ({a} ^ 0x80000000) < ({b} ^ 0x80000000) else 0",
+        OP_SLTU: f"1 if {a} < {b} else 0",
+        OP_XOR: f"{a} ^ {b}",
+        OP_SRL: f"{a} >> ({b} & 31)",
+        OP_SRA: f"((({a} ^ 0x80000000) - 0x80000000) >> ({b} & 31)) & 0xFFFFFFFF",
+        OP_OR: f"{a} | {b}",
+        OP_AND: f"{a} & {b}",
+    }[op]
+    return [f"{d} = {expr}"]
+
+
+# --- simulator ---
+
+class RV32ISim:
+    """Functional RV32I core with a Harvard instruction/data memory split.
+
+    imem holds the program words (Inst_Mem), dmem is a bytearray mirroring
+    Data_Memory. mmio_load(addr, size) / mmio_store(addr, size, value) are
+    called for data addresses outside dmem; the value mmio_load returns is
+    written to rd unchanged by lb/lbu/lh/lhu too, like Data_Mem.v, which
+    returns the full device word whatever the access size. set_mem_trace(fn)
+    reports every load/store as fn(is_store, addr, size) before it is
+    performed.
+
+    Each instruction word is decoded once into a record holding its handler,
+    rd/rs1/rs2 and a sign-extended immediate (PC-relative values are folded
+    in, since records are cached per PC). Records are grouped into basic
+    blocks that chain to their successors. The cache is invalidated by
+    write_imem(), by fence.i, and, with unified=True (program image mapped
+    into dmem at address 0), by stores that hit the program.
+
+    A block interpreted translate_threshold times (0: never) is translated:
+    it and the hot blocks statically reachable from it become one generated
+    Python function (see translate_region) that keeps the registers in
+    locals. sim.regs is only written back when the function returns, so
+    mmio hooks must not read registers while it runs.
+    Translated code reads and writes dmem through memoryviews, so dmem may
+    be overwritten in place but never resized.
+    """
+
+    def __init__(self, program=None, dmem_size: int = DMEM_SIZE, entry: int = 0,
+                 unified: bool = False, translate_threshold: int = TRANSLATE_THRESHOLD):
+        self.regs = [0] * 32
+        self.pc = entry
+        self.dmem = bytearray(dmem_size)
+        self.dmem_size = dmem_size
+        self.unified = unified
+        self.imem = []
+        self.code_end = 0
+        self.csrs = {}
+        self.instret = 0
+        self.halted = False
+        self.stop_reason = None
+        self.last_branch_taken = False
+        self.mmio_load = lambda addr, size: 0
+        self.mmio_store = lambda addr, size, value: None
+        self.mem_trace = None
+        self.translate_threshold = translate_threshold
+        self.translated = 0
+        self._blocks = {}
+        self._build_handlers()
+        if program is not None:
+            self.load_program(program)
+
+    def load_program(self, words):
+        self.imem = [w & 0xFFFFFFFF for w in words]
+        self.code_end = 4 * len(self.imem)
+        if self.unified:
+            if self.code_end > self.dmem_size:
+                raise ValueError("program does not fit in data memory")
+            for i, w in enumerate(self.imem):
+                _U32.pack_into(self.dmem, 4 * i, w)
+        self.flush_code_cache()
+
+    def load_data(self, image):
+        """Preload dmem from {word_index: value} (see load_data_image)."""
+        for idx, value in image.items():
+            addr = idx * 4
+            if addr + 4 <= self.dmem_size:
+                _U32.pack_into(self.dmem, addr, value & 0xFFFFFFFF)
+
+    def reset(self, entry: int = 0):
+        self.regs[:] = [0] * 32
+        self.pc = entry
+        self.dmem[:] = bytes(self.dmem_size)
+        self.csrs.clear()
+        self.instret = 0
+        self.halted = False
+        self.stop_reason = None
+        self.last_branch_taken = False
+        if self.unified:
+            self.load_program(self.imem)
+
+    def snapshot(self):
+        """Serialize the architectural state to bytes (see restore)."""
+        flags = sum(1 << i for i, name in enumerate(_SNAP_FLAGS) if getattr(self, name))
+        csrs = sorted(self.csrs.items())
+        dmem = zlib.compress(bytes(self.dmem), 1)
+        imem = zlib.compress(array("I", self.imem).tobytes(), 1)
+        head = _SNAP_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, flags,
+                                 _SNAP_STOPS.index(self.stop_reason), self.pc, self.instret,
+                                 self.dmem_size, len(csrs), len(dmem), len(imem))
+        regs = struct.pack("<32I", *self.regs)
+        csr_words = struct.pack(f"<{2 * len(csrs)}I", *(v for kv in csrs for v in kv))
+        return b"".join((head, regs, csr_words, dmem, imem))
+
+    def restore(self, data):
+        """Load a snapshot() blob; returns the number of bytes it used.
+
+        The decoded and translated code is kept when the program is the
+        same, so a restored run is at full speed right away.
+        """
+        try:
+            (magic, version, flags, stop, pc, instret, dmem_size, n_csrs,
+             n_dmem, n_imem) = _SNAP_HEADER.unpack_from(data)
+        except struct.error:
+            raise ValueError("snapshot is truncated")
+        if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+            raise ValueError("not an RV32ISim snapshot (or a different version)")
+        if dmem_size != self.dmem_size or bool(flags & 1) != self.unified:
+            raise ValueError(f"snapshot is for a {dmem_size}-byte "
+                             f"{'unified' if flags & 1 else 'Harvard'} memory")
+        if stop >= len(_SNAP_STOPS):
+            raise ValueError(f"snapshot has an unknown stop reason ({stop})")
+        pos = _SNAP_HEADER.size
+        try:
+            regs = struct.unpack_from("<32I", data, pos)
+            pos += 128
+            csrs = struct.unpack_from(f"<{2 * n_csrs}I", data, pos)
+            pos += 8 * n_csrs
+            dmem = zlib.decompress(data[pos:pos + n_dmem])
+            pos += n_dmem
+            imem = array("I", zlib.decompress(data[pos:pos + n_imem])).tolist()
+            pos += n_imem
+        except (struct.error, zlib.error, ValueError):
+            raise ValueError("snapshot is truncated or corrupt") from None
+        if len(dmem) != dmem_size:
+            raise ValueError("snapshot data memory is corrupt")
+
+        self.regs[:] = regs
+        self.pc = pc
+        self.instret = instret
+        self.csrs = dict(zip(csrs[::2], csrs[1::2]))
+        self.halted = bool(flags & 2)
+        self.last_branch_taken = bool(flags & 4)
+        self.stop_reason = _SNAP_STOPS[stop]
+        self.dmem[:] = dmem
+        if imem != self.imem or self.unified:
+            self.imem = imem
+            self.code_end = 4 * len(imem)
+            self.flush_code_cache()
+        return pos
+
+    # --- decode cache ---
+
+    def fetch(self, pc: int):
+        """Return the instruction word at pc, or None outside the program."""
+        if pc & 3 or pc < 0 or pc >= self.code_end:
+            return None
+        if self.unified:
+            return _U32.unpack_from(self.dmem, pc)[0]
+        return self.imem[pc >> 2]
+
+    def write_imem(self, addr: int, word: int):
+        """Patch one program word and drop the decoded blocks covering it."""
+        idx = addr >> 2
+        if not 0 <= idx < len(self.imem):
+            raise ValueError(f"imem address 0x{addr:08x} out of range")
+        self.imem[idx] = word & 0xFFFFFFFF
+        if self.unified:
+            _U32.pack_into(self.dmem, idx * 4, word & 0xFFFFFFFF)
+        self.invalidate(addr)
+
+    def invalidate(self, addr: int):
+        addr &= ~3
+        for b in self._blocks.values():
+            if b.fn is not None and any(start <= addr < end for start, end in b.region):
+                b.fn = None
+                b.hits = 0
+        stale = [b for b in self._blocks.values() if b.start <= addr < b.end]
+        if not stale:
+            return
+        for b in stale:
+            del self._blocks[b.start]
+        # Successor links may point at a dropped block: unchain everything.
+        for b in self._blocks.values():
+            b.fall_blk = None
+            b.taken_blk = None
+        for b in stale:
+            b.fall_blk = None
+            b.taken_blk = None
+
+    def set_mem_trace(self, fn):
+        """Install (or with None, remove) the load/store trace callback."""
+        self.mem_trace = fn
+        self._build_handlers()
+        self.flush_code_cache()
+
+    def flush_code_cache(self):
+        for b in self._blocks.values():
+            b.fall_blk = None
+            b.taken_blk = None
+        self._blocks = {}
+
+    def record(self, pc: int, word: int):
+        """Decode word (located at pc) into a (handler, rd, rs1, rs2, imm) record."""
+        op, rd, rs1, rs2, imm = decode(word)
+        h = self._handlers
+        if op == OP_AUIPC:
+            return (h[OP_LUI] if rd else h[None], rd, 0, 0, (pc + imm) & 0xFFFFFFFF)
+        if op == OP_LUI:
+            return (h[OP_LUI] if rd else h[None], rd, 0, 0, imm)
+        if op == OP_JAL:
+            if word == DONE_INSTR:
+                return (self._t_done, 0, 0, 0, pc)
+            link = (pc + 4) & 0xFFFFFFFF
+            return (self._t_jal, rd, link, 0, (pc + imm) & 0xFFFFFFFF)
+        if op == OP_JALR:
+            return (self._t_jalr, rd, rs1, (pc + 4) & 0xFFFFFFFF, imm)
+        if OP_BEQ <= op <= OP_BGEU:
+            if imm == 4:
+                # Both outcomes lead to pc+4; keep the outcome for timing models
+                return (self._t_branch_next, op, rs1, rs2, (pc + 4) & 0xFFFFFFFF)
+            # rd slot carries the fall-through pc
+            return (h[op], (pc + 4) & 0xFFFFFFFF, rs1, rs2, (pc + imm) & 0xFFFFFFFF)
+        if op in _CONTROL_OPS:
+            return (self._t_stop, op, rd, rs1, rs2 if op != OP_CSR else (rs2, imm))
+        if rd == 0 and op not in (OP_SB, OP_SH, OP_SW, OP_FENCE):
+            if self.mem_trace is not None and OP_LB <= op <= OP_LHU:
+                return (h[op], 0, rs1, rs2, imm)     # still an access
+            return (h[None], 0, 0, 0, 0)
+        return (h[op], rd, rs1, rs2, imm)
+
+    def block_at(self, pc: int):
+        """The decoded Block starting at pc (None outside the program)."""
+        return self._block_at(pc)
+
+    def _block_at(self, pc: int):
+        blk = self._blocks.get(pc)
+        if blk is not None:
+            return blk
+        if self.fetch(pc) is None:
+            return None
+        body = []
+        p = pc
+        term = None
+        taken_pc = -1
+        while len(body) < MAX_BLOCK_LEN:
+            word = self.fetch(p)
+            if word is None:
+                break
+            op = decode(word)[0]
+            rec = self.record(p, word)
+            if op in _CONTROL_OPS:
+                term = rec
+                if op == OP_JAL or OP_BEQ <= op <= OP_BGEU:
+                    taken_pc = rec[4]
+                p += 4
+                break
+            body.append(rec)
+            p += 4
+        n = len(body)
+        if term is None:
+            # Length cap / end of program: a pseudo-terminator that just
+            # falls through (it is not an instruction, so it is not counted).
+            term = (self._t_fall, p, 0, 0, 0)
+        else:
+            n += 1
+        blk = Block(pc, p, tuple(body), term, n, p, taken_pc)
+        self._blocks[pc] = blk
+        return blk
+
+    # --- block translation ---
+
+    def _term_word(self, blk):
+        """Word of blk's control instruction; None for a length-capped block."""
+        return None if len(blk.body) == blk.n else self.fetch(blk.end - 4)
+
+    def _translatable(self, blk):
+        word = self._term_word(blk)
+        if word is None:
+            return True
+        op = decode(word)[0]
+        return word != DONE_INSTR and (op in (OP_JAL, OP_JALR) or OP_BEQ <= op <= OP_BGEU)
+
+    def _successors(self, blk):
+        """Statically known next PCs of blk (none for a jalr)."""
+        word = self._term_word(blk)
+        if word is None:
+            return (blk.end,)
+        op = decode(word)[0]
+        if op == OP_JAL:
+            return (blk.taken_pc,)
+        if op == OP_JALR:
+            return ()
+        return (blk.taken_pc, blk.fall_pc)
+
+    def _loop_path(self, head, region):
+        """Shortest chain of region blocks from head back to head, or None
+        when there is none within MAX_LOOP_BLOCKS blocks."""
+        paths = [[head]]
+        seen = {head.start}
+        for _ in range(MAX_LOOP_BLOCKS):
+            longer = []
+            for path in paths:
+                for pc in self._successors(path[-1]):
+                    if pc == head.start:
+                        return path
+                    nb = region.get(pc)
+                    if nb is not None and pc not in seen:
+                        seen.add(pc)
+                        longer.append(path + [nb])
+            paths = longer
+        return None
+
+    def translate_region(self, entry):
+        """Compile entry and the hot blocks reachable from it into entry.fn.
+
+        The region follows fall/taken successors that were already
+        interpreted (hits > 0), up to MAX_REGION_BLOCKS; blocks that stop or
+        trap (ecall, ebreak, csr, fence.i, illegal, done) stay interpreted.
+        entry.fn(limit, on_block) runs whole blocks while the pc stays in the
+        region and the next block fits in limit instructions, calling
+        on_block like run() does, and returns (pc, instructions retired,
+        whether on_block asked to stop).
+        Without on_block, a loop inside the region (a cycle of at most
+        MAX_LOOP_BLOCKS blocks back to a backward-branch target) runs as a
+        Python for loop over as many trips as fit in the budget, so its
+        blocks are neither dispatched on pc nor checked against limit.
+        With unified=True a store into the program ends the region right
+        after the store, so the interpreter re-decodes the patched code.
+        """
+        if not self._translatable(entry):
+            entry.hits = -1 << 30      # never again
+            return
+        blocks = [entry]
+        seen = {entry.start}
+        i = 0
+        while i < len(blocks) and len(blocks) < MAX_REGION_BLOCKS:
+            b = blocks[i]
+            i += 1
+            for pc in (b.taken_pc, b.fall_pc):
+                nb = self._blocks.get(pc)
+                if pc in seen or nb is None or not nb.hits or not self._translatable(nb):
+                    continue
+                seen.add(pc)
+                blocks.append(nb)
+                if len(blocks) == MAX_REGION_BLOCKS:
+                    break
+
+        region = {b.start: b for b in blocks}
+        heads = {pc for b in blocks for pc in self._successors(b) if pc in region and pc <= b.start}
+        names = set()
+        written = set()
+        fast = [self._emit_block(b, names, written) for b in blocks]
+        loops = {}
+        for pc in heads:
+            path = self._loop_path(region[pc], region)
+            if path:
+                loops[pc] = self._emit_loop(path, names, written)
+        load = [f"    x{r} = R[{r}]" for r in sorted(names)]
+        store = [f"R[{r}] = x{r}" for r in sorted(written)]
+        writeback = "; ".join(store) if store else "pass"
+
+        src = ["def region(limit, ob):"] + load + ["    n = 0", "    stop = False", f"    pc = {entry.start}",
+                                                   "    if ob is None:", "        while True:"]
+        for variant in ("fast", "ob"):
+            kw = "if"
+            for b, lines in zip(blocks, fast):
+                src.append(f"            {kw} pc == {b.start}:")
+                if variant == "fast" and b.start in loops:
+                    src.extend("                " + ln.replace("WRITEBACK", writeback) for ln in loops[b.start])
+                src.append(f"                if n + {b.n} > limit: break")
+                src.extend("                " + ln.replace("WRITEBACK", writeback) for ln in lines)
+                src.append(f"                n += {b.n}")
+                if variant == "ob":
+                    src.append(f"                if ob(b{b.start}, pc): stop = True; break")
+                kw = "elif"
+            src.append("            else: break")
+            if variant == "fast":
+                src += ["    else:", "        while True:"]
+        src += [f"    {ln}" for ln in store] + ["    return pc, n, stop"]
+
+        ns = {f"b{b.start}": b for b in blocks}
+        ns.update(R=self.regs, dmem=self.dmem, dsize=self.dmem_size, code_end=self.code_end,
+                  u32=_U32.unpack_from, p32=_U32.pack_into, u16=_U16.unpack_from,
+                  p16=_U16.pack_into, load=self.load, store=self.store,
+                  invalidate=self.invalidate, sim=self)
+        if self._direct():
+            ns.update(m32=memoryview(self.dmem).cast("I"), m16=memoryview(self.dmem).cast("H"))
+        exec(compile("\n".join(src) + "\n", f"<rv32i region 0x{entry.start:x}>", "exec"), ns)
+        entry.fn = ns["region"]
+        entry.region = tuple((b.start, b.end) for b in blocks)
+        self.translated += 1
+
+    def _direct(self):
+        """Whether translated code may index dmem as native 16/32-bit words."""
+        return sys.byteorder == "little" and self.dmem_size % 4 == 0
+
+    def _emit_loop(self, path, names, written):
+        """Python lines running whole trips around the cycle path; a branch
+        leaving the cycle sets pc and n and breaks out of the for loop."""
+        size = sum(b.n for b in path)
+        body = []
+        done = 0
+        for j, b in enumerate(path):
+            follow = path[(j + 1) % len(path)].start
+            body.extend(self._emit_block(b, names, written, follow, (size, done)))
+            done += b.n
+        return ([f"k = (limit - n) // {size}", "if k:", "    for i in range(k):"]
+                + ["        " + ln for ln in body or ["pass"]]
+                + ["    else:", f"        n += k * {size}", "    continue"])
+
+    def _emit_block(self, blk, names, written, follow=None, loop=None):
+        """Python lines for one block; they set pc to the block's successor.
+
+        Inside a loop (see _emit_loop) follow is the pc the cycle continues
+        at and loop is (instructions per trip, instructions of the trip
+        before this block); only a branch away from follow sets pc.
+        """
+        lines = []
+        direct = self._direct()
+
+        def r(i):
+            if i == 0:
+                return "0"
+            names.add(i)
+            return f"x{i}"
+
+        def w(i):
+            names.add(i)
+            written.add(i)
+            return f"x{i}"
+
+        def retired(k):
+            # instructions retired by the region after k of this block's
+            if loop is None:
+                return f"n + {k}"
+            return f"n + i * {loop[0]} + {loop[1] + k}"
+
+        for k in range(len(blk.body)):
+            pc = blk.start + 4 * k
+            op, rd, rs1, rs2, imm = decode(self.fetch(pc))
+            if OP_SB <= op <= OP_SW:
+                lines.append(_emit_addr(r(rs1), imm))
+                v = r(rs2)
+                if op == OP_SW:
+                    lines.append(f"if a < dsize: m32[a >> 2] = {v}" if direct else
+                                 f"if a < dsize: p32(dmem, a & ~3, {v})")
+                elif op == OP_SH:
+                    lines.append(f"if a < dsize: m16[a >> 1] = {v} & 0xFFFF" if direct else
+                                 f"if a < dsize: p16(dmem, a & ~1, {v} & 0xFFFF)")
+                else:
+                    lines.append(f"if a < dsize: dmem[a] = {v} & 0xFF")
+                lines.append(f"else: store(a, {_ACCESS_SIZE[op]}, {v})")
+                if self.unified:
+                    lines.append(f"if a < code_end: WRITEBACK; invalidate(a); return {pc + 4}, {retired(k + 1)}, False")
+                continue
+            if rd == 0 or op == OP_FENCE:
+                continue        # like the interpreter: no effect (x0 loads are not performed)
+            lines.extend(_emit_alu(op, w(rd), r(rs1), r(rs2), imm, pc, direct))
+
+        word = self._term_word(blk)
+        if word is None:
+            if follow is None:
+                lines.append(f"pc = {blk.end}")
+            return lines
+        pc = blk.end - 4
+        op, rd, rs1, rs2, imm = decode(word)
+        if op == OP_JAL:
+            if rd:
+                lines.append(f"{w(rd)} = {pc + 4}")
+            if follow is None:
+                lines.append(f"pc = {(pc + imm) & 0xFFFFFFFF}")
+        elif op == OP_JALR:
+            lines.append(f"pc = ({r(rs1)} + {imm}) & 0xFFFFFFFE")
+            if rd:
+                lines.append(f"{w(rd)} = {pc + 4}")
+        else:
+            a, b = r(rs1), r(rs2)
+            # signed compares flip the sign bit; x0 folds to a constant
+            sa = "2147483648" if a == "0" else f"({a} ^ 0x80000000)"
+            sb = "2147483648" if b == "0" else f"({b} ^ 0x80000000)"
+            cond = {
+                OP_BEQ: f"{a} == {b}", OP_BNE: f"{a} != {b}",
+                OP_BLT: f"{sa} < {sb}", OP_BGE: f"{sa} >= {sb}",
+                OP_BLTU: f"{a} < {b}", OP_BGEU: f"{a} >= {b}",
+            }
+            target = (pc + imm) & 0xFFFFFFFF
+            if imm == 4:
+                lines.append(f"sim.last_branch_taken = {cond[op]}")
+                if follow is None:
+                    lines.append(f"pc = {pc + 4}")
+            elif follow is None:
+                lines.append(f"pc = {target} if {cond[op]} else {pc + 4}")
+            elif follow == target:
+                lines.append(f"if {cond[_NEGATED_BRANCH[op]]}: pc = {pc + 4}; n = {retired(blk.n)}; break")
+            else:
+                lines.append(f"if {cond[op]}: pc = {target}; n = {retired(blk.n)}; break")
+        return lines
+
+    # --- handlers ---
+
+    def _build_handlers(self):
+        """Create the per-op handler table (closures over this core's state)."""
+        regs = self.regs
+        dmem = self.dmem
+        dsize = self.dmem_size
+        u32 = _U32.unpack_from
+        p32 = _U32.pack_into
+        u16 = _U16.unpack_from
+        p16 = _U16.pack_into
+        load = self.load
+        store = self.store
+        M = 0xFFFFFFFF
+        S = 0x80000000
+
+        def nop(rd, rs1, rs2, imm):
+            pass
+
+        def lui(rd, rs1, rs2, imm):
+            regs[rd] = imm
+
+        def addi(rd, rs1, rs2, imm):
+            regs[rd] = (regs[rs1] + imm) & M
+
+        def slti(rd, rs1, rs2, imm):
+            regs[rd] = 1 if (regs[rs1] ^ S) < ((imm & M) ^ S) else 0
+
+        def sltiu(rd, rs1, rs2, imm):
+            regs[rd] = 1 if regs[rs1] < (imm & M) else 0
+
+        def xori(rd, rs1, rs2, imm):
+            regs[rd] = (regs[rs1] ^ imm) & M
+
+        def ori(rd, rs1, rs2, imm):
+            regs[rd] = (regs[rs1] | imm) & M
+
+        def andi(rd, rs1, rs2, imm):
+            regs[rd] = regs[rs1] & imm & M
+
+        def slli(rd, rs1, rs2, imm):
+            regs[rd] = (regs[rs1] << imm) & M
+
+        def srli(rd, rs1, rs2, imm):
+            regs[rd] = regs[rs1] >> imm
+
+        def srai(rd, rs1, rs2, imm):
+            regs[rd] = (((regs[rs1] ^ S) - S) >> imm) & M
+
+        def add(rd, rs1, rs2, imm):
+            regs[rd] = (regs[rs1] + regs[rs2]) & M
+
+        def sub(rd, rs1, rs2, imm):
+            regs[rd] = (regs[rs1] - regs[rs2]) & M
+
+        def sll(rd, rs1, rs2, imm):
+            regs[rd] = (regs[rs1] << (regs[rs2] & 31)) & M
+
+        def slt(rd, rs1, rs2, imm):
+            regs[rd] = 1 if (regs[rs1] ^ S) < (regs[rs2] ^ S) else 0
+
+        def sltu(rd, rs1, rs2, imm):
+            regs[rd] = 1 if regs[rs1] < regs[rs2] else 0
+
+        def xor(rd, rs1, rs2, imm):
+            regs[rd] = regs[rs1] ^ regs[rs2]
+
+        def srl(rd, rs1, rs2, imm):
+            regs[rd] = regs[rs1] >> (regs[rs2] & 31)
+
+        def sra(rd, rs1, rs2, imm):
+            regs[rd] = (((regs[rs1] ^ S) - S) >> (regs[rs2] & 31)) & M
+
+        def or_(rd, rs1, rs2, imm):
+            regs[rd] = regs[rs1] | regs[rs2]
+
+        def and_(rd, rs1, rs2, imm):
+            regs[rd] = regs[rs1] & regs[rs2]
+
+        def lw(rd, rs1, rs2, imm):
+            a = (regs[rs1] + imm) & M
+            regs[rd] = u32(dmem, a & ~3)[0] if a < dsize else load(a, 4)
+
+        def lh(rd, rs1, rs2, imm):
+            a = (regs[rs1] + imm) & M
+            if a < dsize:
+                v = u16(dmem, a & ~1)[0]
+                regs[rd] = (v - ((v & 0x8000) << 1)) & M
+            else:
+                regs[rd] = load(a, 2, True)
+
+        def lhu(rd, rs1, rs2, imm):
+            a = (regs[rs1] + imm) & M
+            regs[rd] = u16(dmem, a & ~1)[0] if a < dsize else load(a, 2)
+
+        def lb(rd, rs1, rs2, imm):
+            a = (regs[rs1] + imm) & M
+            if a < dsize:
+                v = dmem[a]
+                regs[rd] = (v - ((v & 0x80) << 1)) & M
+            else:
+                regs[rd] = load(a, 1, True)
+
+        def lbu(rd, rs1, rs2, imm):
+            a = (regs[rs1] + imm) & M
+            regs[rd] = dmem[a] if a < dsize else load(a, 1)
+
+        def sw(rd, rs1, rs2, imm):
+            a = (regs[rs1] + imm) & M
+            if a < dsize:
+                p32(dmem, a & ~3, regs[rs2])
+            else:
+                store(a, 4, regs[rs2])
+
+        def sh(rd, rs1, rs2, imm):
+            a = (regs[rs1] + imm) & M
+            if a < dsize:
+                p16(dmem, a & ~1, regs[rs2] & 0xFFFF)
+            else:
+                store(a, 2, regs[rs2])
+
+        def sb(rd, rs1, rs2, imm):
+            a = (regs[rs1] + imm) & M
+            if a < dsize:
+                dmem[a] = regs[rs2] & 0xFF
+            else:
+                store(a, 1, regs[rs2])
+
+        invalidate = self.invalidate
+
+        def smc(handler):
+            # unified mode: stores into the program image drop stale blocks
+            def checked(rd, rs1, rs2, imm):
+                handler(rd, rs1, rs2, imm)
+                a = (regs[rs1] + imm) & M
+                if a < self.code_end:
+                    invalidate(a)
+            return checked
+
+        # Branch handlers: rd = fall-through pc, imm = absolute target
+        def beq(rd, rs1, rs2, imm):
+            return imm if regs[rs1] == regs[rs2] else rd
+
+        def bne(rd, rs1, rs2, imm):
+            return imm if regs[rs1] != regs[rs2] else rd
+
+        def blt(rd, rs1, rs2, imm):
+            return imm if (regs[rs1] ^ S) < (regs[rs2] ^ S) else rd
+
+        def bge(rd, rs1, rs2, imm):
+            return imm if (regs[rs1] ^ S) >= (regs[rs2] ^ S) else rd
+
+        def bltu(rd, rs1, rs2, imm):
+            return imm if regs[rs1] < regs[rs2] else rd
+
+        def bgeu(rd, rs1, rs2, imm):
+            return imm if regs[rs1] >= regs[rs2] else rd
+
+        def t_jal(rd, link, rs2, target):
+            if rd:
+                regs[rd] = link
+            return target
+
+        def t_jalr(rd, rs1, link, imm):
+            target = (regs[rs1] + imm) & 0xFFFFFFFE
+            if rd:
+                regs[rd] = link
+            return target
+
+        handlers = {}
+
+        def t_branch_next(op, rs1, rs2, next_pc):
+            self.last_branch_taken = handlers[op](0, rs1, rs2, 1) == 1
+            return next_pc
+
+        def t_done(rd, rs1, rs2, pc):
+            return _STOP_DONE
+
+        def t_fall(next_pc, rs1, rs2, imm):
+            return next_pc
+
+        def t_stop(op, rd, rs1, extra):
+            if op == OP_CSR:
+                return _TRAP_CSR
+            if op == OP_FENCE_I:
+                return _TRAP_FENCE_I
+            if op == OP_ECALL:
+                return _STOP_ECALL
+            if op == OP_EBREAK:
+                return _STOP_EBREAK
+            return _STOP_ILLEGAL
+
+        trace = self.mem_trace
+
+        def traced(handler, is_store, size):
+            # the access is reported before rd can overwrite the base register
+            def checked(rd, rs1, rs2, imm):
+                trace(is_store, (regs[rs1] + imm) & M, size)
+                if rd or is_store:
+                    handler(rd, rs1, rs2, imm)
+            return checked
+
+        loads = {OP_LW: lw, OP_LH: lh, OP_LHU: lhu, OP_LB: lb, OP_LBU: lbu}
+        stores = {OP_SW: sw, OP_SH: sh, OP_SB: sb}
+        if self.unified:
+            stores = {op: smc(fn) for op, fn in stores.items()}
+        if trace is not None:
+            loads = {op: traced(fn, False, _ACCESS_SIZE[op]) for op, fn in loads.items()}
+            stores = {op: traced(fn, True, _ACCESS_SIZE[op]) for op, fn in stores.items()}
+
+        handlers.update({
+            OP_BEQ: beq, OP_BNE: bne, OP_BLT: blt, OP_BGE: bge,
+            OP_BLTU: bltu, OP_BGEU: bgeu,
+        })
+        self._handlers = {
+            None: nop, OP_FENCE: nop,
+            OP_LUI: lui, OP_ADDI: addi, OP_SLTI: slti, OP_SLTIU: sltiu,
+            OP_XORI: xori, OP_ORI: ori, OP_ANDI: andi,
+            OP_SLLI: slli, OP_SRLI: srli, OP_SRAI: srai,
+            OP_ADD: add, OP_SUB: sub, OP_SLL: sll, OP_SLT: slt, OP_SLTU: sltu,
+            OP_XOR: xor, OP_SRL: srl, OP_SRA: sra, OP_OR: or_, OP_AND: and_,
+            OP_BEQ: beq, OP_BNE: bne, OP_BLT: blt, OP_BGE: bge,
+            OP_BLTU: bltu, OP_BGEU: bgeu,
+            **loads, **stores,
+        }
+        self._t_branch_next = t_branch_next
+        self._t_jal = t_jal
+        self._t_jalr = t_jalr
+        self._t_done = t_done
+        self._t_fall = t_fall
+        self._t_stop = t_stop
+
+    # --- data memory (used by the handlers and by external tools) ---
+
+    def load(self, addr: int, size: int, signed: bool = False):
+        if addr < self.dmem_size:
+            if size == 4:
+                return _U32.unpack_from(self.dmem, addr & ~3)[0]
+            if size == 2:
+                v = _U16.unpack_from(self.dmem, addr & ~1)[0]
+                return (v - ((v & 0x8000) << 1)) & 0xFFFFFFFF if signed else v
+            v = self.dmem[addr]
+            return (v - ((v & 0x80) << 1)) & 0xFFFFFFFF if signed else v
+        # Data_Mem.v ignores funct3 for MMIO: rd gets the device word as is
+        return self.mmio_load(addr, size) & 0xFFFFFFFF
+
+    def store(self, addr: int, size: int, value: int):
+        if addr < self.dmem_size:
+            if size == 4:
+                _U32.pack_into(self.dmem, addr & ~3, value & 0xFFFFFFFF)
+            elif size == 2:
+                _U16.pack_into(self.dmem, addr & ~1, value & 0xFFFF)
+            else:
+                self.dmem[addr] = value & 0xFF
+        else:
+            self.mmio_store(addr, size, value & ((1 << (8 * size)) - 1))
+
+    def read_word(self, addr: int):
+        return self.load(addr, 4)
+
+    def _csr(self, rd, rs1, funct3, csr):
+        if csr in (0xC00, 0xC01, 0xC02):       # cycle/time/instret
+            old = self.instret & 0xFFFFFFFF
+        elif csr in (0xC80, 0xC81, 0xC82):
+            old = self.instret >> 32
+        else:
+            old = self.csrs.get(csr, 0)
+        src = rs1 if funct3 & 4 else self.regs[rs1]
+        kind = funct3 & 3
+        if kind == 1:
+            new = src
+        elif kind == 2:
+            new = old | src
+        else:
+            new = old & ~src
+        if kind == 1 or rs1 != 0:
+            self.csrs[csr] = new & 0xFFFFFFFF
+        if rd:
+            self.regs[rd] = old
+
+    # --- execution ---
+
+    def step(self, n: int = 1):
+        return self.run(max_steps=n)
+
+    def run(self, max_steps: int = 10_000_000, halt_on_done: bool = True,
+            on_block=None):
+        """Execute until halt or max_steps; returns the number of instructions.
+
+        Stops on the `jal x0, 0` self-loop (halt_on_done), ecall/ebreak,
+        an illegal instruction or a PC outside the loaded program.
+        on_block(blk, npc), if given, is called after every completed block
+        with the next PC (negative stop code for the block that halted);
+        the timing models build their profiles from it. A true return value
+        ends the run after that block as if max_steps had been reached.
+        """
+        n = 0
+        reason = "max_steps"
+        pc = self.pc
+        block_at = self._block_at
+        blk = block_at(pc)
+        threshold = self.translate_threshold if self.mem_trace is None else 0
+
+        while True:
+            if blk is None:
+                reason = "pc_out_of_range"
+                break
+            if threshold:
+                fn = blk.fn
+                if fn is None:
+                    blk.hits += 1
+                    if blk.hits == threshold:
+                        if self.instret + n < TRANSLATE_AFTER:
+                            blk.hits = 0    # a short run would not pay back the compile
+                        else:
+                            self.translate_region(blk)
+                            fn = blk.fn
+                if fn is not None:
+                    npc, k, stop = fn(max_steps - n, on_block)
+                    if k:
+                        n += k
+                        pc = npc
+                        if stop:
+                            break
+                        blk = block_at(npc)
+                        continue
+            if n + blk.n > max_steps:
+                # Not enough budget left for the whole block: run part of
+                # its straight-line body and stop on an instruction boundary.
+                k = min(max_steps - n, len(blk.body))
+                for h, a, b, c, d in blk.body[:k]:
+                    h(a, b, c, d)
+                n += k
+                pc = blk.start + 4 * k
+                break
+
+            for h, a, b, c, d in blk.body:
+                h(a, b, c, d)
+            h, a, b, c, d = blk.term
+            npc = h(a, b, c, d)
+            n += blk.n
+
+            if npc < 0:
+                term_pc = blk.end - 4
+                if npc == _TRAP_CSR:
+                    self.instret += n
+                    self._csr(b, c, d[0], d[1])
+                    self.instret -= n
+                    npc = blk.end
+                elif npc == _TRAP_FENCE_I:
+                    self.flush_code_cache()
+                    npc = blk.end
+                elif npc == _STOP_DONE and not halt_on_done:
+                    npc = term_pc
+                else:
+                    reason = _STOP_REASONS[npc]
+                    if npc == _STOP_ILLEGAL:
+                        n -= 1          # the illegal word did not retire
+                    if on_block is not None:
+                        on_block(blk, npc)
+                    pc = term_pc
+                    break
+            if on_block is not None and on_block(blk, npc):
+                pc = npc
+                break
+
+            # Chain to the successor without going through the block cache
+            if npc == blk.fall_pc:
+                nxt = blk.fall_blk
+                if nxt is None:
+                    nxt = blk.fall_blk = block_at(npc)
+            elif npc == blk.taken_pc:
+                nxt = blk.taken_blk
+                if nxt is None:
+                    nxt = blk.taken_blk = block_at(npc)
+            else:
+                nxt = block_at(npc)
+            blk = nxt
+            pc = npc
+
+        self.pc = pc
+        self.instret += n
+        self.stop_reason = reason
+        self.halted = reason != "max_steps"
+        return n
+
+    # --- inspection ---
+
+    def dump_regs(self):
+        lines = []
+        for i in range(0, 32, 4):
+            lines.append("  ".join(
+                f"{REG_NAMES[j]:>4}=0x{self.regs[j]:08x}" for j in range(i, i + 4)))
+        return "\n".join(lines)
+
+
+def bench(words, data_image, max_steps: int, repeat: int = 3):
+    results = []
+    for threshold in (0, TRANSLATE_THRESHOLD):
+        best = None
+        for _ in range(repeat):
+            sim = RV32ISim(words, translate_threshold=threshold)
+            if data_image:
+                sim.load_data(data_image)
+            t0 = time.perf_counter()
+            n = sim.run(max_steps=max_steps)
+            dt = time.perf_counter() - t0
+            best = dt if best is None else min(best, dt)
+        results.append((n, best, sim))
+    (n, t_int, a), (_, t_tr, b) = results
+    state = lambda s: (s.regs, bytes(s.dmem), s.pc, s.instret, s.stop_reason)
+    if state(a) != state(b):
+        print("ERROR: translated run differs from the interpreter")
+        sys.exit(1)
+    print(f"stop={a.stop_reason} instret={n}: interpreter {t_int:.3f}s ({n / t_int / 1e6:.2f} MIPS), "
+          f"translated {t_tr:.3f}s ({n / t_tr / 1e6:.2f} MIPS, {b.translated} regions) "
+          f"-> {t_int / t_tr:.1f}x, identical state")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Fast functional RV32I simulator")
+    ap.add_argument("program", help="program image (.txt/.coe/.mem/.hex/Inst_Mem.v)")
+    ap.add_argument("--data", help="Data_Memory init image (.vh/.mem/.coe)")
+    ap.add_argument("--max-steps", type=int, default=10_000_000)
+    ap.add_argument("--dump-regs", action="store_true", help="print registers at exit")
+    ap.add_argument("--dump-mem", nargs=2, metavar=("ADDR", "WORDS"),
+                    help="print WORDS data words starting at ADDR (e.g. 0x1200 64)")
+    ap.add_argument("--no-translate", action="store_true", help="interpret only (no block translation)")
+    ap.add_argument("--bench", action="store_true",
+                    help="time interpreter vs translation (best of 3) and check they agree")
+    ap.add_argument("--restore", metavar="FILE", help="continue from a --snapshot file")
+    ap.add_argument("--snapshot", metavar="FILE", help="save the state at exit")
+    args = ap.parse_args()
+
+    try:
+        words = load_words(args.program)
+    except (OSError, ValueError) as e:
+        print(f"ERROR: {e}")
+        sys.exit(1)
+
+    data_image = load_data_image(args.data) if args.data else None
+    if args.bench:
+        bench(words, data_image, args.max_steps)
+        return
+
+    sim = RV32ISim(words, translate_threshold=0 if args.no_translate else TRANSLATE_THRESHOLD)
+    if data_image:
+        sim.load_data(data_image)
+    try:
+        if args.restore:
+            with open(args.restore, "rb") as f:
+                sim.restore(f.read())
+    except (OSError, ValueError, zlib.error) as e:
+        print(f"ERROR: {args.restore}: {e}")
+        sys.exit(1)
+
+    t0 = time.perf_counter()
+    n = sim.run(max_steps=args.max_steps)
+    dt = time.perf_counter() - t0
+    if args.snapshot:
+        with open(args.snapshot, "wb") as f:
+            f.write(sim.snapshot())
+
+    mips = n / dt / 1e6 if dt > 0 else 0.0
+    print(f"stop={sim.stop_reason} pc=0x{sim.pc:08x} instret={n} "
+          f"time={dt:.3f}s ({mips:.2f} MIPS)")
+    if sim.stop_reason == "illegal_instruction":
+        print(f"ERROR: illegal instruction 0x{sim.imem[sim.pc >> 2]:08x} at pc 0x{sim.pc:08x}")
+    if args.dump_regs:
+        print(sim.dump_regs())
+    if args.dump_mem:
+        base = int(args.dump_mem[0], 0)
+        for i in range(int(args.dump_mem[1], 0)):
+            addr = base + 4 * i
+            v = sim.read_word(addr)
+            print(f"[0x{addr:08x}] = 0x{v:08x} ({v - ((v & 0x80000000) << 1)})")
+
+
+if __name__ == "__main__":
+    main()
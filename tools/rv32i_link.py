@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Linker for rv32i_asm relocatable objects.
+
+Inputs are objects written by `rv32i_asm.py -c` or .asm sources. A source is
+assembled into an object that is cached under .asmcache/ next to it, keyed by
+its content hash, so shared modules (input polling, framebuffer and map
+helpers) are assembled once and reused by every game that links them.
+
+Layout: the text of each input is placed in command-line order from
+--text-base (default 0, where the CPU starts fetching), each module aligned
+to the largest .align its .text uses (at least 4; the gap is filled with
+nops). The .data of each input follows the same order from --data-base in
+Data_Memory, aligned to the largest .align the module uses (at least 4).
+Global symbols must be unique; every .extern must be defined as a .globl by
+some input. Relocations:
+  B       branch to an external label (13-bit pc-relative)
+  J       jal to an external label (21-bit pc-relative)
+  HI20    lui rd, %hi(sym)
+  LO12_I  addi/load/jalr ..., %lo(sym)
+  LO12_S  store ..., %lo(sym)(rs1)
+  ABS32   .word sym (in .text or .data)
+  PCREL_HI20 / PCREL_LO12_I
+          auipc+jalr of a call/tail to an external label (relaxation to
+          jal only happens for local labels, whose distance is known)
+
+--map writes the module layout and global symbols followed by the
+rv32i_asm.py symbol / line map of every module, so asm_profile.py can
+profile a linked image by label and source line.
+
+Usage:
+  python3 tools/rv32i_link.py snake_main.asm lib/input.asm lib/fb.o -o snake.txt
+  python3 tools/rv32i_link.py game.asm lib/*.asm --inst-mem CPU/Inst_Mem.v --map game.map
+  python3 tools/rv32i_link.py game.asm maps.asm --data-base 0x1000 --data CPU/map_init.vh
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+
+from rv32i_asm import (NOP_WORD, OBJECT_VERSION, Assembler, _patch, _patch_data, map_text,
+                       object_dict, program_from_object, read_object, write_coe,
+                       write_data_image, write_inst_mem, write_txt)
+
+
+class LinkError(ValueError):
+    pass
+
+
+def load_module(path: str, use_cache: bool = True):
+    """Object for path: read a .o, or assemble a source (with object cache)."""
+    if not path.endswith(".asm") and not path.endswith(".s"):
+        return read_object(path)
+    with open(path, "r", encoding="utf-8") as f:
+        text = f.read()
+    key = hashlib.sha1(text.encode("utf-8")).hexdigest()
+    d, name = os.path.split(os.path.abspath(path))
+    cache_path = os.path.join(d, ".asmcache", name + ".o.json")
+    if use_cache and os.path.exists(cache_path):
+        try:
+            with open(cache_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            # objects cached before text_align existed lose their .align
+            if data.get("hash") == key and data["object"].get("version") == OBJECT_VERSION:
+                prog = program_from_object(data["object"])
+                prog.source_name = path
+                prog.cached = True
+                return prog
+        except (OSError, KeyError, ValueError):
+            pass
+    prog = Assembler().assemble(text, path, relocatable=True)
+    prog.cached = False
+    if use_cache:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        with open(cache_path, "w", encoding="utf-8") as f:
+            json.dump({"hash": key, "object": object_dict(prog)}, f, separators=(",", ":"))
+    return prog
+
+
+class Image:
+    """Linked program: words from text_base, data from data_base, symbols, layout."""
+
+    def __init__(self, words, symbols, layout, text_base, data=b"", data_base=0,
+                 data_layout=(), labels=(), data_labels=(), lines=()):
+        self.words = words
+        self.symbols = symbols          # name -> absolute address
+        self.layout = layout            # [(module name, base, size in bytes)]
+        self.text_base = text_base
+        self.data = data
+        self.data_base = data_base
+        self.data_layout = list(data_layout)
+        self.labels = list(labels)              # [(address, name)], locals included
+        self.data_labels = list(data_labels)
+        self.lines = list(lines)                # [(pc, module name, source line)]
+
+
+def link(modules, text_base: int = 0, data_base: int = 0):
+    """Lay out modules (rv32i_asm Programs) and apply their relocations."""
+    if text_base & 3:
+        raise LinkError(f"text base must be word aligned, got {text_base:#x}")
+    if data_base & 3:
+        raise LinkError(f"data base must be word aligned, got {data_base:#x}")
+    bases = []
+    addr = text_base
+    for m in modules:
+        addr += -addr % m.text_align
+        bases.append(addr)
+        addr += 4 * len(m.words)
+    data_bases = []
+    addr = data_base
+    for m in modules:
+        addr += -addr % m.data_align
+        data_bases.append(addr)
+        addr += len(m.data)
+
+    def address(m, base, dbase, name):
+        return (dbase if name in m.data_labels else base) + m.labels[name]
+
+    symbols = {}
+    owner = {}
+    for m, base, dbase in zip(modules, bases, data_bases):
+        for name in m.globals:
+            if name in symbols:
+                raise LinkError(f"duplicate global symbol '{name}' "
+                                f"({owner[name]} and {m.source_name})")
+            symbols[name] = address(m, base, dbase, name)
+            owner[name] = m.source_name
+
+    missing = {}
+    for m in modules:
+        for name in m.externs:
+            if name not in symbols and name not in m.labels:
+                missing.setdefault(name, []).append(m.source_name)
+    if missing:
+        raise LinkError("undefined symbols: " + ", ".join(
+            f"'{n}' (used by {', '.join(users)})" for n, users in sorted(missing.items())))
+
+    words = []
+    data = bytearray()
+    for m, base, dbase in zip(modules, bases, data_bases):
+        text = list(m.words)
+        for offset, kind, sym, addend in m.relocs:
+            if sym in m.labels:
+                value = address(m, base, dbase, sym)    # local first, like the assembler
+            else:
+                value = symbols[sym]
+            idx = offset >> 2
+            try:
+                text[idx] = _patch(kind, text[idx], value + addend, base + offset)
+            except ValueError as e:
+                line = m.lines[idx] if idx < len(m.lines) else "?"
+                raise LinkError(f"{m.source_name}:{line}: relocation {kind} against "
+                                f"'{sym}' failed: {e}") from None
+        words.extend([NOP_WORD] * ((base - text_base) // 4 - len(words)))
+        words.extend(text)
+        if not m.data:
+            continue
+        chunk = bytearray(m.data)
+        for offset, kind, sym, addend in m.data_relocs:
+            value = address(m, base, dbase, sym) if sym in m.labels else symbols[sym]
+            try:
+                _patch_data(chunk, offset, kind, value + addend)
+            except ValueError as e:
+                raise LinkError(f"{m.source_name}: .data+{offset:#x}: {e}") from None
+        data += bytes(dbase - data_base - len(data))
+        data += chunk
+
+    layout = [(m.source_name, base, 4 * len(m.words)) for m, base in zip(modules, bases)]
+    data_layout = [(m.source_name, dbase, len(m.data))
+                   for m, dbase in zip(modules, data_bases) if m.data]
+    labels, data_labels, lines = [], [], []
+    for m, base, dbase in zip(modules, bases, data_bases):
+        for name in m.labels:
+            (data_labels if name in m.data_labels else labels).append(
+                (address(m, base, dbase, name), name))
+        lines.extend((base + 4 * i, m.source_name, ln) for i, ln in enumerate(m.lines))
+    return Image(words, symbols, layout, text_base, bytes(data), data_base, data_layout,
+                 sorted(labels, key=lambda s: s[0]), sorted(data_labels, key=lambda s: s[0]),
+                 lines)
+
+
+def write_map(img: Image, path: str):
+    """Module layout and global symbols, then the rv32i_asm symbol / line map
+    of every label and word (with source text where the module source is
+    readable), so asm_profile.py can take the map of a linked image."""
+    sources = {}
+    for name, _, _ in img.layout:
+        try:
+            with open(name, "r", encoding="utf-8") as f:
+                sources[name] = f.read()
+        except OSError:
+            pass
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("# module layout\n")
+        for name, base, size in img.layout:
+            f.write(f"{base:08x} {size:6d} {name}\n")
+        if img.data_layout:
+            f.write("# data layout\n")
+            for name, base, size in img.data_layout:
+                f.write(f"{base:08x} {size:6d} {name}\n")
+        f.write("# global symbols\n")
+        for name, addr in sorted(img.symbols.items(), key=lambda kv: kv[1]):
+            f.write(f"{addr:08x} {name}\n")
+        f.write(map_text(img.labels, img.data_labels, img.lines, sources))
+
+
+def main():
+    ap = argparse.ArgumentParser(description="link rv32i_asm objects / sources")
+    ap.add_argument("inputs", nargs="+", help=".o objects or .asm sources; the first is placed at the text base")
+    ap.add_argument("-o", "--output", help="binary .txt output (a .coe is written next to it)")
+    ap.add_argument("--inst-mem", help="rewrite this Inst_Mem.v in place")
+    ap.add_argument("--map", help="write module layout, symbol addresses and source lines")
+    ap.add_argument("--text-base", type=lambda s: int(s, 0), default=0)
+    ap.add_argument("--data-base", type=lambda s: int(s, 0), default=0,
+                    help="Data_Memory byte address of the first module's .data")
+    ap.add_argument("--data", action="append", default=[], metavar="PATH",
+                    help="data image output, .vh/.mem/.coe by extension (repeatable; "
+                    "default <output>_data.vh when any input has .data)")
+    ap.add_argument("--no-cache", action="store_true", help="always reassemble .asm inputs")
+    args = ap.parse_args()
+
+    try:
+        modules = [load_module(p, not args.no_cache) for p in args.inputs]
+        img = link(modules, args.text_base, args.data_base)
+        if args.inst_mem:
+            write_inst_mem(img.words, args.inst_mem)
+        out = args.output
+        if out is None and not args.inst_mem:
+            out = os.path.splitext(args.inputs[0])[0] + ".txt"
+        if out:
+            write_txt(img.words, out)
+            write_coe(img.words, os.path.splitext(out)[0] + ".coe")
+        data_outs = args.data
+        if img.data and not data_outs:
+            data_outs = [os.path.splitext(out or args.inputs[0])[0] + "_data.vh"]
+        for path in data_outs:
+            write_data_image(img.data, img.data_base, path)
+        if args.map:
+            write_map(img, args.map)
+    except (OSError, ValueError) as e:
+        print(f"ERROR: {e}")
+        sys.exit(1)
+
+    for (_, base, size), m, path in zip(img.layout, modules, args.inputs):
+        if not hasattr(m, "cached"):
+            how = "object"
+        else:
+            how = "cached" if m.cached else "assembled"
+        print(f"  {base:#07x} {size:6d} B  {path} ({how})")
+    dests = ", ".join(p for p in (out, args.inst_mem, *data_outs, args.map) if p)
+    print(f"linked {len(img.words)} words, {len(img.data)} data bytes, "
+          f"{len(img.symbols)} globals -> {dests}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,731 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Static pipeline-hazard and CPI analyzer for assembly sources.
+
+Assembles an .asm file, builds its control-flow graph and charges the
+pipeline_model rules to every instruction without running anything:
+  - load-use stall (hazard_unit.v raw rs1/rs2 compare), also across a
+    fall-through edge
+  - branch: ID.v predicts backward branches taken; a correctly predicted
+    taken branch costs taken_penalty, a wrong prediction mispredict_penalty
+  - jal: taken_penalty; jalr: taken_penalty plus the EX flush (the RTL
+    predicts pc+imm, which a return or a table jump never matches)
+  - jal x0, 0 (the end-of-program idiom) halts, as on the ISS
+
+Branch probabilities come from, in order:
+  1. counted loops: the exit test of a loop whose induction register is
+     stepped by one addi and compared against x0 or a constant, with a
+     constant start value, gets its exact trip count
+  2. counter throttles: bne/beq on (andi t, r, 2**k - 1) against x0 is taken
+     (2**k - 1)/2**k resp. 1/2**k of the time (main_loop's "update every 32
+     loops" in LodeRunner_CPU.asm)
+  3. loop heuristics: a back edge of an unknown loop 0.875 (~8 iterations),
+     a loop exit 0.125
+  4. anything else 0.5
+Block frequencies follow Wu & Larus: loops are solved inner first for their
+cyclic probability, and each loop header is scaled by its iteration count. A
+loop with no exit (a game's main loop) is reported per iteration, and
+program totals are per iteration of it. Calls (jal/jalr with rd != 0) cost
+the callee's expected cycles per invocation, and the loop table's instr/it
+counts the callee's expected instructions too, so its CPI covers both.
+
+The hot-loop report ranks loops by the cycles they contribute; --annotate
+prints every instruction with its block frequency and hazard notes.
+
+Usage:
+  python3 tools/static_cpi.py lode_runner/LodeRunner_CPU.asm
+  python3 tools/static_cpi.py Stress_test.asm --annotate
+  python3 tools/static_cpi.py game.asm --load-latency 1 --top 5
+"""
+
+import argparse
+import sys
+
+from asm_schedule import BARRIER, CTRL, block_starts, classify, control_target
+from pipeline_model import is_load, load_use
+from rv32i_asm import Assembler
+from rv32i_iss import DONE_INSTR
+
+PROB_LOOP_BACK = 0.875
+PROB_LOOP_EXIT = 0.125
+PROB_UNKNOWN = 0.5
+MAX_TRIPS = 1 << 20          # counted-loop simulation cap
+MAX_FACTOR = 1e6             # cap for 1 / (1 - cyclic probability)
+
+_ALU_EVAL = {
+    (0x13, 0): lambda a, b: a + b, (0x13, 4): lambda a, b: a ^ b,
+    (0x13, 6): lambda a, b: a | b, (0x13, 7): lambda a, b: a & b,
+    (0x13, 1): lambda a, b: a << (b & 31),
+    (0x33, 0): lambda a, b: a + b, (0x33, 4): lambda a, b: a ^ b,
+    (0x33, 6): lambda a, b: a | b, (0x33, 7): lambda a, b: a & b,
+    (0x33, 1): lambda a, b: a << (b & 31),
+}
+
+# branch funct3 -> compare on (a, b) as unsigned 32-bit values
+_BRANCH_COND = {
+    0: lambda a, b: a == b,
+    1: lambda a, b: a != b,
+    4: lambda a, b: _signed(a) < _signed(b),
+    5: lambda a, b: _signed(a) >= _signed(b),
+    6: lambda a, b: a < b,
+    7: lambda a, b: a >= b,
+}
+
+
+def _signed(v):
+    return ((v & 0xFFFFFFFF) ^ 0x80000000) - 0x80000000
+
+
+def _imm_i(word):
+    return _signed(word >> 20 << 20) >> 20 if word >> 31 else word >> 20
+
+
+class BasicBlock:
+    __slots__ = ("start", "end", "succs", "preds", "kind", "callee", "probs",
+                 "why", "cost", "stalls", "ctrl", "loads", "freq")
+
+    def __init__(self, start, end):
+        self.start = start
+        self.end = end
+        self.succs = []         # successor block starts (taken first for branches)
+        self.preds = []
+        self.kind = "fall"      # fall / branch / jump / call / icall / ret / halt
+        self.callee = None
+        self.probs = []         # probability of each successor
+        self.why = ""           # how the branch probability was chosen
+        self.cost = 0.0         # expected cycles per execution (incl. callees)
+        self.stalls = 0.0
+        self.ctrl = 0.0
+        self.loads = 0
+        self.freq = 0.0         # global frequency (per program run / main-loop iteration)
+
+
+class Loop:
+    __slots__ = ("header", "body", "latches", "exits", "parent", "depth", "trips",
+                 "how", "cyclic", "factor", "local", "function")
+
+    def __init__(self, header, body, latches):
+        self.header = header
+        self.body = body
+        self.latches = latches
+        self.exits = []             # (from block, to block)
+        self.parent = None
+        self.depth = 1
+        self.trips = None           # branch executions per entry, if counted
+        self.how = "heuristic"
+        self.cyclic = 0.0
+        self.factor = 1.0
+        self.local = {}             # block -> frequency per iteration
+        self.function = None
+
+    @property
+    def infinite(self):
+        return not self.exits
+
+
+class StaticAnalysis:
+    """CFG, loops, branch probabilities and expected cycles of a Program."""
+
+    def __init__(self, prog, taken_penalty: int = 1, mispredict_penalty: int = 2,
+                 load_latency: int = 0):
+        self.prog = prog
+        self.words = prog.words
+        self.taken_penalty = taken_penalty
+        self.mispredict_penalty = mispredict_penalty
+        self.load_latency = load_latency
+        self.blocks = {}
+        self.loops = []
+        self.functions = {}         # entry -> [block starts]
+        self.func_cost = {}
+        self.func_instrs = {}       # entry -> expected instructions per call
+        self._build_cfg()
+        for entry in list(self.functions):
+            self._find_loops(entry)
+        self._nest_loops()
+        self._trip_counts()
+        self._branch_probs()
+        self._costs()
+
+    # --- CFG ---
+
+    def _build_cfg(self):
+        words = self.words
+        n = len(words)
+        starts = block_starts(words, self.prog.labels, self.prog.data_labels)
+        for s, e in zip(starts, starts[1:] + [n]):
+            self.blocks[s] = BasicBlock(s, e)
+        entries = {0}
+        for b in self.blocks.values():
+            last = words[b.end - 1]
+            opc = last & 0x7F
+            rd = (last >> 7) & 0x1F
+            cls = classify(last)[0]
+            if last == DONE_INSTR or (cls == BARRIER and last & 0xFFFFF07F == 0x73):
+                b.kind = "halt"                     # jal x0, 0 / ecall / ebreak
+            elif opc == 0x63:
+                b.kind = "branch"
+                b.succs = [control_target(b.end - 1, last), b.end]
+            elif opc == 0x6F and rd == 0:
+                b.kind = "jump"
+                b.succs = [control_target(b.end - 1, last)]
+            elif opc == 0x6F:
+                b.kind = "call"
+                b.callee = control_target(b.end - 1, last)
+                entries.add(b.callee)
+                b.succs = [b.end]
+            elif opc == 0x67:
+                b.kind = "icall" if rd else "ret"
+                b.succs = [b.end] if rd else []
+            else:
+                b.succs = [b.end]
+            b.succs = [t for t in b.succs if t in self.blocks]
+            if b.kind == "branch" and len(b.succs) == 2 and b.succs[0] == b.succs[1]:
+                b.succs = b.succs[:1]
+        for b in self.blocks.values():
+            for t in b.succs:
+                self.blocks[t].preds.append(b.start)
+        for entry in sorted(entries):
+            if entry not in self.blocks:
+                continue
+            seen, stack = set(), [entry]
+            while stack:
+                s = stack.pop()
+                if s in seen:
+                    continue
+                seen.add(s)
+                stack.extend(self.blocks[s].succs)
+            self.functions[entry] = sorted(seen)
+
+    def _find_loops(self, entry):
+        """Natural loops from DFS back edges of one function."""
+        blocks = self.blocks
+        state = {}
+        back = {}
+        stack = [(entry, iter(blocks[entry].succs))]
+        state[entry] = 1
+        while stack:
+            s, it = stack[-1]
+            for t in it:
+                if state.get(t) == 1:
+                    back.setdefault(t, []).append(s)
+                elif t not in state:
+                    state[t] = 1
+                    stack.append((t, iter(blocks[t].succs)))
+                    break
+            else:
+                state[s] = 2
+                stack.pop()
+        for header, latches in back.items():
+            if any(lp.header == header for lp in self.loops):
+                continue                    # shared block of two functions
+            body = {header}
+            work = [u for u in latches if u != header]
+            while work:
+                u = work.pop()
+                if u in body:
+                    continue
+                body.add(u)
+                work.extend(p for p in blocks[u].preds if p not in body)
+            lp = Loop(header, body, latches)
+            lp.function = entry
+            for u in sorted(body):
+                for t in blocks[u].succs:
+                    if t not in body:
+                        lp.exits.append((u, t))
+            self.loops.append(lp)
+
+    def _nest_loops(self):
+        self.loops.sort(key=lambda lp: len(lp.body))
+        for i, lp in enumerate(self.loops):
+            for outer in self.loops[i + 1:]:
+                if lp.header in outer.body and outer.header != lp.header:
+                    lp.parent = outer
+                    break
+        for lp in self.loops:
+            p = lp.parent
+            while p is not None:
+                lp.depth += 1
+                p = p.parent
+        self.header_of = {lp.header: lp for lp in self.loops}
+
+    def innermost(self, s):
+        for lp in self.loops:               # sorted small to large
+            if s in lp.body:
+                return lp
+        return None
+
+    def back_edge(self, u, t):
+        lp = self.header_of.get(t)
+        return lp is not None and u in lp.body
+
+    # --- constants / trip counts ---
+
+    def const_before(self, idx, reg, exclude=(), depth=0):
+        """Constant value of reg just before word idx, or None."""
+        if depth == 0:
+            self._budget = 4096         # bounds the walk over merging paths
+        return self._const_in(self._block_at(idx), idx, reg, set(exclude), depth)
+
+    def _const_in(self, b, stop, reg, seen, depth):
+        """Constant value of reg after block b's words before stop, or None.
+
+        Predecessors must agree on the value; blocks in seen (the loop being
+        analysed, or a cycle on the current walk) are skipped.
+        """
+        if reg == 0:
+            return 0
+        self._budget -= 1
+        if depth > 24 or self._budget < 0:
+            return None
+        for i in range(stop - 1, b.start - 1, -1):
+            w = self.words[i]
+            if classify(w)[1] == reg:
+                return self._eval(w, i, seen, depth)
+        preds = [p for p in b.preds if p not in seen]
+        lp = self.header_of.get(b.start)
+        if len(preds) > 1 and lp is not None and not self._defined_in(lp, reg):
+            preds = [p for p in preds if p not in lp.body]   # reg is loop invariant
+        if not preds:
+            return None
+        values = set()
+        for p in preds:
+            pb = self.blocks[p]
+            values.add(self._const_in(pb, pb.end, reg, seen | {p}, depth + 1))
+            if len(values) > 1 or None in values:
+                return None
+        return values.pop()
+
+    def _defined_in(self, lp, reg):
+        return any(classify(self.words[i])[1] == reg for s in lp.body
+                   for i in range(self.blocks[s].start, self.blocks[s].end))
+
+    def _eval(self, w, i, exclude, depth):
+        opc = w & 0x7F
+        if opc == 0x37:
+            return w & 0xFFFFF000
+        f3 = (w >> 12) & 7
+        fn = _ALU_EVAL.get((opc, f3))
+        if fn is None or (opc == 0x33 and w >> 25):
+            return None
+        a = self.const_before(i, (w >> 15) & 0x1F, exclude, depth + 1)
+        if a is None:
+            return None
+        if opc == 0x13:
+            b = _imm_i(w)
+        else:
+            b = self.const_before(i, (w >> 20) & 0x1F, exclude, depth + 1)
+            if b is None:
+                return None
+        return fn(a, b) & 0xFFFFFFFF
+
+    def _block_at(self, idx):
+        b = self.blocks.get(idx)
+        if b is not None:
+            return b
+        return next(b for b in self.blocks.values() if b.start <= idx < b.end)
+
+    def _trip_counts(self):
+        words = self.words
+        for lp in self.loops:
+            exits = {u for u, _ in lp.exits}
+            for u in sorted(exits):
+                b = self.blocks[u]
+                if b.kind != "branch" or len(b.succs) != 2:
+                    continue
+                trips = self._counted(lp, b, words[b.end - 1])
+                if trips is not None:
+                    lp.trips = trips
+                    lp.how = "counted"
+                    break
+
+    def _counted(self, lp, b, br):
+        """Executions of branch br per entry of lp, if it is a counted exit test."""
+        rs1, rs2 = (br >> 15) & 0x1F, (br >> 20) & 0x1F
+        defs = {}
+        for s in lp.body:
+            blk = self.blocks[s]
+            for i in range(blk.start, blk.end):
+                cls, d, _ = classify(self.words[i])
+                if d:
+                    defs.setdefault(d, []).append(i)
+        for ind, other, swap in ((rs1, rs2, False), (rs2, rs1, True)):
+            sites = defs.get(ind, [])
+            if len(sites) != 1 or not ind:
+                continue
+            w = self.words[sites[0]]
+            if w & 0x707F != 0x13 or (w >> 15) & 0x1F != ind:
+                continue                    # not addi ind, ind, step
+            step = _imm_i(w)
+            if not step:
+                continue
+            if other in defs:
+                bound = self.const_before(b.end - 1, other)
+                if bound is None or any(self._block_at(i).start not in lp.body for i in defs[other]):
+                    continue
+            else:
+                bound = self.const_before(lp.header, other, lp.body)
+            init = self.const_before(lp.header, ind, lp.body)
+            if bound is None or init is None:
+                continue
+            inc_first = self._before(sites[0], b.end - 1, lp)
+            cond = _BRANCH_COND.get((br >> 12) & 7)
+            stay_taken = b.succs[0] in lp.body
+            v, n = init, 0
+            while n < MAX_TRIPS:
+                n += 1
+                if inc_first:
+                    v = (v + step) & 0xFFFFFFFF
+                taken = cond(bound, v) if swap else cond(v, bound)
+                if taken != stay_taken:
+                    return n
+                if not inc_first:
+                    v = (v + step) & 0xFFFFFFFF
+            return None
+        return None
+
+    def _before(self, i, j, lp):
+        """Does word i run before word j within one iteration of lp?"""
+        bi, bj = self._block_at(i), self._block_at(j)
+        if bi is bj:
+            return i < j
+        # i's block precedes j's on every path from the header if j is not
+        # reachable from the header without passing i's block
+        seen, work = {bi.start}, [lp.header]
+        while work:
+            s = work.pop()
+            if s == bj.start:
+                return False
+            if s in seen:
+                continue
+            seen.add(s)
+            work.extend(t for t in self.blocks[s].succs if t in lp.body and t != lp.header)
+        return True
+
+    # --- probabilities / frequencies ---
+
+    def _branch_probs(self):
+        words = self.words
+        for b in self.blocks.values():
+            if len(b.succs) == 1:
+                b.probs = [1.0]
+                continue
+            if len(b.succs) != 2:
+                continue
+            taken, fall = b.succs
+            br = words[b.end - 1]
+            p, b.why = self._branch_prob(b, br, taken, fall)
+            b.probs = [p, 1.0 - p]
+
+    def _branch_prob(self, b, br, taken, fall):
+        for lp in self.loops:
+            if lp.how == "counted" and ((b.start, taken) in lp.exits or (b.start, fall) in lp.exits):
+                if self._is_exit_test(lp, b):
+                    p_exit = 1.0 / lp.trips
+                    exit_taken = (b.start, taken) in lp.exits
+                    return (p_exit if exit_taken else 1.0 - p_exit), f"counted loop, {lp.trips} trips"
+        rs1, rs2 = (br >> 15) & 0x1F, (br >> 20) & 0x1F
+        f3 = (br >> 12) & 7
+        if f3 in (0, 1) and 0 in (rs1, rs2) and b.end - 2 >= b.start:
+            reg = rs1 or rs2
+            for i in range(b.end - 2, b.start - 1, -1):
+                w = self.words[i]
+                d = classify(w)[1]
+                if d != reg:
+                    continue
+                if w & 0x707F == 0x7013:            # andi
+                    mask = _imm_i(w)
+                    if mask > 0 and mask & (mask + 1) == 0:
+                        p_zero = 1.0 / (mask + 1)
+                        p = p_zero if f3 == 0 else 1.0 - p_zero
+                        return p, f"counter throttle (andi {mask})"
+                break
+        lp = self.innermost(b.start)
+        if lp is not None:
+            t_back = self.back_edge(b.start, taken)
+            f_back = self.back_edge(b.start, fall)
+            t_out = taken not in lp.body
+            f_out = fall not in lp.body
+            if t_back and not f_back:
+                return PROB_LOOP_BACK, "loop back edge"
+            if f_back and not t_back:
+                return 1.0 - PROB_LOOP_BACK, "loop back edge (fall-through)"
+            if t_out and not f_out:
+                return PROB_LOOP_EXIT, "loop exit"
+            if f_out and not t_out:
+                return 1.0 - PROB_LOOP_EXIT, "loop exit (fall-through)"
+        return PROB_UNKNOWN, "unknown"
+
+    def _is_exit_test(self, lp, b):
+        return self._counted(lp, b, self.words[b.end - 1]) is not None
+
+    def _propagate(self, head, region, head_freq=1.0):
+        """Frequencies over region (acyclic without back edges) from head."""
+        blocks = self.blocks
+        freq = {s: 0.0 for s in region}
+        indeg = {s: 0 for s in region}
+        for s in region:
+            for t in blocks[s].succs:
+                if t in region and t != head and not self.back_edge(s, t):
+                    indeg[t] += 1
+        freq[head] = head_freq
+        order = [head]
+        ready = [head]
+        done = {head}
+        cyclic = 0.0
+        while ready or len(done) < len(region):
+            if not ready:
+                # irreducible leftovers: take them in address order
+                s = min(x for x in region if x not in done)
+                done.add(s)
+                ready.append(s)
+                order.append(s)
+            s = ready.pop()
+            b = blocks[s]
+            f = freq[s]
+            for t, p in zip(b.succs, b.probs):
+                if t not in region:
+                    continue
+                if t == head or self.back_edge(s, t):
+                    if t == head:
+                        cyclic += f * p
+                    continue
+                freq[t] += f * p
+                indeg[t] -= 1
+                if indeg[t] == 0 and t not in done:
+                    lp = self.header_of.get(t)
+                    if lp is not None:
+                        freq[t] *= lp.factor
+                    done.add(t)
+                    ready.append(t)
+                    order.append(t)
+        return freq, cyclic
+
+    def _costs(self):
+        blocks, words = self.blocks, self.words
+        tp, mp = self.taken_penalty, self.mispredict_penalty
+        for b in blocks.values():
+            body = words[b.start:b.end]
+            b.loads = sum(1 for w in body if is_load(w))
+            b.stalls = sum(1 for x, y in zip(body, body[1:]) if load_use(x, y))
+            last = body[-1]
+            if b.kind == "branch" and len(b.probs) == 2:
+                p = b.probs[0]
+                if last >> 31:          # backward: predicted taken
+                    b.ctrl = p * tp + (1.0 - p) * mp
+                else:
+                    b.ctrl = p * mp
+                if b.end < len(words) and load_use(last, words[b.end]):
+                    b.stalls += 1.0 - p
+            elif b.kind in ("jump", "call"):
+                b.ctrl = tp
+            elif b.kind in ("ret", "icall"):
+                b.ctrl = tp + mp
+            elif b.kind == "fall" and b.end < len(words) and load_use(last, words[b.end]):
+                b.stalls += 1
+            b.cost = len(body) + b.stalls + b.ctrl + b.loads * self.load_latency
+
+        # loops inner first, then each function from its entry
+        for lp in self.loops:
+            lp.local, lp.cyclic = self._propagate(lp.header, lp.body)
+            if lp.infinite or lp.cyclic >= 1.0 - 1.0 / MAX_FACTOR:
+                lp.factor = 1.0 if lp.infinite else MAX_FACTOR
+            else:
+                lp.factor = 1.0 / (1.0 - lp.cyclic)
+            if lp.trips is None and not lp.infinite:
+                lp.trips = lp.factor
+        self.func_freq = {}
+        for entry, region in self.functions.items():
+            lp = self.header_of.get(entry)
+            self.func_freq[entry], _ = self._propagate(entry, set(region),
+                                                       lp.factor if lp else 1.0)
+        self._in_progress = set()
+        for entry in self.functions:
+            self._function_cost(entry)
+        main = self.func_freq.get(0, {})
+        scale = {0: 1.0}
+        for b in blocks.values():
+            b.freq = main.get(b.start, 0.0)
+        # callees: frequency = sum over call sites of caller freq x local freq
+        pending = [0]
+        while pending:
+            f = pending.pop()
+            for s in self.functions[f]:
+                cb = blocks[s]
+                if cb.kind == "call" and cb.callee in self.functions:
+                    w = scale[f] * self.func_freq[f][s]
+                    first = cb.callee not in scale
+                    scale[cb.callee] = scale.get(cb.callee, 0.0) + w
+                    for t, lf in self.func_freq[cb.callee].items():
+                        if t not in main:
+                            blocks[t].freq += w * lf
+                    if first and cb.callee != f:
+                        pending.append(cb.callee)
+
+    def _function_cost(self, entry):
+        """Expected (cycles, instructions) per call of entry, callees included."""
+        if entry in self.func_cost:
+            return self.func_cost[entry], self.func_instrs[entry]
+        if entry in self._in_progress:
+            return 0.0, 0.0                 # recursion: callee counted once
+        self._in_progress.add(entry)
+        total = instrs = 0.0
+        for s, f in self.func_freq[entry].items():
+            b = self.blocks[s]
+            c, n = b.cost, b.end - b.start
+            if b.kind == "call" and b.callee in self.functions:
+                callee_c, callee_n = self._function_cost(b.callee)
+                c += callee_c
+                n += callee_n
+            total += f * c
+            instrs += f * n
+        self._in_progress.discard(entry)
+        self.func_cost[entry] = total
+        self.func_instrs[entry] = instrs
+        return total, instrs
+
+    def block_total(self, b):
+        c = b.cost
+        if b.kind == "call" and b.callee in self.func_cost:
+            c += self.func_cost[b.callee]
+        return c
+
+    def block_instrs(self, b):
+        """Instructions per execution of b, plus its callee's expected ones."""
+        n = b.end - b.start
+        if b.kind == "call" and b.callee in self.func_instrs:
+            n += self.func_instrs[b.callee]
+        return n
+
+    # --- reports ---
+
+    def label_at(self, s):
+        names = [n for n, a in self.prog.labels.items()
+                 if a == 4 * s and n not in self.prog.data_labels]
+        return names[0] if names else f"0x{4 * s:04x}"
+
+    def loop_stats(self, lp):
+        """Per-iteration instrs/cycles (callees included) and contributed cycles of a loop."""
+        instrs = cycles = stalls = ctrl = 0.0
+        for s, f in lp.local.items():
+            b = self.blocks[s]
+            instrs += f * self.block_instrs(b)
+            cycles += f * self.block_total(b)
+            stalls += f * b.stalls
+            ctrl += f * b.ctrl
+        freq_main = self.func_freq.get(lp.function, {})
+        total = sum(freq_main.get(s, 0.0) * self.block_total(self.blocks[s]) for s in lp.body)
+        entries = freq_main.get(lp.header, 0.0) / (lp.factor or 1.0)
+        return {"instrs": instrs, "cycles": cycles, "stalls": stalls, "ctrl": ctrl,
+                "total": total, "entries": entries}
+
+    def program_cycles(self):
+        return self.func_cost.get(0, 0.0)
+
+
+def format_report(name, an: StaticAnalysis, top: int = 10):
+    prog = an.prog
+    total = an.program_cycles()
+    instrs = sum(b.freq * (b.end - b.start) for b in an.blocks.values())
+    infinite = [lp for lp in an.loops if lp.infinite and lp.function == 0]
+    unit = "per main-loop iteration" if infinite else "per run"
+    lines = [
+        f"==== {name}: {len(prog.words)} instructions, {len(an.blocks)} blocks, "
+        f"{len(an.loops)} loops, {len(an.functions) - 1} called functions ====",
+        f"  estimated cycles {unit}: {total:,.1f}"
+        + (f"  ({instrs:,.1f} instructions, CPI {total / instrs:.3f})" if instrs else ""),
+    ]
+    rows = []
+    for lp in an.loops:
+        st = an.loop_stats(lp)
+        rows.append((st["total"], lp, st))
+    rows.sort(key=lambda r: -r[0])
+    if rows:
+        lines.append(f"  {'loop':<24}{'lines':>11}{'depth':>6}{'trips':>16}"
+                     f"{'instr/it':>12}{'cyc/it':>12}{'CPI':>7}{'stall/it':>10}"
+                     f"{'ctrl/it':>10}{'share':>8}")
+    for tot, lp, st in rows[:top]:
+        body_lines = [prog.lines[i] for s in lp.body
+                      for i in range(an.blocks[s].start, an.blocks[s].end)]
+        span = f"{min(body_lines)}-{max(body_lines)}"
+        if lp.infinite:
+            trips = "forever"
+        elif lp.how == "counted":
+            trips = f"{lp.trips} (counted)"
+        else:
+            trips = f"~{lp.trips:.1f}"
+        cpi = st["cycles"] / st["instrs"] if st["instrs"] else 0.0
+        share = tot / total * 100 if total else 0.0
+        lines.append(f"  {an.label_at(lp.header):<24}{span:>11}{lp.depth:>6}{trips:>16}"
+                     f"{st['instrs']:>12.1f}{st['cycles']:>12.1f}{cpi:>7.3f}"
+                     f"{st['stalls']:>10.2f}{st['ctrl']:>10.2f}{share:>7.1f}%")
+    return "\n".join(lines)
+
+
+def format_annotated(an: StaticAnalysis, text: str):
+    src = text.splitlines()
+    prog = an.prog
+    words = prog.words
+    out = [f"{'PC':<7}{'Line':<6}{'freq':>9}  {'Source':<40} Notes"]
+    for s in sorted(an.blocks):
+        b = an.blocks[s]
+        for i in range(b.start, b.end):
+            notes = []
+            if i > b.start and load_use(words[i - 1], words[i]):
+                notes.append("load-use stall +1")
+            elif i == b.start and i and load_use(words[i - 1], words[i]) \
+                    and classify(words[i - 1])[0] != CTRL:
+                notes.append("load-use stall +1 (fall-through)")
+            if i == b.end - 1:
+                if b.kind == "branch" and len(b.probs) == 2:
+                    pred = "taken" if words[i] >> 31 else "not taken"
+                    notes.append(f"predict {pred}, p(taken)={b.probs[0]:.3f} "
+                                 f"[{b.why}] +{b.ctrl:.2f}")
+                elif b.kind in ("jump", "call"):
+                    notes.append(f"{b.kind} +{b.ctrl:.0f} bubble")
+                    if b.kind == "call" and b.callee in an.func_cost:
+                        notes.append(f"callee {an.func_cost[b.callee]:.1f} cycles")
+                elif b.kind in ("ret", "icall"):
+                    notes.append(f"jalr +{an.taken_penalty} bubble +{an.mispredict_penalty} flush")
+                elif b.kind == "halt":
+                    notes.append("halt")
+            ln = prog.lines[i]
+            line = src[ln - 1].strip() if 0 < ln <= len(src) else ""
+            freq = f"{b.freq:9.2f}" if b.freq else f"{'-':>9}"
+            out.append(f"0x{4 * i:04x} {ln:<6}{freq}  {line[:40]:<40} {'; '.join(notes)}")
+    return "\n".join(out)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="static pipeline-hazard / CPI analyzer")
+    ap.add_argument("inputs", nargs="+", help="assembly sources")
+    ap.add_argument("--annotate", action="store_true", help="print every instruction with notes")
+    ap.add_argument("--top", type=int, default=10, help="loops in the hot-loop report")
+    ap.add_argument("--data-base", type=lambda v: int(v, 0), default=0)
+    ap.add_argument("--taken-penalty", type=int, default=1)
+    ap.add_argument("--mispredict-penalty", type=int, default=2)
+    ap.add_argument("--load-latency", type=int, default=0,
+                    help="extra cycles per load (1 for the BRAM Data_Memory variant)")
+    args = ap.parse_args()
+
+    failed = False
+    for path in args.inputs:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                text = f.read()
+            prog = Assembler(args.data_base).assemble(text, path)
+        except (OSError, ValueError) as e:
+            print(f"ERROR: {e}")
+            failed = True
+            continue
+        an = StaticAnalysis(prog, args.taken_penalty, args.mispredict_penalty,
+                            args.load_latency)
+        if args.annotate:
+            print(format_annotated(an, text))
+        print(format_report(path, an, args.top))
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
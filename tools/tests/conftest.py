@@ -0,0 +1,7 @@
+import os
+import sys
+
+# the tools are flat scripts that import their siblings
+TOOLS = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+sys.path.insert(0, TOOLS)
@@ -0,0 +1,25 @@
+    # Nested calls and one display write per frame for the profiler tests.
+    lui  s0, 0x9            # DISPLAY_ADDR 0x9000
+    addi s1, zero, 0
+frame:
+    addi a0, zero, 3
+    jal  ra, outer
+    sw   zero, 0(s0)        # ends the frame
+    addi s1, s1, 1
+    jal  x0, frame
+outer:
+    addi sp, sp, -4
+    sw   ra, 0(sp)
+outer_loop:
+    jal  ra, inner
+    addi a0, a0, -1
+    bne  a0, zero, outer_loop
+    lw   ra, 0(sp)
+    addi sp, sp, 4
+    jalr x0, 0(ra)
+inner:
+    addi t0, zero, 5
+inner_loop:
+    addi t0, t0, -1
+    bne  t0, zero, inner_loop
+    jalr x0, 0(ra)
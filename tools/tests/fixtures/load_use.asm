@@ -0,0 +1,25 @@
+    # Load-use stalls for the commit-log tests: sum a 4-word table whose
+    # every load is consumed by the next instruction (hazard_unit.v stalls).
+    lui  t0, 0x1            # table at 0x1000
+    addi t1, zero, 4
+    addi t2, zero, 0
+init:
+    sw   t1, 0(t0)
+    addi t0, t0, 4
+    addi t1, t1, -1
+    bne  t1, zero, init
+    lui  t0, 0x1
+    addi t1, zero, 4
+sum:
+    lw   t3, 0(t0)
+    add  t2, t2, t3         # load-use
+    lw   t4, 0(t0)
+    sw   t4, 16(t0)         # load -> store data
+    addi t0, t0, 4
+    addi t1, t1, -1
+    bne  t1, zero, sum
+    lw   t5, -4(t0)
+    beq  t5, zero, skip     # load -> branch
+    addi t6, zero, 1
+skip:
+    jal  x0, 0
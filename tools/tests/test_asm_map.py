@@ -0,0 +1,37 @@
+import os
+import shutil
+
+from conftest import FIXTURES
+from rv32i_asm import assemble_file, program_map, read_map, write_map
+
+
+def test_map_round_trip_with_spaces_in_path(tmp_path):
+    folder = tmp_path / "RISC-V game - copy"
+    folder.mkdir()
+    path = str(folder / "load use.asm")
+    shutil.copy(os.path.join(FIXTURES, "load_use.asm"), path)
+    with open(path, "r", encoding="utf-8") as f:
+        text = f.read()
+    prog = assemble_file(path)
+    symbols, data_symbols, lines = program_map(prog)
+    map_path = str(tmp_path / "load use.map")
+    write_map(map_path, symbols, data_symbols, lines, {path: text})
+
+    got_symbols, got_data, got_lines = read_map(map_path)
+    assert got_symbols == symbols
+    assert got_data == data_symbols
+    assert len(got_lines) == len(lines)
+    src = text.splitlines()
+    for pc, source, ln in lines:
+        got_source, got_ln, code = got_lines[pc]
+        assert (got_source, got_ln) == (source, ln)
+        assert code and code in src[ln - 1]
+
+
+def test_map_line_without_text(tmp_path):
+    map_path = str(tmp_path / "a.map")
+    with open(map_path, "w", encoding="utf-8") as f:
+        f.write("# symbols\n00000000 main\n# lines\n00000000 my dir/a b.asm:12\n"
+                "00000004 my dir/a b.asm:13  addi a0, a0, 1\n")
+    _, _, lines = read_map(map_path)
+    assert lines == {0: ("my dir/a b.asm", 12, ""), 4: ("my dir/a b.asm", 13, "addi a0, a0, 1")}
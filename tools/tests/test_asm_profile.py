@@ -0,0 +1,46 @@
+import os
+
+from asm_profile import CallStackProfile, ProfileReport, load_source
+from basys3_soc import Basys3SoC
+from conftest import FIXTURES
+from pipeline_model import PipelineModel
+
+
+def _soc():
+    words, image, smap, prog = load_source(os.path.join(FIXTURES, "calls.asm"))
+    soc = Basys3SoC(words, image)
+    soc.sim.regs[2] = 0x800         # sp
+    soc.profile = CallStackProfile(soc.sim)
+    return soc, smap
+
+
+def _folded(soc, smap):
+    return ProfileReport(soc.profile, PipelineModel(), smap).folded("calls")
+
+
+def test_call_stack_profile_snapshot_restore():
+    soc, smap = _soc()
+    assert soc.run(20) == 20
+    full = _folded(soc, smap)
+    assert any(";outer;outer_loop;inner;" in line for line in full)
+
+    soc, _ = _soc()
+    soc.run(20, max_steps=124)      # a block boundary inside outer -> inner
+    assert len(soc.profile.stack) == 2
+    data = soc.snapshot()
+    again, _ = _soc()
+    again.restore(data)
+    assert again.profile.stack == soc.profile.stack
+    assert again.profile.retired == soc.profile.retired
+    assert again.run(20) == 20
+    assert _folded(again, smap) == full
+    assert again.profile.retired == soc.profile.retired + (again.instret() - soc.instret())
+
+
+def test_report_counts_every_retired_instruction(monkeypatch):
+    import basys3_soc
+    monkeypatch.setattr(basys3_soc, "RUN_SLICE", 7)     # slices would end inside blocks
+    soc, smap = _soc()
+    assert soc.run(20) == 20
+    rep = ProfileReport(soc.profile, PipelineModel(), smap)
+    assert rep.instrs == soc.profile.retired == soc.sim.instret
@@ -0,0 +1,26 @@
+from basys3_soc import Basys3SoC
+from rv32i_asm import Assembler
+
+PROG = """
+    lui  t0, 0x9            # DISPLAY_ADDR
+    sw   zero, 0(t0)        # start a redraw: display_busy
+    lb   a0, 0(t0)
+    lbu  a1, 0(t0)
+    lui  t1, 0xA            # FB_BASE
+    addi t2, zero, 0xF0
+    sb   t2, 0(t1)
+    lb   a2, 0(t1)
+    lh   a3, 0(t1)
+    lui  t3, 0x8            # BTN_ADDR
+    lbu  a4, 0(t3)
+    jal  x0, 0
+"""
+
+
+def test_mmio_loads_return_the_full_device_word():
+    soc = Basys3SoC(Assembler().assemble(PROG).words, buttons=[(0, 0b0101)])
+    soc.run(10)
+    regs = soc.sim.regs
+    assert regs[10] == regs[11] == 0x80000000     # {display_busy, 31'b0}
+    assert regs[12] == regs[13] == 0xF0           # {24'b0, fb}, not sign-extended
+    assert regs[14] == 0b0101
@@ -0,0 +1,41 @@
+import os
+
+from branch_predictor import Predictor, collect_trace, make_predictor, replay
+from conftest import FIXTURES
+from pipeline_model import EdgeProfile, PipelineModel, profile_program
+from rv32i_asm import assemble_file
+from rv32i_iss import RV32ISim
+
+
+def _words():
+    return assemble_file(os.path.join(FIXTURES, "calls.asm")).words
+
+
+class AlwaysRight(Predictor):
+    """A lookahead predictor that is not the built-in Oracle."""
+
+    name = "always-right"
+    lookahead = True
+
+    def peek(self, pc, word, taken):
+        self.taken = taken
+
+    def predict(self, pc, word):
+        return self.taken
+
+
+def test_lookahead_predictors_see_the_outcome():
+    trace = collect_trace(_words(), 5000)
+    assert replay(trace, make_predictor("btfn"))["mispredicts"] > 0
+    for pred in (AlwaysRight(), make_predictor("oracle"), make_predictor("btb:16:oracle")):
+        assert replay(trace, pred)["mispredicts"] == 0
+
+
+def test_trace_run_fills_the_profile():
+    words = _words()
+    sim = RV32ISim(words)
+    prof = EdgeProfile(sim)
+    trace = collect_trace(words, 5000, sim=sim, profile=prof)
+    model = PipelineModel()
+    assert prof.retired == trace.retired == 5000
+    assert model.estimate(prof) == model.estimate(profile_program(words, 5000))
@@ -0,0 +1,49 @@
+import os
+
+from conftest import FIXTURES
+from rtl_cosim import cosim, parse_commit_log, write_reference
+from rv32i_asm import assemble_file
+from rv32i_iss import RV32ISim
+
+
+def _sim():
+    prog = assemble_file(os.path.join(FIXTURES, "load_use.asm"))
+    return RV32ISim(prog.words, dmem_size=16 * 1024)
+
+
+def _log(name):
+    with open(os.path.join(FIXTURES, name), "r", encoding="utf-8") as f:
+        return f.read().splitlines()
+
+
+def test_stall_bubbles_are_not_commits():
+    lines = _log("load_use_rtl.log")
+    commits = list(parse_commit_log(lines))
+    bubbles = sum(1 for ln in lines if ln and not ln.startswith("#")) - len(commits)
+    assert bubbles == 9
+    assert [c.index for c in commits] == list(range(len(commits)))
+    for every in (0, 10):
+        matched, mismatch = cosim(_sim(), commits, every, window=4)
+        assert mismatch is None
+        assert matched == len(commits) == 53
+
+
+def test_reference_log_round_trip(tmp_path):
+    path = str(tmp_path / "ref.log")
+    n = write_reference(_sim(), path, 1000)
+    with open(path, "r", encoding="utf-8") as f:
+        commits = list(parse_commit_log(f))
+    assert len(commits) == n
+    assert cosim(_sim(), commits) == (n, None)
+
+
+def test_missing_write_after_load_still_mismatches():
+    # the consumer's real commit without its write is not a bubble
+    lines = [ln for ln in _log("load_use_rtl.log")
+             if not ln.startswith("#")]
+    i = next(k for k, ln in enumerate(lines) if ln.endswith("01c383b3 x7=00000004"))
+    del lines[i - 1]                            # the bubble
+    lines[i - 1] = lines[i - 1].split(" x7=")[0]
+    matched, mismatch = cosim(_sim(), parse_commit_log(lines))
+    assert mismatch is not None and matched == 22
+    assert "register write" in mismatch.problems[0]
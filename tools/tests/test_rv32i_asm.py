@@ -0,0 +1,23 @@
+from rv32i_asm import Assembler
+
+PROG = """
+    .data
+pad:    .word 0
+table:  .word 11, 22, 33
+    .text
+    lui  t1, %hi( table + 4 )
+    addi a0, t1, %lo(table + 4)
+    lw   t0, %lo(table + 4)(t1)
+    lw   t2, %lo( table + 8 )( t1 )
+    sw   t0, %lo(pad + 0)(t1)
+"""
+
+
+def test_hi_lo_operands_with_spaces():
+    spaced = Assembler(0x1000).assemble(PROG)
+    packed = Assembler(0x1000).assemble(PROG.replace(" + ", "+").replace("( ", "(")
+                                        .replace(" )", ")"))
+    assert spaced.words == packed.words
+    plain = Assembler().assemble("lui t1, 1\naddi a0, t1, 8\nlw t0, 8(t1)\n"
+                                 "lw t2, 12(t1)\nsw t0, 0(t1)\n")
+    assert spaced.words == plain.words
@@ -0,0 +1,68 @@
+import os
+
+import pytest
+
+import rv32i_iss
+from conftest import FIXTURES
+from rv32i_asm import Assembler, assemble_file
+from rv32i_iss import RV32ISim
+
+LOOPS = """
+    lui  s0, 0x1
+    addi t0, zero, 40
+outer:
+    addi t1, zero, 7
+inner:
+    sub  t3, zero, t1
+    sh   t3, 2(s0)
+    lh   t2, 2(s0)
+    add  a0, a0, t2
+    sw   a0, 4(s0)
+    addi t1, t1, -1
+    bne  t1, zero, inner
+    lw   a1, 4(s0)
+    addi t0, t0, -1
+    blt  zero, t0, outer
+    jal  x0, 0
+"""
+
+
+def _sim():
+    prog = assemble_file(os.path.join(FIXTURES, "load_use.asm"))
+    return RV32ISim(prog.words, dmem_size=16 * 1024)
+
+
+def test_restore_rejects_a_bad_stop_reason():
+    sim = _sim()
+    sim.run(20)
+    data = bytearray(sim.snapshot())
+    data[7] = 200                   # stop reason index in the header
+    with pytest.raises(ValueError, match="stop reason"):
+        _sim().restore(bytes(data))
+
+
+def test_restore_rejects_a_truncated_body():
+    sim = _sim()
+    sim.run(20)
+    data = sim.snapshot()
+    with pytest.raises(ValueError, match="truncated or corrupt"):
+        _sim().restore(data[:-10])
+
+
+def test_reset_clears_last_branch_taken():
+    sim = _sim()
+    sim.last_branch_taken = True
+    sim.reset()
+    assert sim.last_branch_taken is False
+    assert sim.snapshot() == _sim().snapshot()
+
+
+def test_translated_loops_stop_where_the_interpreter_does(monkeypatch):
+    monkeypatch.setattr(rv32i_iss, "TRANSLATE_AFTER", 0)
+    words = Assembler().assemble(LOOPS).words
+    ref = RV32ISim(words, translate_threshold=0)
+    sim = RV32ISim(words, translate_threshold=2)
+    for budget in (30, 1, 37, 400, 13, 10_000):
+        assert sim.run(budget) == ref.run(budget)
+        assert (sim.regs, sim.pc, sim.dmem) == (ref.regs, ref.pc, ref.dmem)
+    assert sim.translated and sim.stop_reason == ref.stop_reason == "done"
@@ -0,0 +1,37 @@
+from rv32i_asm import Assembler, object_dict, program_from_object
+from rv32i_iss import RV32ISim
+from rv32i_link import link
+
+MAIN = """
+    .extern inc2
+    addi a0, zero, 1
+    jal  ra, inc2
+    jal  x0, 0
+"""
+
+LIB = """
+    .globl inc2
+    addi a1, zero, 7
+    .align 4
+inc2:
+    addi a0, a0, 2
+    jalr x0, 0(ra)
+"""
+
+
+def _module(text, name):
+    return Assembler().assemble(text, name, relocatable=True)
+
+
+def test_text_align_survives_linking():
+    lib = _module(LIB, "lib.asm")
+    assert lib.text_align == 16
+    assert program_from_object(object_dict(lib)).text_align == 16
+
+    img = link([_module(MAIN, "main.asm"), lib])
+    assert img.symbols["inc2"] == 0x20
+    assert [base for _, base, _ in img.layout] == [0, 0x10]
+    sim = RV32ISim(img.words)
+    sim.run(100)
+    assert sim.stop_reason == "done"
+    assert sim.regs[10] == 3
@@ -0,0 +1,12 @@
+import os
+
+from conftest import FIXTURES
+from rv32i_asm import assemble_file
+from static_cpi import StaticAnalysis
+
+
+def test_loop_cpi_counts_callee_instructions():
+    an = StaticAnalysis(assemble_file(os.path.join(FIXTURES, "calls.asm")))
+    for lp in an.loops:
+        st = an.loop_stats(lp)
+        assert 1.0 <= st["cycles"] / st["instrs"] < 2.0, an.label_at(lp.header)
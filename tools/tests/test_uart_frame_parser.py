@@ -0,0 +1,59 @@
+import importlib.util
+import os
+import random
+
+import pytest
+
+from conftest import TOOLS
+
+pytest.importorskip("serial")
+pytest.importorskip("tkinter")
+
+_PATH = os.path.join(os.path.dirname(TOOLS), "RISC-VnGAME - chenggong副本", "lode_runner",
+                     "tools", "uart_lode_runner_viewer.py")
+_spec = importlib.util.spec_from_file_location("uart_lode_runner_viewer", _PATH)
+viewer = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(viewer)
+H = viewer.HEADER
+
+
+def _payload(i):
+    return bytes((i + k) & 0xFF for k in range(viewer.FRAME_SIZE))
+
+
+def test_frame_waits_for_the_whole_next_header():
+    p = viewer.FrameParser()
+    payload = _payload(1)
+    assert p.feed(H + payload[:-1] + H[:1]) == []
+    assert p.corrupt == 0
+    assert p.feed(H[1:] + _payload(2) + H) == [_payload(2)]
+    assert (p.frames, p.corrupt) == (1, 1)
+
+    p = viewer.FrameParser()
+    assert p.feed(H + payload) == []
+    assert p.feed(H) == [payload]
+
+
+def test_synthetic_stream_with_lost_bytes():
+    rng = random.Random(1)
+    stream = bytearray()
+    intact = []
+    for i in range(300):
+        payload = _payload(i)
+        frame = bytearray(H + payload)
+        if i % 10 == 5:
+            del frame[rng.randrange(len(H), len(frame))]
+        else:
+            intact.append(payload)
+        stream += frame
+    stream += H                     # lets the last frame through
+
+    p = viewer.FrameParser()
+    got = []
+    pos = 0
+    while pos < len(stream):
+        n = rng.randint(1, 3000)
+        got += p.feed(bytes(stream[pos:pos + n]))
+        pos += n
+    assert got == intact
+    assert p.corrupt == 30